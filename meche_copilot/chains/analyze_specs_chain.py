@@ -19,6 +19,8 @@ from langchain.callbacks.manager import (
 )
 
 from meche_copilot.schemas import ScopedEquipment, ScopedEquipmentInstance, EquipmentSpecificationAnalysis
+from meche_copilot.chains.helpers.compare_spec_values import compare_spec_values
+from meche_copilot.chains.helpers.map_specs_to_schedule import get_eq_spec_header_map
 from meche_copilot.utils.converters import pydantic_from_jsonl, pydantic_to_jsonl, title_to_filename
 from meche_copilot.utils.envars import OPENAI_API_KEY, DATA_CACHE
 
@@ -46,6 +48,7 @@ class AnalyzeSpecsChain(Chain):
     prompt: BasePromptTemplate = PromptTemplate.from_template('') # TODO - use build extras?
     chat = ChatOpenAI(temperature=0, openai_api_key=OPENAI_API_KEY, model="gpt-4")
     output_key: str = "result" #: :meta private:
+    spec_header_maps_fpath: Path = DATA_CACHE / 'spec_header_maps.json'
 
     class Config:
         extra = Extra.forbid
@@ -90,6 +93,10 @@ class AnalyzeSpecsChain(Chain):
             self.submittal_data_cache.mkdir(parents=True, exist_ok=True)
         
         for eq in scoped_eq:
+            # schedule first: map specs to the design data (schedule) columns once per equipment so mapped design values don't come from the llm
+            # NOTE: submittal data is unstructured text so submittal values always come from the llm
+            design_map = self.get_spec_header_map(eq, data_attr='design_data')
+            eq_inst_results: List[Tuple[ScopedEquipmentInstance, List[SpecificationResults]]] = []
             for eq_inst in eq.instances:
                 if eq_inst.design_uid is None or eq_inst.design_data is None or eq_inst.submittal_data is None:
                     logger.warning(f"Skipping {eq.name} ({eq_inst.name}) because it is missing design uid, design data, or submittal data: {eq_inst.design_uid}, {eq_inst.design_data}, {eq_inst.submittal_data}")
@@ -97,9 +104,12 @@ class AnalyzeSpecsChain(Chain):
                 else:
                     logger.info(f"Analyzing {eq.name} ({eq_inst.name}, {eq_inst.design_uid})")
                     # lookup cached first
-                    spec_results = self.get_spec_results_for_eq_instance(eq_inst, run_manager=run_manager, **kwargs)
-                    # if spec_results is good, then analyze them
-                    spec_analysis = self.analyze_spec_results_for_eq_instance(eq_inst, spec_results, run_manager=run_manager, **kwargs)    
+                    spec_results = self.get_spec_results_for_eq_instance(eq_inst, spec_defs=eq.spec_defs, design_map=design_map, run_manager=run_manager, **kwargs)
+                    set_spec_instance_results(eq, eq_inst, spec_results)
+                    eq_inst_results.append((eq_inst, spec_results))
+
+            # numeric specs of all the instances are compared at once so only free text specs need the llm
+            self.analyze_spec_results(eq, eq_inst_results, run_manager=run_manager, **kwargs)
 
         if run_manager:
             run_manager.on_text("Log something about this run")
@@ -117,9 +127,16 @@ class AnalyzeSpecsChain(Chain):
     def _chain_type(self) -> str:
         return "AnalyzeSpecsChain"
     
-    def get_spec_results_for_eq_instance(self, eq_inst: ScopedEquipmentInstance, spec_defs: Dict[str, str], run_manager: Optional[CallbackManagerForChainRun] = None, **kwargs) -> List[SpecificationResults]:
+    def get_spec_header_map(self, eq: ScopedEquipment, data_attr: str = 'design_data') -> Dict[str, str]:
+        """Map eq's spec names to the keys (ie. schedule headers) of its instances' design_data or submittal_data (cached per template)"""
+        return get_eq_spec_header_map(eq, data_attr=data_attr, cache_fpath=self.spec_header_maps_fpath)
+
+    def get_spec_results_for_eq_instance(self, eq_inst: ScopedEquipmentInstance, spec_defs: Dict[str, str], design_map: Optional[Dict[str, str]] = None, run_manager: Optional[CallbackManagerForChainRun] = None, **kwargs) -> List[SpecificationResults]:
         """Analyze the specs for a single equipment instance.
+
+        Design values of specs mapped to a design data column (design_map) are read straight from the schedule row and override the llm's
         """
+        design_map = design_map or {}
 
         if eq_inst.design_uid is None or eq_inst.design_data is None or eq_inst.submittal_data is None:
             logger.warning(f"Skipping {eq_inst.name} because it is missing design uid, design data, or submittal data: {eq_inst.design_uid}, {eq_inst.design_data}, {eq_inst.submittal_data}")
@@ -133,18 +150,18 @@ class AnalyzeSpecsChain(Chain):
             input_variables=["query", "data"],
             partial_variables={
                 "format_instructions": parser.get_format_instructions(),
-                "design_data": eq_inst.design_data,
-                "submittal_data": eq_inst.submittal_data,
                 }
         )
         spec_results: List[SpecificationResults] = []
-        for spec_name, spec_def in spec_defs:
+        for spec_name, spec_def in spec_defs.items():
+            design_result = eq_inst.design_data.get(design_map[spec_name]) if spec_name in design_map else None
+
             query = f"What is the {spec_name} for {eq_inst.design_uid}? The {spec_name} is {spec_def}."
             logger.debug(f"Querying LLM with query:\n{query}")
-            _input = prompt.format_prompt(query=query)
+            _input = prompt.format_prompt(query=query, data=json.dumps({"design_data": eq_inst.design_data, "submittal_data": eq_inst.submittal_data}))
 
             try:
-                output = self.chat.predict(_input.to_string())
+                output = self.chat.predict(_input.to_string(), callbacks=run_manager.get_child() if run_manager else self.callbacks)
                 parsed_output = parser.parse(output)
             except Exception as e:
                 logger.warning(f"LLM couldn't parse output for {eq_inst.name} ({eq_inst.design_uid}) spec {spec_name}:\n{output}")
@@ -156,15 +173,50 @@ class AnalyzeSpecsChain(Chain):
                     confidence=None,
                     notes=f"LLM couldn't parse output for {eq_inst.name} ({eq_inst.design_uid}) spec {spec_name}:\n{output}",
                 )
-                    
+
+            # values read from the design schedule take precedence over the llm
+            if design_result is not None:
+                parsed_output.design_result = design_result
             spec_results.append(parsed_output)
         return spec_results
     
-    def analyze_spec_results_for_eq_instance(self, eq_inst: ScopedEquipmentInstance, spec_results: List[SpecificationResults], spec_defs: Dict[str, str], run_manager: Optional[CallbackManagerForChainRun] = None, **kwargs) -> List[SpecificationAnalysis]:
+    def analyze_spec_results(self, eq: ScopedEquipment, eq_inst_results: List[Tuple[ScopedEquipmentInstance, List[SpecificationResults]]], rtol: float = 0.02, run_manager: Optional[CallbackManagerForChainRun] = None, **kwargs) -> List[Tuple[ScopedEquipmentInstance, List[SpecificationAnalysis]]]:
+        """Analyze the spec results of some instances of eq and fill in their final results.
+
+        Numeric specs of all the instances are compared at once (within rtol) so only free text specs need the llm. Returns the spec analysis of each instance that had spec results
+        """
+        all_spec_results = [spec_res for _, spec_results in eq_inst_results for spec_res in spec_results]
+        if not all_spec_results:
+            return []
+        comparisons = compare_spec_values(
+            [spec_res.design_result for spec_res in all_spec_results],
+            [spec_res.submittal_result for spec_res in all_spec_results],
+            rtol=rtol,
+        )
+        logger.info(f"Resolved {sum(c is not None for c in comparisons)}/{len(comparisons)} spec comparisons numerically")
+
+        eq_inst_analysis: List[Tuple[ScopedEquipmentInstance, List[SpecificationAnalysis]]] = []
+        start = 0
+        for eq_inst, spec_results in eq_inst_results:
+            if not spec_results:
+                continue
+            resolved = {spec_res.spec_name: comparisons[start + i] for i, spec_res in enumerate(spec_results)}
+            start += len(spec_results)
+            spec_analysis = self.analyze_spec_results_for_eq_instance(eq_inst, spec_results, spec_defs=eq.spec_defs, resolved=resolved, run_manager=run_manager, **kwargs)
+            set_spec_instance_analysis(eq, eq_inst, spec_analysis)
+            eq_inst_analysis.append((eq_inst, spec_analysis))
+        return eq_inst_analysis
+
+    def analyze_spec_results_for_eq_instance(self, eq_inst: ScopedEquipmentInstance, spec_results: List[SpecificationResults], spec_defs: Dict[str, str], resolved: Optional[Dict[str, Optional[bool]]] = None, run_manager: Optional[CallbackManagerForChainRun] = None, **kwargs) -> List[SpecificationAnalysis]:
+        """Analyze the spec results for a single equipment instance.
+
+        Specs already compared numerically (resolved is True if the submittal matches the design within tolerance, False if not) don't go to the llm
+        """
 
         logger.info(f"Getting spec results for {eq_inst.name} ({eq_inst.design_uid})")
+        resolved = resolved or {}
 
-        parser = PydanticOutputParser(pydantic_object=SpecificationResults)
+        parser = PydanticOutputParser(pydantic_object=SpecificationAnalysis)
         prompt = PromptTemplate(
             template="Answer the user query.\n{format_instructions}\n{query}\n{data}",
             input_variables=["query", "data"],
@@ -174,12 +226,24 @@ class AnalyzeSpecsChain(Chain):
         )
         spec_analysis: List[SpecificationAnalysis] = []
         for spec_res in spec_results:
+            match = resolved.get(spec_res.spec_name)
+            if match is not None:
+                spec_analysis.append(SpecificationAnalysis(
+                    eq_uid=eq_inst.design_uid,
+                    spec_name=spec_res.spec_name,
+                    final_result=spec_res.design_result,
+                    submittal_notes=None if match else f"Submittal value {spec_res.submittal_result} does not match design value {spec_res.design_result}",
+                    confidence=1.0,
+                    notes="Compared numerically",
+                ))
+                continue
+
             query = f"The engineering design document for {eq_inst.design_uid} specify that the {spec_res.spec_name} is {spec_res.design_result}. The contractor submittal document specifies that the {spec_res.spec_name} is {spec_res.submittal_result}. Based on the definition of {spec_res.spec_name}, what should the {spec_res.spec_name} be and should we make any notes on the design or submittal about the results?\n{spec_defs[spec_res.spec_name]}"
             logger.debug(f"Querying LLM with query:\n{query}")
-            _input = prompt.format_prompt(query=query)
+            _input = prompt.format_prompt(query=query, data="")
 
             try:
-                output = self.chat.predict(_input.to_string())
+                output = self.chat.predict(_input.to_string(), callbacks=run_manager.get_child() if run_manager else self.callbacks)
                 parsed_output = parser.parse(output)
             except Exception as e:
                 logger.warning(f"LLM couldn't analyze spec results for {eq_inst.name} ({eq_inst.design_uid}) spec {spec_res.spec_name}:\n{output}")
@@ -193,4 +257,20 @@ class AnalyzeSpecsChain(Chain):
                 )
         
             spec_analysis.append(parsed_output)
-        return spec_analysis
\ No newline at end of file
+        return spec_analysis
+
+def set_spec_instance_results(eq: ScopedEquipment, eq_inst: ScopedEquipmentInstance, spec_results: List[SpecificationResults]) -> None:
+    """Fill in resA (design) and resB (submittal) values of eq_inst's specs in eq's results store from spec results"""
+    for spec_res in spec_results:
+        if (eq_inst.name, spec_res.spec_name) not in eq.results:
+            continue
+        if spec_res.design_result is not None:
+            eq.results.set(eq_inst.name, spec_res.spec_name, "resA.value", spec_res.design_result)
+        if spec_res.submittal_result is not None:
+            eq.results.set(eq_inst.name, spec_res.spec_name, "resB.value", spec_res.submittal_result)
+
+def set_spec_instance_analysis(eq: ScopedEquipment, eq_inst: ScopedEquipmentInstance, spec_analysis: List[SpecificationAnalysis]) -> None:
+    """Fill in the final results of eq_inst's specs in eq's results store from spec analysis"""
+    for analysis in spec_analysis:
+        if (eq_inst.name, analysis.spec_name) in eq.results and analysis.final_result is not None:
+            eq.results.set(eq_inst.name, analysis.spec_name, "final_result", analysis.final_result)
@@ -0,0 +1,68 @@
+import re
+import numpy as np
+from collections import Counter
+from typing import Dict, List, Tuple
+
+TOKEN_REGEX = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase text and split into tokens (keeps things like 'm-802', '1/2' and '3.5' together)"""
+    return TOKEN_REGEX.findall(text.lower())
+
+class BM25Index:
+    """
+    Okapi BM25 lexical index over a corpus (eg. the pages of the source reference docs)
+
+    Term frequencies are stored as postings lists (the docs each term is in and how often) so memory grows with the number of tokens, not docs x vocab
+    """
+
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.num_docs = len(texts)
+
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        doc_lens = np.zeros(len(texts), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lens[i] = len(tokens)
+            for token, count in Counter(tokens).items():
+                doc_ids, counts = postings.setdefault(token, ([], []))
+                doc_ids.append(i)
+                counts.append(count)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            token: (np.array(doc_ids, dtype=np.int32), np.array(counts, dtype=np.float32))
+            for token, (doc_ids, counts) in postings.items()
+        }
+
+        self.doc_lens = doc_lens
+        avg_doc_len = doc_lens.mean() if len(texts) > 0 else 0.0
+        self.idf = {token: float(np.log(1 + (len(texts) - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))) for token, (doc_ids, _) in self.postings.items()}
+        self._len_norm = self.k1 * (1 - self.b + self.b * doc_lens / avg_doc_len) if avg_doc_len > 0 else np.full(len(texts), self.k1)
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every doc for query (only the docs in the query terms' postings are touched)"""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for token in set(tokenize(query)):
+            if token not in self.postings:
+                continue
+            doc_ids, tf = self.postings[token]
+            scores[doc_ids] += self.idf[token] * tf * (self.k1 + 1) / (tf + self._len_norm[doc_ids])
+        return scores
+
+    def top_k(self, query: str, k: int = 5) -> List[int]:
+        """Indices of the k best matching docs for query (docs that don't match any query terms are excluded)"""
+        scores = self.scores(query)
+        ranked = np.argsort(-scores, kind="stable")[:k]
+        return [int(i) for i in ranked if scores[i] > 0]
+
+def reciprocal_rank_fusion(rankings: List[List], k: int = 60) -> List:
+    """Fuse several rankings (best first) into one using reciprocal rank fusion"""
+    fused: Dict = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused, key=lambda item: fused[item], reverse=True)
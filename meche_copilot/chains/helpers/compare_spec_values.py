@@ -0,0 +1,142 @@
+import re
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# unit alias -> (dimension, factor to convert to the dimension's canonical unit)
+UNITS: Dict[str, Tuple[str, float]] = {
+    # airflow (cfm)
+    "cfm": ("airflow", 1.0),
+    "l/s": ("airflow", 2.11888),
+    "m3/h": ("airflow", 0.588578),
+    # water flow (gpm)
+    "gpm": ("water_flow", 1.0),
+    # head (ft of water)
+    "ft": ("head", 1.0),
+    "ft-hd": ("head", 1.0),
+    "fthd": ("head", 1.0),
+    "ft.hd": ("head", 1.0),
+    "ft hd": ("head", 1.0),
+    "ft head": ("head", 1.0),
+    "feet": ("head", 1.0),
+    "psi": ("head", 2.31),
+    "kpa": ("head", 0.334553),
+    # power (hp)
+    "hp": ("power", 1.0),
+    "bhp": ("power", 1.0),
+    "kw": ("power", 1.34102),
+    "w": ("power", 0.00134102),
+    # heating/cooling capacity (mbh)
+    "mbh": ("capacity", 1.0),
+    "btuh": ("capacity", 0.001),
+    "btu/h": ("capacity", 0.001),
+    "btu/hr": ("capacity", 0.001),
+    "tons": ("capacity", 12.0),
+    "ton": ("capacity", 12.0),
+    # electrical
+    "v": ("voltage", 1.0),
+    "volts": ("voltage", 1.0),
+    "volt": ("voltage", 1.0),
+    "ph": ("phase", 1.0),
+    "phase": ("phase", 1.0),
+    "hz": ("frequency", 1.0),
+    # speed
+    "rpm": ("speed", 1.0),
+}
+
+# eg. 1,750 or 0.5 or 1/2 or 1-1/2 or 1 1/2
+_NUMBER = r"(\d+(?:\s+|\s*-\s*)\d+/\d+|\d+/\d+|\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d*\.?\d+)"
+_UNIT_ALTERNATION = "|".join(re.escape(unit) for unit in sorted(UNITS, key=len, reverse=True))
+QUANTITY_REGEX = re.compile(_NUMBER + r"\s*(" + _UNIT_ALTERNATION + r")(?![a-z])", re.IGNORECASE)
+# eg. 460/3/60, 208-1-60, 115V/1PH/60HZ
+ELECTRICAL_REGEX = re.compile(r"(\d{3})\s*v?\s*[/\-]\s*([13])\s*(?:ph)?\s*[/\-]\s*(50|60)\s*(?:hz)?(?![0-9])", re.IGNORECASE)
+BARE_NUMBER_REGEX = re.compile(r"^\s*" + _NUMBER + r"\s*$")
+# words left over after the quantities are taken out that don't change what a value means (eg. "120 GPM @ 45 FT")
+FILLER_WORDS = {"at", "and", "with", "of", "each"}
+
+def parse_number(number: str) -> float:
+    """Parse a number that may have thousands separators or be a (mixed) fraction (eg. 1,750 or 1/2 or 1-1/2 or 1 1/2)"""
+    match = re.fullmatch(r"(?:(\d+)(?:\s+|\s*-\s*))?(\d+)/(\d+)", number.strip())
+    if match:
+        whole, numerator, denominator = match.groups()
+        return float(whole or 0) + float(numerator) / float(denominator)
+    return float(number.replace(",", ""))
+
+def _parse(text: Optional[str]) -> Tuple[Dict[str, float], Tuple[str, ...]]:
+    """Quantities in text (see parse_quantities) and the meaningful words left over once they are taken out"""
+    if text is None:
+        return {}, ()
+    text = str(text)
+    quantities: Dict[str, float] = {}
+    match = ELECTRICAL_REGEX.search(text)
+    if match:
+        quantities.update(voltage=float(match.group(1)), phase=float(match.group(2)), frequency=float(match.group(3)))
+        text = text[:match.start()] + " " + text[match.end():]
+    for number, unit in QUANTITY_REGEX.findall(text):
+        dimension, factor = UNITS[unit.lower()]
+        quantities.setdefault(dimension, parse_number(number) * factor)
+    text = QUANTITY_REGEX.sub(" ", text)
+    if not quantities:
+        match = BARE_NUMBER_REGEX.match(text)
+        if match:
+            return {"": parse_number(match.group(1))}, ()
+    leftover = tuple(word for word in re.findall(r"[a-z0-9]+(?:\.[0-9]+)?", text.lower()) if word not in FILLER_WORDS)
+    return quantities, leftover
+
+def parse_quantities(text: Optional[str]) -> Dict[str, float]:
+    """
+    Parse the quantities in a spec value into {dimension: magnitude in canonical units}
+
+    Eg. "5 HP" -> {"power": 5.0}, "1-1/2 HP" -> {"power": 1.5}, "460/3/60" -> {"voltage": 460.0, "phase": 3.0, "frequency": 60.0}. A bare number is returned as {"": value}
+    """
+    return _parse(text)[0]
+
+def _adopt_bare_number(x: Dict[str, float], y: Dict[str, float]) -> Dict[str, float]:
+    """A bare number takes the dimension of the other value if it only has one (eg. "1750" vs "1,750 rpm")"""
+    if set(x) == {""} and len(y) == 1 and "" not in y:
+        return {next(iter(y)): x[""]}
+    return x
+
+def compare_spec_values(a_values: Sequence[Optional[str]], b_values: Sequence[Optional[str]], rtol: float = 0.02, atol: float = 1e-9) -> np.ndarray:
+    """
+    Compare pairs of spec values (eg. design vs submittal for every instance and spec) numerically in bulk
+
+    Returns an object array with True (same quantities within tolerance), False (different) or None (couldn't resolve numerically, eg. free text, different words besides the quantities or the values have different dimensions)
+    """
+    if len(a_values) != len(b_values):
+        raise ValueError(f"a_values and b_values must be the same length. Got {len(a_values)} and {len(b_values)}")
+
+    # parse each distinct value once
+    parsed: Dict[Optional[str], Tuple[Dict[str, float], Tuple[str, ...]]] = {}
+    for value in list(a_values) + list(b_values):
+        if value not in parsed:
+            parsed[value] = _parse(value)
+    pairs: List[Tuple[Dict[str, float], Dict[str, float]]] = []
+    for a, b in zip(a_values, b_values):
+        (qa, a_words), (qb, b_words) = parsed[a], parsed[b]
+        if a_words != b_words:
+            # the values say different things besides their quantities (eg. "5 HP TEFC" vs "5 HP ODP") so leave them to the llm
+            pairs.append(({}, {}))
+            continue
+        pairs.append((_adopt_bare_number(qa, qb), _adopt_bare_number(qb, qa)))
+
+    n = len(pairs)
+    dimensions = sorted({dimension for qa, qb in pairs for dimension in list(qa) + list(qb)})
+    results = np.full(n, None, dtype=object)
+    if not dimensions:
+        return results
+
+    # (dimensions x pairs) magnitude arrays, nan where a value doesn't have that dimension
+    index = {dimension: i for i, dimension in enumerate(dimensions)}
+    a_arr = np.full((len(dimensions), n), np.nan)
+    b_arr = np.full((len(dimensions), n), np.nan)
+    for j, (qa, qb) in enumerate(pairs):
+        for dimension, magnitude in qa.items():
+            a_arr[index[dimension], j] = magnitude
+        for dimension, magnitude in qb.items():
+            b_arr[index[dimension], j] = magnitude
+
+    a_present, b_present = ~np.isnan(a_arr), ~np.isnan(b_arr)
+    resolvable = a_present.any(axis=0) & (a_present == b_present).all(axis=0)
+    matches = (np.isclose(a_arr, b_arr, rtol=rtol, atol=atol) | ~a_present).all(axis=0)
+    results[resolvable] = matches[resolvable]
+    return results
@@ -0,0 +1,38 @@
+import re
+from typing import Dict, Iterable, List, Set
+
+class DesignUidMatcher:
+    """
+    Find every design uid (eg. P-1, P-1A, EF-12) mentioned in some text in a single pass
+
+    Same semantics as checking `uid in text` for each uid (overlapping uids like P-1 and P-1A both match "P-1A") but with one compiled alternation instead of a scan per uid
+    """
+
+    def __init__(self, uids: Iterable[str]):
+        # longest first so the alternation matches the longest uid starting at each position
+        self.uids: List[str] = sorted({uid for uid in uids if uid}, key=len, reverse=True)
+
+        # any uid that is a prefix of the matched uid also occurs at that position
+        self._prefixes: Dict[str, List[str]] = {uid: [other for other in self.uids if uid.startswith(other)] for uid in self.uids}
+
+        # lookahead so matches can overlap (ie. every start position is tried)
+        self._pattern = re.compile("(?=(" + "|".join(re.escape(uid) for uid in self.uids) + "))") if self.uids else None
+
+    def find(self, text: str) -> Set[str]:
+        """Get the set of uids mentioned in text"""
+        found: Set[str] = set()
+        if self._pattern is None:
+            return found
+        for match in self._pattern.finditer(text):
+            found.update(self._prefixes[match.group(1)])
+        return found
+
+    def find_in_blocks(self, text_blocks: Iterable[str]) -> Dict[str, str]:
+        """Get the uids mentioned in any of the text blocks, mapped to the first block that mentions each"""
+        found: Dict[str, str] = {}
+        for text_block in text_blocks:
+            for uid in self.find(text_block):
+                found.setdefault(uid, text_block)
+            if len(found) == len(self.uids):
+                break
+        return found
@@ -0,0 +1,87 @@
+import time
+import fitz
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from pydantic import BaseModel
+from langchain.embeddings.base import Embeddings
+from langchain.embeddings.openai import OpenAIEmbeddings
+from loguru import logger
+
+from meche_copilot.utils.envars import OPENAI_API_KEY
+
+# NOTE: local backend needs sentence-transformers installed (models are downloaded once then run offline)
+DEFAULT_LOCAL_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+class PageChunk(BaseModel):
+    """A chunk of a page's text made from consecutive text blocks (in reading order)"""
+    text: str
+    page: int
+    chunk: int
+    bbox: List[float]
+
+class EmbeddingStats(BaseModel):
+    pages: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+    @property
+    def pages_per_sec(self) -> float:
+        return self.pages / self.seconds if self.seconds > 0 else 0.0
+
+def get_embedding_backend(name: str = "openai", model_name: Optional[str] = None) -> Embeddings:
+    """Get an embedding backend by name (openai or local)"""
+    if name == "openai":
+        return OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY) if model_name is None else OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY, model=model_name)
+    elif name == "local":
+        from langchain.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name or DEFAULT_LOCAL_EMBEDDING_MODEL)
+    else:
+        raise ValueError(f"Unknown embedding backend: {name}. Expected one of: openai, local")
+
+def split_page_into_chunks(page: fitz.Page, max_chars: int = 2000) -> List[PageChunk]:
+    """
+    Split a page into chunks of consecutive text blocks so that regions of a drawing (title block, schedule, notes) stay together
+
+    A block that is longer than max_chars on its own is split by lines
+    """
+    chunks: List[PageChunk] = []
+    texts: List[str] = []
+    bbox = None
+
+    def add_chunk():
+        if texts:
+            chunks.append(PageChunk(text="\n".join(texts), page=page.number, chunk=len(chunks), bbox=list(bbox)))
+
+    for block in page.get_text("blocks", sort=True):
+        x0, y0, x1, y1, text = block[:5]
+        text = text.strip()
+        if not text:
+            continue
+        pieces = [text] if len(text) <= max_chars else text.splitlines()
+        for piece in pieces:
+            if texts and sum(len(t) + 1 for t in texts) + len(piece) > max_chars:
+                add_chunk()
+                texts, bbox = [], None
+            texts.append(piece[:max_chars])
+            bbox = fitz.Rect(x0, y0, x1, y1) if bbox is None else bbox | fitz.Rect(x0, y0, x1, y1)
+    add_chunk()
+    return chunks
+
+def embed_texts(texts: List[str], embedding: Embeddings, batch_size: int = 64, max_workers: int = 4, max_retries: int = 3) -> List[List[float]]:
+    """Embed texts in batches with concurrent workers, retrying failed batches with backoff (results are in the same order as texts)"""
+
+    def embed_batch(batch: List[str]) -> List[List[float]]:
+        for attempt in range(max_retries + 1):
+            try:
+                return embedding.embed_documents(batch)
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+                wait = 2 ** attempt
+                logger.warning(f"Embedding batch of {len(batch)} failed ({e}). Retrying in {wait}s...")
+                time.sleep(wait)
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(embed_batch, batches)
+        return [vector for batch_vectors in results for vector in batch_vectors]
@@ -0,0 +1,167 @@
+import re
+import json
+import hashlib
+import threading
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+from loguru import logger
+
+from meche_copilot.schemas import EngineeringDesignSchedule, ScopedEquipment
+from meche_copilot.utils.converters import write_json_atomic
+
+# unit keywords that show up in spec definitions and schedule headers (eg. "FLOW (GPM)", "MOTOR HP")
+UNIT_KEYWORDS: Dict[str, List[str]] = {
+    "cfm": ["cfm", "airflow"],
+    "gpm": ["gpm"],
+    "ft": ["ft", "feet", "ft-hd", "fthd", "head"],
+    "hp": ["hp", "horsepower", "bhp"],
+    "kw": ["kw", "kilowatt", "kilowatts"],
+    "v": ["v", "volt", "volts", "voltage"],
+    "ph": ["ph", "phase"],
+    "hz": ["hz", "hertz"],
+    "mbh": ["mbh", "btuh", "btu/h"],
+    "rpm": ["rpm", "speed"],
+    "in": ["in", "inwg", "in.w.g", "esp", "sp"],
+    "f": ["f", "degf", "°f", "ewt", "lwt", "eat", "lat"],
+}
+_KEYWORD_UNITS = {keyword: unit for unit, keywords in UNIT_KEYWORDS.items() for keyword in keywords}
+
+# work units map specs concurrently so updates to the spec header map cache are serialized
+_spec_header_maps_lock = threading.Lock()
+
+def normalize_label(label: str) -> str:
+    """Lowercase and replace punctuation with spaces (keeps / and - inside words)"""
+    return " ".join(re.findall(r"[a-z0-9°]+(?:[/\-.][a-z0-9]+)*", str(label).lower()))
+
+def detect_units(text: str) -> Set[str]:
+    """Units mentioned in a label or definition (compound tokens like volts/ph/hz are also checked part by part)"""
+    units = set()
+    for token in normalize_label(text).split():
+        for part in [token] + re.split(r"[/\-]", token):
+            if part in _KEYWORD_UNITS:
+                units.add(_KEYWORD_UNITS[part])
+    return units
+
+def spec_header_score(spec_name: str, spec_def: str, header: str) -> float:
+    """
+    How well a schedule header matches a spec (0 to ~1.2)
+
+    Token overlap of the names (fuzzy string similarity only if they share no tokens, eg. AIRFLOW vs AIR FLOW), with a bonus if the units agree and a penalty if they conflict
+    """
+    name, head = normalize_label(spec_name), normalize_label(header)
+    if not name or not head:
+        return 0.0
+    name_tokens, head_tokens = set(name.split()), set(head.split())
+    shared = name_tokens & head_tokens
+    if shared:
+        score = 2 * len(shared) / (len(name_tokens) + len(head_tokens))
+    else:
+        score = 0.8 * SequenceMatcher(None, name, head).ratio()
+
+    spec_units = detect_units(f"{spec_name} {spec_def}")
+    header_units = detect_units(header)
+    if spec_units and header_units:
+        score += 0.2 if spec_units & header_units else -0.3
+    return score
+
+def head_token_match(spec_name: str, header: str) -> bool:
+    """Whether the header has the last word of the spec name (ie. what the spec is, eg. RPM in Motor RPM)"""
+    name_tokens = normalize_label(spec_name).split()
+    return bool(name_tokens) and name_tokens[-1] in normalize_label(header).split()
+
+def map_specs_to_headers(spec_defs: Dict[str, str], headers: List[str], threshold: float = 0.6) -> Dict[str, str]:
+    """
+    Map spec names to schedule headers (each header is used at most once)
+
+    Pairs are assigned greedily from the best score down (ties go to the header with the spec's last word) and specs without a header scoring at least threshold are left unmapped
+    """
+    scores = [
+        (spec_header_score(spec_name, spec_def or "", header), head_token_match(spec_name, header), spec_name, header)
+        for spec_name, spec_def in spec_defs.items()
+        for header in headers
+    ]
+    mapping: Dict[str, str] = {}
+    used_headers = set()
+    for score, _, spec_name, header in sorted(scores, key=lambda s: (s[0], s[1]), reverse=True):
+        if score < threshold:
+            break
+        if spec_name in mapping or header in used_headers:
+            continue
+        mapping[spec_name] = header
+        used_headers.add(header)
+    return mapping
+
+def spec_header_map_key(spec_defs: Dict[str, str], headers: List[str]) -> str:
+    return hashlib.sha1(json.dumps([sorted(spec_defs.items()), sorted(headers)]).encode()).hexdigest()
+
+def _read_spec_header_maps(cache_fpath: Optional[Path]) -> Dict[str, Dict[str, str]]:
+    if cache_fpath is None or not Path(cache_fpath).exists():
+        return {}
+    with Path(cache_fpath).open('r') as f:
+        return json.load(f)
+
+def get_spec_header_map(spec_defs: Dict[str, str], headers: List[str], cache_fpath: Optional[Path] = None, threshold: float = 0.6) -> Dict[str, str]:
+    """
+    map_specs_to_headers memoized per template (spec defs and headers) in a json file at cache_fpath
+
+    The cache file is re-read and replaced atomically under a lock when a new map is added so maps added by other threads aren't lost
+    """
+    key = spec_header_map_key(spec_defs, headers)
+    cache = _read_spec_header_maps(cache_fpath)
+    if key in cache:
+        logger.debug(f"Using cached spec to header map: {cache[key]}")
+        return cache[key]
+
+    mapping = map_specs_to_headers(spec_defs, headers, threshold=threshold)
+    logger.info(f"Mapped {len(mapping)}/{len(spec_defs)} specs to schedule headers: {mapping}")
+    if cache_fpath is not None:
+        with _spec_header_maps_lock:
+            cache = _read_spec_header_maps(cache_fpath)
+            cache[key] = mapping
+            write_json_atomic(cache, Path(cache_fpath), indent=2)
+    return mapping
+
+def get_eq_spec_header_map(eq: ScopedEquipment, data_attr: str = 'design_data', cache_fpath: Optional[Path] = None) -> Dict[str, str]:
+    """Map eq's spec names to the keys (ie. schedule headers) of its instances' design_data or submittal_data (cached per template at cache_fpath)"""
+    headers = sorted({header for eq_inst in eq.instances for header in (getattr(eq_inst, data_attr) or {})})
+    if not headers:
+        return {}
+    return get_spec_header_map(eq.spec_defs, headers, cache_fpath=cache_fpath)
+
+def schedule_rows(schedule: EngineeringDesignSchedule) -> Dict[str, Dict[str, str]]:
+    """A schedule's rows as {row label (ie. design uid): {column label: value}}, skipping rows whose values don't line up with the column labels"""
+    labels = getattr(schedule, 'column_labels', None) or schedule.headers or []
+    rows = {}
+    for row_label, values in (schedule.row_data or {}).items():
+        if len(labels) == len(values) + 1: # column labels include the row label (tag) column
+            row_columns = labels[1:]
+        elif len(labels) == len(values):
+            row_columns = labels
+        else:
+            logger.debug(f"{schedule.title} row {row_label} has {len(values)} values for {len(labels)} column labels, skipping it")
+            continue
+        rows[row_label] = {label: str(value) for label, value in zip(row_columns, values) if value is not None}
+    return rows
+
+def set_design_data_from_schedules(eq: ScopedEquipment, design_schedules: List[EngineeringDesignSchedule]) -> int:
+    """
+    Fill in the design_data of eq's instances from the rows of eq's design schedules (returns the number of instances filled in)
+
+    Instances are matched to rows by their normalized design uid, or their name (tag) if they don't have one yet, in which case the row label becomes their design uid. Instances without a matching row are left as is so their design values are looked up by the llm
+    """
+    rows: Dict[str, Dict[str, str]] = {}
+    for schedule in design_schedules:
+        if schedule.equipment_name == eq.name:
+            rows.update(schedule_rows(schedule))
+    rows_by_uid = {normalize_label(row_label): (row_label, row) for row_label, row in rows.items()}
+
+    filled = 0
+    for eq_inst in eq.instances:
+        row_label, row = rows_by_uid.get(normalize_label(eq_inst.design_uid or eq_inst.name), (None, None))
+        if row:
+            eq_inst.design_uid = eq_inst.design_uid or row_label
+            eq_inst.design_data = row
+            filled += 1
+    logger.info(f"Filled in design data for {filled}/{len(eq.instances)} {eq.name} instances from design schedules")
+    return filled
@@ -1,4 +1,5 @@
 import math
+import json
 import fitz
 import camelot
 import difflib
@@ -9,6 +10,7 @@ from typing import Dict, List
 import matplotlib.pyplot as plt
 
 from meche_copilot.pdf_helpers.get_table_rect import get_table_rect
+from meche_copilot.pdf_helpers.page_image_cache import CachedPageImageBackend
 from meche_copilot.pdf_helpers.flip_origin_tl_to_bl import flip_origin_tl_to_bl
 from meche_copilot.utils.converters import title_to_filename
 from meche_copilot.utils.envars import DATA_CACHE
@@ -146,6 +148,108 @@ def postprocess_camelot_df(title: str, df: pd.DataFrame, expected_row_data: Dict
     return cleaned_df
 
 
+# NOTE: ordered from cheapest to most expensive, adaptive mode only escalates when the table shape doesn't match the expected row data
+CAMELOT_PARAMS_LADDER = [
+    {'line_scale': 120, 'resolution': 200},
+    {'line_scale': 80, 'resolution': 300},
+    {'line_scale': 120, 'resolution': 300},
+    {'line_scale': 120, 'resolution': 500},
+    {'line_scale': 150, 'resolution': 500},
+    {'line_scale': 150, 'resolution': 700},
+]
+CAMELOT_PARAMS_MEMO_FPATH = DATA_CACHE / 'camelot_params.json'
+
+def camelot_params_key(pdf_fpath: Path, page: fitz.Page) -> str:
+    """Key for the sheet template of a page (schedules on the same size sheets in the same set tend to parse with the same settings)"""
+    width, height = page.rect.width, page.rect.height
+    return f"{Path(pdf_fpath).name}:{round(width)}x{round(height)}"
+
+def load_camelot_params_memo(fpath: Path = CAMELOT_PARAMS_MEMO_FPATH) -> Dict[str, Dict[str, int]]:
+    if not fpath.exists():
+        return {}
+    with fpath.open('r') as f:
+        return json.load(f)
+
+def save_camelot_params_memo(memo: Dict[str, Dict[str, int]], fpath: Path = CAMELOT_PARAMS_MEMO_FPATH) -> None:
+    with fpath.open('w') as f:
+        json.dump(memo, f, indent=2)
+
+def read_camelot_table(pdf_fpath: Path, page: fitz.Page, table_areas: str, line_scale: int, resolution: int, copy_text: List[str]) -> camelot.core.TableList:
+    """Read the table within table_areas on page with camelot (must find exactly one table)"""
+
+    logger.debug(f"Camelot extracting table with line_scale: {line_scale}, resolution: {resolution}, copy_text: {copy_text}")
+    tables = camelot.read_pdf(
+        str(pdf_fpath), 
+        pages=str(page.number+1), # camelot uses 1-indexing for page number
+        flavor='lattice', 
+        table_areas=[table_areas],
+        line_scale=line_scale,
+        # split_text=True,
+        # strip_text='\n',
+        # columns=['']
+        copy_text=copy_text,
+        suppress_stdout=False,
+        # layout_kwargs={},
+        backend=CachedPageImageBackend(resolution=resolution),
+        resolution=resolution,
+        )
+    
+    logger.debug(f"Camelot found {len(tables)} tables on page: {page.number}")
+
+    if len(tables) != 1:
+        raise ValueError(f"Camelot should have found 1 table within selected rectangle on page {page.number} but found {len(tables)}")
+
+    return tables
+
+def save_camelot_plots(table: camelot.core.Table, title: str, page_number: int, resolution: int) -> None:
+    """Save camelot table extraction plots to see what's going on"""
+
+    fname = title_to_filename(title)
+    fpath = DATA_CACHE / 'camelot_plots'
+
+    logger.debug(f"Saving camelot table extraction plots to: {fpath}")
+
+    for kind in ['grid', 'joint', 'contour', 'line']:
+        fig = camelot.plot(table, kind=kind)
+        fig.savefig(fpath / f"{fname}_p{page_number}_{kind}.png", dpi=resolution)
+        plt.close()
+
+def adaptive_schedule_table_to_df(pdf_fpath: Path, page: fitz.Page, title: str, table_areas: str, expected_row_data: Dict[str, List], **kwargs) -> pd.DataFrame:
+    """
+    Try camelot settings from low to high resolution until the postprocessed table has the shape expected from expected_row_data
+
+    The settings that worked are memoized per document/sheet template so later schedules in the same set try them first
+    """
+
+    show_your_work = kwargs.get('show_your_work', False)
+    copy_text = kwargs.get('copy_text', ['h'])
+    postprocess_kwargs = {k: v for k, v in kwargs.items() if k not in ['line_scale', 'resolution', 'copy_text']}
+
+    memo = load_camelot_params_memo()
+    key = camelot_params_key(pdf_fpath, page)
+    candidates = list(CAMELOT_PARAMS_LADDER)
+    if key in memo:
+        logger.debug(f"Trying memoized camelot params for {key} first: {memo[key]}")
+        candidates = [memo[key]] + [params for params in candidates if params != memo[key]]
+
+    for params in candidates:
+        try:
+            tables = read_camelot_table(pdf_fpath=pdf_fpath, page=page, table_areas=table_areas, copy_text=copy_text, **params)
+            postprocessed_df = postprocess_camelot_df(title, tables[0].df, expected_row_data=expected_row_data, **postprocess_kwargs)
+        except (AssertionError, ValueError, IndexError) as e:
+            logger.debug(f"Camelot params {params} didn't produce expected table for {title}: {e}")
+            continue
+
+        logger.success(f"Camelot params {params} produced expected table for {title}")
+        if show_your_work:
+            save_camelot_plots(table=tables[0], title=title, page_number=page.number, resolution=params['resolution'])
+        if memo.get(key) != params:
+            memo[key] = params
+            save_camelot_params_memo(memo)
+        return postprocessed_df
+
+    raise ValueError(f"None of the camelot params {candidates} produced the expected table shape for {title} on page {page.number}")
+
 def mechanical_schedule_table_to_df(pdf_fpath: Path, title: str, last_row: str, page_number: str = None, expected_row_data: Dict[str, List] = None, **kwargs) -> pd.DataFrame:
     """Get the mechanical schedule table data as a dataframe"""
 
@@ -183,54 +287,16 @@ def mechanical_schedule_table_to_df(pdf_fpath: Path, title: str, last_row: str,
         resolution = kwargs.get('resolution', 500) # higher resolution that camelots default of 300
         copy_text = kwargs.get('copy_text', ['h']) # copy text in spanning cells
 
-        logger.debug(f"Camelot extracting table with line_scale: {line_scale}, resolution: {resolution}, copy_text: {copy_text}")
-        tables = camelot.read_pdf(
-            str(pdf_fpath), 
-            pages=str(page.number+1), # camelot uses 1-indexing for page number
-            flavor='lattice', 
-            table_areas=[table_areas],
-            line_scale=line_scale,
-            # split_text=True,
-            # strip_text='\n',
-            # columns=['']
-            copy_text=copy_text,
-            suppress_stdout=False,
-            # layout_kwargs={},
-            # backend="ghostscript"
-            resolution=resolution,
-            )
-        
-        logger.debug(f"Camelot found {len(tables)} tables on page: {page.number}")
+        adaptive = kwargs.get('adaptive', False)
+        if adaptive and expected_row_data is not None:
+            return adaptive_schedule_table_to_df(pdf_fpath=pdf_fpath, page=page, title=title, table_areas=table_areas, expected_row_data=expected_row_data, **kwargs)
 
-        if len(tables) != 1:
-            raise ValueError(f"Camelot should have found 1 table within selected rectangle on page {page.number} but found {len(tables)}")
-        
+        tables = read_camelot_table(pdf_fpath=pdf_fpath, page=page, table_areas=table_areas, line_scale=line_scale, resolution=resolution, copy_text=copy_text)
 
         logger.debug(f"Parsing report: {tables[0].parsing_report}")
 
-        # if kwarg 'show' is True: save these plots to see what's going on
-        show_your_work = kwargs.get('show_your_work', False)
         if show_your_work:
-            fname = title_to_filename(title)
-            fpath = DATA_CACHE / 'camelot_plots'
-
-            logger.debug(f"Saving camelot table extraction plots to: {fpath}")
-            
-            fig = camelot.plot(tables[0], kind='grid')
-            fig.savefig(fpath / f"{fname}_p{page.number}_grid.png", dpi=resolution)
-            plt.close()
-            
-            fig = camelot.plot(tables[0], kind='joint')
-            fig.savefig(fpath / f"{fname}_p{page.number}_joint.png", dpi=resolution)
-            plt.close()
-
-            fig = camelot.plot(tables[0], kind='contour')
-            fig.savefig(fpath / f"{fname}_p{page.number}_contour.png", dpi=resolution)
-            plt.close()
-
-            fig = camelot.plot(tables[0], kind='line')
-            fig.savefig(fpath / f"{fname}_p{page.number}_line.png", dpi=resolution)
-            plt.close()
+            save_camelot_plots(table=tables[0], title=title, page_number=page.number, resolution=resolution)
 
         logger.success(f"Creating df from table")
         if expected_row_data is None:
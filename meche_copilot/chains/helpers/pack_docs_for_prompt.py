@@ -0,0 +1,82 @@
+import re
+import json
+import fitz
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from langchain.schema import Document
+from loguru import logger
+
+from meche_copilot.pdf_helpers.pdf_thread import run_on_pdf_thread
+from meche_copilot.utils.num_tokens_from_string import num_tokens_from_string
+
+def collapse_whitespace(text: str) -> str:
+    """Collapse runs of spaces/tabs to one space and runs of blank lines to one newline"""
+    text = re.sub(r"[ \t\r\f\v]+", " ", text)
+    text = re.sub(r" ?\n[ \n]*", "\n", text)
+    return text.strip()
+
+def page_header(doc: Document) -> str:
+    source = doc.metadata.get("source")
+    page = doc.metadata.get("page")
+    name = Path(source).name if source else "unknown source"
+    return f"## {name} p.{page}" if page is not None else f"## {name}"
+
+def table_to_markdown(rows: List[List[Optional[str]]]) -> str:
+    """Markdown table from a list of rows (first row is the header)"""
+    rows = [[collapse_whitespace(cell or "").replace("\n", " ").replace("|", "/") for cell in row] for row in rows if any(row)]
+    if not rows:
+        return ""
+    lines = ["| " + " | ".join(rows[0]) + " |", "|" + "---|" * len(rows[0])]
+    lines += ["| " + " | ".join(row) + " |" for row in rows[1:]]
+    return "\n".join(lines)
+
+def page_text_with_tables(doc: Document) -> Optional[str]:
+    """
+    Page text with tables (eg. schedules) as markdown and the rest as plain text blocks, in reading order
+
+    Returns None if the page can't be opened or has no tables (NOTE: needs a PyMuPDF version with Page.find_tables)
+    """
+    source, page_number = doc.metadata.get("source"), doc.metadata.get("page")
+    if source is None or page_number is None or not Path(source).exists():
+        return None
+    with fitz.open(str(source)) as pdf:
+        page = pdf[int(page_number)]
+        if not hasattr(page, "find_tables"):
+            logger.debug("PyMuPDF version has no find_tables, not converting tables to markdown")
+            return None
+        tables = list(page.find_tables().tables)
+        if not tables:
+            return None
+        table_rects = [fitz.Rect(table.bbox) for table in tables]
+        parts = [(tuple(rect)[1], table_to_markdown(table.extract())) for rect, table in zip(table_rects, tables)]
+        for block in page.get_text("blocks", sort=True):
+            rect = fitz.Rect(block[:4])
+            if not any(rect.intersects(table_rect) for table_rect in table_rects):
+                parts.append((rect.y0, collapse_whitespace(block[4])))
+    return "\n".join(text for _, text in sorted(parts, key=lambda part: part[0]) if text)
+
+def pack_docs_for_prompt(docs: List[Document], tables: bool = False) -> str:
+    """
+    Pack relavent docs into a compact string for prompts (page header then the page text with whitespace collapsed)
+
+    Much smaller than json dumping the docs since there is no metadata or escaping of newlines and quotes. If tables, schedule tables are converted to markdown
+    """
+    packed_pages = []
+    seen = set()
+    for doc in docs:
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        if key in seen and key != (None, None):
+            continue
+        seen.add(key)
+        # NOTE: lookups of concurrent work units pack docs on their own threads so PyMuPDF runs on the shared pdf thread
+        text = run_on_pdf_thread(page_text_with_tables, doc) if tables else None
+        packed_pages.append(f"{page_header(doc)}\n{text if text is not None else collapse_whitespace(doc.page_content)}")
+    return "\n\n".join(packed_pages)
+
+def tokens_per_page(docs: List[Document], count_tokens: Callable[[str], int] = num_tokens_from_string, tables: bool = False) -> Dict[str, float]:
+    """Benchmark average tokens per page of json dumped docs vs packed docs"""
+    if not docs:
+        return {"json": 0.0, "packed": 0.0}
+    json_tokens = count_tokens(json.dumps([doc.dict() for doc in docs]))
+    packed_tokens = count_tokens(pack_docs_for_prompt(docs, tables=tables))
+    return {"json": json_tokens / len(docs), "packed": packed_tokens / len(docs)}
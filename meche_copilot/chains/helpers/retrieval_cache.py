@@ -0,0 +1,84 @@
+import json
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+from langchain.schema import Document
+from loguru import logger
+
+from meche_copilot.schemas import Source
+from meche_copilot.utils.converters import pydantic_to_jsonl, pydantic_from_jsonl
+
+def retrieval_cache_key(source: Source, query: str = "", spec_defs: Optional[Dict[str, str]] = None, **params) -> str:
+    """
+    Fingerprint of everything that determines what the retriever returns for a source
+
+    Ref docs are fingerprinted by path, size and mtime so the key changes (ie. the cache is invalidated) when a ref doc changes
+    """
+    ref_docs = []
+    for fpath in source.ref_docs or []:
+        stat = Path(fpath).stat()
+        ref_docs.append([str(fpath), stat.st_size, stat.st_mtime_ns])
+    fingerprint = {
+        "notes": source.notes,
+        "ref_docs": ref_docs,
+        "query": query,
+        "spec_defs": spec_defs or {},
+        "params": params,
+    }
+    return hashlib.sha1(json.dumps(fingerprint, sort_keys=True, default=str).encode()).hexdigest()
+
+class RetrievalCache:
+    """
+    Memoized retriever results (relavent docs) keyed by source fingerprint
+
+    Kept in memory and (if cache_dir is given) on disk as one jsonl file per key so results are shared across equipment instances and runs
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self._docs: Dict[str, List[Document]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[Document]]:
+        with self._lock:
+            if key in self._docs:
+                logger.debug(f"Retrieval cache hit (memory): {key}")
+                return list(self._docs[key])
+        fpath = self._fpath(key)
+        if fpath is not None and fpath.exists():
+            logger.debug(f"Retrieval cache hit (disk): {key}")
+            docs = pydantic_from_jsonl(fpath, Document)
+            with self._lock:
+                self._docs[key] = docs
+            return list(docs)
+        return None
+
+    def set(self, key: str, docs: List[Document]) -> None:
+        with self._lock:
+            self._docs[key] = list(docs)
+        fpath = self._fpath(key)
+        if fpath is not None:
+            fpath.parent.mkdir(parents=True, exist_ok=True)
+            pydantic_to_jsonl(docs, fpath)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._docs.clear()
+        if self.cache_dir is not None and self.cache_dir.exists():
+            for fpath in self.cache_dir.glob("*.jsonl"):
+                fpath.unlink()
+
+    def _fpath(self, key: str) -> Optional[Path]:
+        return self.cache_dir / f"{key}.jsonl" if self.cache_dir is not None else None
+
+_retrieval_caches: Dict[Path, RetrievalCache] = {}
+_retrieval_caches_lock = threading.Lock()
+
+def get_retrieval_cache(cache_dir: Path) -> RetrievalCache:
+    """The RetrievalCache for cache_dir, created on first use and shared by every caller (eg. every work unit of a session) after that"""
+    cache_dir = Path(cache_dir).resolve()
+    with _retrieval_caches_lock:
+        if cache_dir not in _retrieval_caches:
+            _retrieval_caches[cache_dir] = RetrievalCache(cache_dir=cache_dir)
+        return _retrieval_caches[cache_dir]
@@ -0,0 +1,102 @@
+import json
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field, PrivateAttr
+from loguru import logger
+
+from meche_copilot.utils.converters import write_json_atomic
+
+def file_content_hash(fpath: Path) -> str:
+    """sha1 of the file contents"""
+    sha = hashlib.sha1()
+    with Path(fpath).open('rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def page_text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()
+
+class SourceDocEntry(BaseModel):
+    """What has been embedded in the vectorstore for a single source reference doc"""
+    source: str = Field(description="path to the source pdf (as stored in the vectorstore metadata)")
+    content_hash: str = Field(description="hash of the pdf file contents")
+    size: int = Field(description="file size in bytes when the pdf was ingested")
+    mtime_ns: int = Field(description="file modified time when the pdf was ingested")
+    page_count: int
+    embedding_model: str
+    page_hashes: List[str] = Field(default=[], description="hash of the text of each page")
+    page_ids: List[List[str]] = Field(default=[], description="vectorstore ids of the documents for each page")
+
+class SourceDocsManifest(BaseModel):
+    """
+    Manifest of the source reference docs in the vectorstore, persisted next to the vectorstore
+
+    Lets us check whether a source doc is already embedded (and look up its ids by page) without scanning the collection
+
+    Retrievers share one manifest per collection (see get_source_docs_manifest) so entries are set and saved under a lock, and source_lock serializes checking and ingesting each source doc
+    """
+    fpath: Path
+    entries: Dict[str, SourceDocEntry] = {}
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _source_locks: Dict[str, threading.Lock] = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    def load(cls, fpath: Path) -> "SourceDocsManifest":
+        fpath = Path(fpath)
+        if not fpath.exists():
+            return cls(fpath=fpath)
+        with fpath.open('r') as f:
+            entries = json.load(f)
+        return cls(fpath=fpath, entries=entries)
+
+    def save(self) -> None:
+        with self._lock:
+            write_json_atomic({source: entry.dict() for source, entry in self.entries.items()}, self.fpath, indent=2)
+
+    def get(self, src_fpath: Path) -> Optional[SourceDocEntry]:
+        return self.entries.get(str(src_fpath))
+
+    def set(self, entry: SourceDocEntry) -> None:
+        with self._lock:
+            self.entries[entry.source] = entry
+
+    def source_lock(self, src_fpath: Path) -> threading.Lock:
+        """The lock to hold while checking and (re)ingesting src_fpath"""
+        with self._lock:
+            return self._source_locks.setdefault(str(src_fpath), threading.Lock())
+
+    def is_current(self, src_fpath: Path, embedding_model: str) -> bool:
+        """Whether src_fpath is in the vectorstore, unchanged since it was ingested and embedded with embedding_model"""
+        entry = self.get(src_fpath)
+        if entry is None or entry.embedding_model != embedding_model:
+            return False
+        stat = Path(src_fpath).stat()
+        if stat.st_size == entry.size and stat.st_mtime_ns == entry.mtime_ns:
+            return True
+        # file was touched, only changed if the contents changed
+        if stat.st_size == entry.size and file_content_hash(src_fpath) == entry.content_hash:
+            logger.debug(f"{src_fpath} was touched but its contents haven't changed")
+            entry.mtime_ns = stat.st_mtime_ns
+            return True
+        return False
+
+    def page_ids(self, src_fpath: Path, page: int) -> Optional[List[str]]:
+        """Vectorstore ids for a page of a source doc (None if the page isn't in the manifest)"""
+        entry = self.get(src_fpath)
+        if entry is None or not 0 <= page < len(entry.page_ids):
+            return None
+        return entry.page_ids[page]
+
+_manifests: Dict[Path, SourceDocsManifest] = {}
+_manifests_lock = threading.Lock()
+
+def get_source_docs_manifest(fpath: Path) -> SourceDocsManifest:
+    """The SourceDocsManifest at fpath, loaded on first use and shared by every caller (eg. the retrievers of every work unit) after that"""
+    fpath = Path(fpath).resolve()
+    with _manifests_lock:
+        if fpath not in _manifests:
+            _manifests[fpath] = SourceDocsManifest.load(fpath)
+        return _manifests[fpath]
@@ -1,20 +1,41 @@
 import re
-from typing import Any, Coroutine, List, Tuple, Optional
-from pydantic import Field
+import time
+import asyncio
+import fitz
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import ClassVar, Dict, List, Tuple, Optional
+from pydantic import BaseModel, Field, PrivateAttr
 from langchain.schema.document import Document
 from langchain.vectorstores import Chroma
 from langchain.schema import BaseRetriever, Document
-from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.callbacks.manager import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
-# TODO - which pdfloader is best for engineering drawings? perhaps UnstructuredPDFLoader with mode="elements" and strategy="hi_res"?
-from langchain.document_loaders import PyPDFLoader
 from loguru import logger
 
 from meche_copilot.schemas import AgentConfig, Source
+from meche_copilot.chains.helpers.bm25_index import BM25Index, reciprocal_rank_fusion
+from meche_copilot.chains.helpers.embed_source_docs import EmbeddingStats, PageChunk, embed_texts, get_embedding_backend, split_page_into_chunks
+from meche_copilot.chains.helpers.source_docs_manifest import SourceDocsManifest, SourceDocEntry, file_content_hash, get_source_docs_manifest, page_text_hash
 from meche_copilot.pdf_helpers.get_page_from_sheet import get_page_from_sheet
 from meche_copilot.pdf_helpers.get_pages_from_text import get_pages_from_text
+from meche_copilot.pdf_helpers.iter_page_text_blocks import iter_page_text_blocks
+from meche_copilot.pdf_helpers.pdf_thread import pdf_executor, run_on_pdf_thread
+from meche_copilot.utils.envars import CHROMA_DB_DIR, DATA_CACHE
 
-from meche_copilot.utils.envars import OPENAI_API_KEY
+def _run_in_executor(executor: Optional[ThreadPoolExecutor], func, *args, **kwargs) -> asyncio.Future:
+  """Run func on executor (None for the event loop's default executor) from the running event loop"""
+  return asyncio.get_running_loop().run_in_executor(executor, partial(func, *args, **kwargs))
+
+class SourcePages(BaseModel):
+  """What reading a source doc for ingestion found: every page's text hash and ids, and the chunks (and their ids) of the new or changed pages to embed"""
+  page_hashes: List[str] = []
+  page_ids: List[List[str]] = []
+  new_chunks: List[PageChunk] = []
+  new_ids: List[str] = []
+  stale_ids: List[str] = []
+  page_count: int = 0
 
 # TODO - in the future, consider using Grobid to extract text from PDFs since these types of pdfs are engineering drawings and things with structured data and we'd like to retain metadata with the text we lookup
 
@@ -26,6 +47,8 @@ class SpecsRetriever(BaseRetriever):
   - If a page is mentioned in the ref_notes (regex: p. or page or p or pn or pg. etc), get the docs with that page number
 
   - If quotes are found (' or ") in the ref_notes find exact matches of that quote
+
+  - Otherwise, use hybrid search (bm25 over the page text + vector similarity) with the query and spec names/definitions to get the top pages
   
   """
 
@@ -33,12 +56,47 @@ class SpecsRetriever(BaseRetriever):
   source: Source
   
   chroma_db: Optional[Chroma]
+  persist_directory: str = str(CHROMA_DB_DIR)
+
+  spec_defs: Dict[str, str] = {}
+  top_k: int = 5
+  page_text_cache: Path = DATA_CACHE / 'page_text_blocks'
+
+  _manifest: Optional[SourceDocsManifest] = PrivateAttr(default=None)
+  _bm25: Optional[Tuple[BM25Index, List[Tuple[int, Path]]]] = PrivateAttr(default=None)
+
+  SHEET_REGEX: ClassVar[str] = r'[A-Za-z]-\d{3}'
+  PAGE_REGEX: ClassVar[str] = r'(p\.|page|p|pn|pg\.)\s*(\d+)'
+  QUOTE_REGEX: ClassVar[str] = r"(?<=')[^']*(?=')|(?<=\")[^\"]*(?=\")"
 
   def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun, **kwargs) -> List[Document]:
-    relavent_docs: List[Document] = []
-    relavent_page_source: List[Tuple[str, str]] = []
+    return self._retrieve(query, refresh_source_docs=kwargs.get('refresh_source_docs', None))
+
+  async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun, **kwargs) -> List[Document]:
+    """
+    Same as _get_relevant_documents without blocking the event loop
+
+    Only the PyMuPDF calls run on the shared pdf thread (see pdf_helpers.pdf_thread), vectorstore and embedding calls run on the default executor. The vectorstore check and the sheet, page and quote lookups of every ref doc run concurrently, as do the bm25 and vector rankings of a hybrid search
+    """
+    _, *ref_doc_pages = await asyncio.gather(
+      self._acheck_db_contents(refresh_source_docs=kwargs.get('refresh_source_docs', None)),
+      *(self._aget_ref_doc_pages(src_fpath) for src_fpath in self.source.ref_docs),
+    )
+    unique_page_src = self._unique_page_srcs([page_src for page_srcs in ref_doc_pages for page_src in page_srcs])
+    if len(unique_page_src) == 0:
+      logger.warning("Reference notes did not mention any specific pages, sheets, or quotes to look for so defaulting to hybrid search")
+      unique_page_src = await self._ahybrid_search(query)
+    return await _run_in_executor(None, self._get_pages, unique_page_src)
+
+  async def _aget_ref_doc_pages(self, src_fpath: Path) -> List[Tuple[int, Path]]:
+    """Pages of src_fpath mentioned in the ref notes (sheet and quote scans run on the pdf thread)"""
+    sheet_pages, quote_pages = await asyncio.gather(
+      _run_in_executor(pdf_executor, self._get_sheet_pages, src_fpath),
+      _run_in_executor(pdf_executor, self._get_quote_pages, src_fpath),
+    )
+    return sheet_pages + self._get_page_pages(src_fpath) + quote_pages
 
-    refresh_source_docs = kwargs.get('refresh_source_docs', None)
+  def _retrieve(self, query: str, refresh_source_docs: Optional[bool] = None) -> List[Document]:
     if refresh_source_docs is not None:
         logger.debug(f'refresh_source_docs was passed with value {refresh_source_docs}')
     else:
@@ -46,116 +104,317 @@ class SpecsRetriever(BaseRetriever):
 
     self.check_db_contents(refresh_source_docs=refresh_source_docs)
 
-    sheet_regex = r'[A-Za-z]-\d{3}'
-    sheet_matches = re.findall(sheet_regex, self.source.notes)
+    # NOTE: retrievers of concurrent work units call this from their own threads so PyMuPDF calls go through the shared pdf thread
+    relavent_page_source: List[Tuple[int, Path]] = []
+    for src_fpath in self.source.ref_docs:
+      relavent_page_source += run_on_pdf_thread(self._get_sheet_pages, src_fpath)
+      relavent_page_source += self._get_page_pages(src_fpath)
+      relavent_page_source += run_on_pdf_thread(self._get_quote_pages, src_fpath)
+
+    return self._get_docs_for_pages(query, relavent_page_source)
+
+  def _get_docs_for_pages(self, query: str, relavent_page_source: List[Tuple[int, Path]]) -> List[Document]:
+    unique_page_src = self._unique_page_srcs(relavent_page_source)
+    if len(unique_page_src) == 0:
+      logger.warning("Reference notes did not mention any specific pages, sheets, or quotes to look for so defaulting to hybrid search")
+      return self._get_pages(self._hybrid_search(query))
+    return self._get_pages(unique_page_src)
+
+  @staticmethod
+  def _unique_page_srcs(relavent_page_source: List[Tuple[int, Path]]) -> List[Tuple[int, Path]]:
+    unique_page_src = list(dict.fromkeys((int(pg), Path(src)) for pg, src in relavent_page_source))
+    logger.debug(f"total unique pg/src from ref notes: {unique_page_src}")
+    return unique_page_src
+
+  def _get_sheet_pages(self, src_fpath: Path) -> List[Tuple[int, Path]]:
+    """Pages of src_fpath with the sheets mentioned in the ref notes (eg. M-802)"""
+    sheet_matches = re.findall(self.SHEET_REGEX, self.source.notes)
     logger.debug(f"ref_notes mentioned sheets: {sheet_matches}")
-    if len(sheet_matches) > 0:
-      for sheet in sheet_matches:
-        for src_fpath in self.source.ref_docs:
-          res = get_page_from_sheet(sheet=sheet, pdf_fpath=src_fpath)
-          if res is not None:
-            relavent_page_source.append((res[0], src_fpath))
-          else:
-            logger.warning(f"Could not find sheet {sheet} in {src_fpath}")
-    
-    page_regex = r'(p\.|page|p|pn|pg\.)\s*(\d+)'
-    page_matches = re.findall(page_regex, self.source.notes, re.IGNORECASE)
+    page_srcs = []
+    for sheet in sheet_matches:
+      res = get_page_from_sheet(sheet=sheet, pdf_fpath=src_fpath)
+      if res is not None:
+        page_srcs.append((res[0], src_fpath))
+      else:
+        logger.warning(f"Could not find sheet {sheet} in {src_fpath}")
+    return page_srcs
+
+  def _get_page_pages(self, src_fpath: Path) -> List[Tuple[int, Path]]:
+    """Pages mentioned in the ref notes (eg. pg. 3)"""
+    page_matches = re.findall(self.PAGE_REGEX, self.source.notes, re.IGNORECASE)
     logger.debug(f"ref_notes mentioned pages: {page_matches}")
-    if len(page_matches) > 0:
-      for match in page_matches:
-        # NOTE - this is a kinda shitty way of doing this cuz it will get that page for each source rather than in the correct source...do better later
-        page_num = match[1]
-        for src_fpath in self.source.ref_docs:
-          relavent_page_source.append((page_num, src_fpath))
-    
-    quote_regex = r"(?<=')[^']*(?=')|(?<=\")[^\"]*(?=\")"
-    quote_matches = re.findall(quote_regex, self.source.notes)
+    # NOTE - this is a kinda shitty way of doing this cuz it will get that page for each source rather than in the correct source...do better later
+    return [(int(match[1]), src_fpath) for match in page_matches]
+
+  def _get_quote_pages(self, src_fpath: Path) -> List[Tuple[int, Path]]:
+    """Pages of src_fpath with exact matches of the quotes in the ref notes"""
+    quote_matches = re.findall(self.QUOTE_REGEX, self.source.notes)
     logger.debug(f"ref_notes mentioned quotes: {quote_matches}")
-    if len(quote_matches) > 0:
-      for quote in quote_matches:
-        for src_fpath in self.source.ref_docs:
-          pages = get_pages_from_text(text=quote, pdf_fpath=src_fpath)
-          for pg in pages:
-            relavent_page_source.append((pg, src_fpath))
-
-    unique_page_src = list(set(relavent_page_source))
-    logger.debug(f"total unique pg/src from ref notes: {unique_page_src}")
+    page_srcs = []
+    for quote in quote_matches:
+      for pg in get_pages_from_text(text=quote, pdf_fpath=src_fpath):
+        page_srcs.append((pg, src_fpath))
+    return page_srcs
 
-    if len(unique_page_src) == 0:
-      # use similarity search to get ref docs from vectorstore
-      logger.warning("Reference notes did not mention any specific pages, sheets, or quotes to look for so defaulting to similarity search")
-      relavent_docs = self.chroma_db.similarity_search(query=self.source.notes)
+  def _hybrid_search(self, query: str) -> List[Tuple[int, Path]]:
+    """Get the top (page, source) pairs for the query, notes and spec defs by fusing bm25 and vector similarity rankings"""
+    queries = self._search_queries(query)
+    return self._fuse_rankings(run_on_pdf_thread(self._bm25_rankings, queries) + self._vector_rankings(queries))
+
+  async def _ahybrid_search(self, query: str) -> List[Tuple[int, Path]]:
+    """_hybrid_search with the bm25 rankings (page text from the pdfs) on the pdf thread and the vector rankings on the default executor at the same time"""
+    queries = self._search_queries(query)
+    bm25_rankings, vector_rankings = await asyncio.gather(
+      _run_in_executor(pdf_executor, self._bm25_rankings, queries),
+      _run_in_executor(None, self._vector_rankings, queries),
+    )
+    return self._fuse_rankings(bm25_rankings + vector_rankings)
+
+  def _search_queries(self, query: str) -> List[str]:
+    queries = [q for q in [query, self.source.notes] if q]
+    queries += [f"{name}: {definition}" for name, definition in self.spec_defs.items()]
+    if not queries:
+      raise ValueError("Nothing to search for (no query, notes or spec defs)")
+    return queries
+
+  def _bm25_rankings(self, queries: List[str]) -> List[List[Tuple[int, Path]]]:
+    bm25, page_srcs = self._get_bm25_index()
+    return [[page_srcs[i] for i in bm25.top_k(q, k=self.top_k)] for q in queries]
+
+  def _vector_rankings(self, queries: List[str]) -> List[List[Tuple[int, Path]]]:
+    # NOTE: one batched embedding call and one vectorstore query for all queries
+    query_embeddings = self.chroma_db.embeddings.embed_documents(queries)
+    res = self.chroma_db._collection.query(query_embeddings=query_embeddings, n_results=self.top_k * 4, include=["metadatas"])
+    rankings = []
+    for metadatas in res['metadatas']:
+      ranking = list(dict.fromkeys((int(md['page']), Path(md['source'])) for md in metadatas))
+      rankings.append(ranking[:self.top_k])
+    return rankings
+
+  def _fuse_rankings(self, rankings: List[List[Tuple[int, Path]]]) -> List[Tuple[int, Path]]:
+    top_page_srcs = reciprocal_rank_fusion(rankings)[:self.top_k]
+    logger.debug(f"Hybrid search top pages: {top_page_srcs}")
+    return top_page_srcs
+
+  def _get_bm25_index(self) -> Tuple[BM25Index, List[Tuple[int, Path]]]:
+    """BM25 index over the pages of all the source ref docs (built from the page text cache)"""
+    if self._bm25 is None:
+      texts, page_srcs = [], []
+      for src_fpath in self.source.ref_docs:
+        stat = Path(src_fpath).stat()
+        cache_key = hashlib.sha1(f"{src_fpath}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:12]
+        cache_fpath = self.page_text_cache / cache_key
+        for page_number, page_text_blocks in iter_page_text_blocks(pdf_fpath=src_fpath, cache_fpath=cache_fpath):
+          texts.append(" ".join(page_text_blocks))
+          page_srcs.append((page_number, Path(src_fpath)))
+      self._bm25 = (BM25Index(texts), page_srcs)
+    return self._bm25
+
+  def _get_pages(self, page_srcs: List[Tuple[int, Path]]) -> List[Document]:
+    """Get the docs for (page, source) pairs in a single batched lookup (chunks of a page are joined into one doc)"""
+
+    # NOTE: manifest is a local (source, page) -> ids index so we can fetch by id rather than scanning the collection with a where filter
+    ids = []
+    for pg, src in page_srcs:
+      page_ids = self.manifest.page_ids(src, pg)
+      if page_ids is None:
+        break
+      ids.extend(page_ids)
     else:
-      # get document with page number
-      for pg, src in unique_page_src:
-        logger.debug(f"Getting pg {pg} of {src}")
-
-        # NOTE: must do in two steps cuz .get doesn't allow a where dict with multiple keys
-
-        # get all doc ids with that page number
-        ids = self.chroma_db.get(
-          where={"page": pg}
-        )['ids']
-
-        # filter by the correct source
-        res = self.chroma_db.get(
-          ids=ids,
-          where={'source': str(src)}
-        )
-
-        if len(res['documents']) == 0:
-          logger.warning(f"Could not find page {pg} in {src}")
-          raise ValueError("Couldn't find document in database")
-    
-        relavent_docs.append(Document(
-          page_content=res['documents'][0],
-          metadata=res['metadatas'][0]
-        ))
-    
-    return relavent_docs
-  
-  def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> Coroutine[Any, Any, List[Document]]:
-    raise NotImplementedError
-  
+      res = self.chroma_db.get(ids=ids) if ids else {'ids': [], 'documents': [], 'metadatas': []}
+      return self._join_page_chunks(res, page_srcs)
+
+    logger.debug("Some pages aren't in the source docs manifest, falling back to a where filter")
+    where = [{"$and": [{"source": str(src)}, {"page": pg}]} for pg, src in page_srcs]
+    res = self.chroma_db.get(where=where[0] if len(where) == 1 else {"$or": where})
+    return self._join_page_chunks(res, page_srcs)
+
+  def _join_page_chunks(self, res: dict, page_srcs: List[Tuple[int, Path]]) -> List[Document]:
+    chunks_by_page = {}
+    for md, doc in zip(res['metadatas'], res['documents']):
+      chunks_by_page.setdefault((int(md['page']), md['source']), []).append((md.get('chunk', 0), doc))
+
+    docs = []
+    for pg, src in page_srcs:
+      chunks = chunks_by_page.get((pg, str(src)))
+      if not chunks:
+        logger.warning(f"Could not find page {pg} in {src}")
+        raise ValueError("Couldn't find document in database")
+      docs.append(Document(
+        page_content="\n".join(doc for _, doc in sorted(chunks, key=lambda chunk: chunk[0])),
+        metadata={'source': str(src), 'page': pg}
+      ))
+    return docs
+
   def check_db_contents(self, refresh_source_docs: bool = False):
-    """Make sure that chroma_db has all the source ref docs and update if necessary"""
+    """Make sure that chroma_db has all the source ref docs and update if necessary
+
+    Uses the source docs manifest so only new or changed pages are embedded (refresh_source_docs re-embeds every page). Each source doc is checked and ingested under its manifest lock so retrievers of concurrent work units don't ingest the same doc twice
+    """
 
     logger.info("Checking vectorstore db contents against source ref docs")
+    self._init_chroma_db()
+    all_stats = []
+    for fpath in self.source.ref_docs:
+      with self.manifest.source_lock(fpath):
+        if not self._is_current(fpath, refresh=refresh_source_docs):
+          all_stats.append(self._ingest_source_doc(fpath, refresh=refresh_source_docs))
+    self.manifest.save()
+    self._log_embedding_stats(all_stats)
+
+  async def _acheck_db_contents(self, refresh_source_docs: bool = False):
+    """check_db_contents with the source docs ingested concurrently (pdf reads on the pdf thread, embeddings and vectorstore writes on the default executor)"""
+    logger.info("Checking vectorstore db contents against source ref docs")
+    await _run_in_executor(None, self._init_chroma_db)
+    all_stats = await asyncio.gather(*(self._acheck_source_doc(fpath, refresh=refresh_source_docs) for fpath in self.source.ref_docs))
+    await _run_in_executor(None, self.manifest.save)
+    self._log_embedding_stats([stats for stats in all_stats if stats is not None])
+
+  async def _acheck_source_doc(self, fpath: Path, refresh: bool = False) -> Optional[EmbeddingStats]:
+    """Ingest fpath if it isn't current (under its manifest lock, polled so waiting doesn't block the event loop or an executor thread). Returns None if it was current"""
+    lock = self.manifest.source_lock(fpath)
+    while not lock.acquire(blocking=False):
+      await asyncio.sleep(0.05)
+    try:
+      if await _run_in_executor(None, self._is_current, fpath, refresh=refresh):
+        return None
+      return await self._aingest_source_doc(fpath, refresh=refresh)
+    finally:
+      lock.release()
 
+  def _init_chroma_db(self):
     if not self.chroma_db:
       self.chroma_db = Chroma(
-          embedding_function=OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY),
-          persist_directory="data/.chroma_db"
+          collection_name=self.collection_name,
+          embedding_function=get_embedding_backend(self.embedding_backend, model_name=self.doc_retriever.embedding_model),
+          persist_directory=self.persist_directory
       )
 
-    # get all ids associated with source ref docs
-    all_ids = self.chroma_db.get()['ids']
-    all_ids_for_source = []
-    for fpath in self.source.ref_docs:
-      all_ids_for_source.extend(self.chroma_db.get(
-        ids=all_ids, 
-        where={'source': str(fpath)})['ids']
+  def _is_current(self, fpath: Path, refresh: bool = False) -> bool:
+    if not refresh and self.manifest.is_current(fpath, embedding_model=self.embedding_model):
+      logger.debug(f"Vectorstore is up to date for: {fpath}")
+      return True
+    return False
+
+  @staticmethod
+  def _log_embedding_stats(all_stats: List[EmbeddingStats]):
+    stats = EmbeddingStats(pages=sum(s.pages for s in all_stats), chunks=sum(s.chunks for s in all_stats), seconds=sum(s.seconds for s in all_stats))
+    if stats.pages > 0:
+      logger.info(f"Embedded {stats.pages} pages ({stats.chunks} chunks) in {stats.seconds:.1f}s ({stats.pages_per_sec:.2f} pages/sec)")
+
+  @property
+  def embedding_backend(self) -> str:
+    return self.doc_retriever.embedding_backend
+
+  @property
+  def collection_name(self) -> str:
+    # NOTE: backends have different embedding dimensions so they can't share a collection
+    return "langchain" if self.embedding_backend == "openai" else f"langchain-{self.embedding_backend}"
+
+  @property
+  def manifest(self) -> SourceDocsManifest:
+    """The collection's source docs manifest (shared by every retriever of the collection)"""
+    if self._manifest is None:
+      self._manifest = get_source_docs_manifest(Path(self.persist_directory) / f"{self.collection_name}_manifest.json")
+    return self._manifest
+
+  @property
+  def embedding_model(self) -> str:
+    embeddings = self.chroma_db.embeddings if self.chroma_db else None
+    return getattr(embeddings, 'model', None) or getattr(embeddings, 'model_name', None) or type(embeddings).__name__
+
+  def _ingest_source_doc(self, fpath: Path, refresh: bool = False) -> EmbeddingStats:
+    """
+    Chunk and embed the pages of fpath that are new or whose text changed since the last ingestion
+
+    If the manifest has no (current) entry for fpath every doc of that source is deleted from the collection first, so docs ingested before there was a manifest are replaced rather than duplicated
+    """
+    start_time = time.perf_counter()
+    entry = self._reusable_entry(fpath, refresh=refresh)
+    pages = run_on_pdf_thread(self._read_source_pages, fpath, entry)
+    return self._store_source_pages(fpath, entry, pages, start_time)
+
+  async def _aingest_source_doc(self, fpath: Path, refresh: bool = False) -> EmbeddingStats:
+    """_ingest_source_doc with the pdf read on the pdf thread and the vectorstore and embedding calls on the default executor"""
+    start_time = time.perf_counter()
+    entry = await _run_in_executor(None, self._reusable_entry, fpath, refresh=refresh)
+    pages = await _run_in_executor(pdf_executor, self._read_source_pages, fpath, entry)
+    return await _run_in_executor(None, self._store_source_pages, fpath, entry, pages, start_time)
+
+  def _reusable_entry(self, fpath: Path, refresh: bool = False) -> Optional[SourceDocEntry]:
+    """The manifest entry of fpath if its unchanged pages can be kept, otherwise None after deleting every doc of fpath from the collection"""
+    entry = self.manifest.get(fpath)
+    if entry is not None and (refresh or entry.embedding_model != self.embedding_model):
+      # everything has to be re-embedded
+      entry = None
+    if entry is None:
+      # drop whatever the collection already has for this source, including docs the manifest never tracked (eg. pages added with PyPDFLoader and random ids before there was a manifest) that would otherwise be duplicated by the pages embedded below
+      src_doc_ids = self.chroma_db.get(where={'source': str(fpath)})['ids']
+      if src_doc_ids:
+        logger.info(f"Deleting {len(src_doc_ids)} docs of {fpath} from the vectorstore before re-ingesting it")
+        self.chroma_db.delete(src_doc_ids)
+    return entry
+
+  def _read_source_pages(self, fpath: Path, entry: Optional[SourceDocEntry]) -> SourcePages:
+    """Hash every page of fpath and chunk the pages that are new or changed since entry (the only part of ingestion that uses PyMuPDF)"""
+    max_chars = self.doc_retriever.chunk_max_chars
+    source_key = hashlib.sha1(str(fpath).encode()).hexdigest()[:12]
+    pages = SourcePages()
+    with fitz.open(str(fpath)) as doc:
+      for page in doc:
+        text_hash = page_text_hash(page.get_text())
+        pages.page_hashes.append(text_hash)
+        if entry is not None and page.number < len(entry.page_hashes) and entry.page_hashes[page.number] == text_hash:
+          pages.page_ids.append(entry.page_ids[page.number])
+          continue
+        if entry is not None and page.number < len(entry.page_ids):
+          pages.stale_ids.extend(entry.page_ids[page.number])
+        chunks = split_page_into_chunks(page, max_chars=max_chars)
+        ids = [f"{source_key}-p{chunk.page}-c{chunk.chunk}" for chunk in chunks]
+        pages.new_chunks.extend(chunks)
+        pages.new_ids.extend(ids)
+        pages.page_ids.append(ids)
+      pages.page_count = len(doc)
+
+    if entry is not None: # pages that no longer exist
+      pages.stale_ids.extend(id for ids in entry.page_ids[pages.page_count:] for id in ids)
+    return pages
+
+  def _store_source_pages(self, fpath: Path, entry: Optional[SourceDocEntry], pages: SourcePages, start_time: float) -> EmbeddingStats:
+    """Embed the new chunks of fpath, replace its stale docs in the collection and record it in the manifest"""
+    embedding_model = self.embedding_model
+    new_chunks = pages.new_chunks
+    num_new_pages = len({chunk.page for chunk in new_chunks})
+    logger.info(f"Embedding {num_new_pages}/{pages.page_count} new or changed pages ({len(new_chunks)} chunks) of {fpath}")
+    if pages.stale_ids:
+      self.chroma_db.delete(pages.stale_ids)
+    if new_chunks:
+      embeddings = embed_texts(
+        texts=[chunk.text for chunk in new_chunks],
+        embedding=self.chroma_db.embeddings,
+        batch_size=self.doc_retriever.embedding_batch_size,
+        max_workers=self.doc_retriever.embedding_workers,
       )
-    
-
-    if len(all_ids_for_source) == 0:
-      logger.info("No documents found in vectorstore for source ref docs. Adding documents from source ref docs")
-      documents: List[Document] = []
-      for fpath in self.source.ref_docs:
-          loader = PyPDFLoader(str(fpath))
-          documents.extend(loader.load())
-          logger.debug(f"Adding document: {fpath}")
-      self.chroma_db.add_documents(documents)
-    
-    elif refresh_source_docs == True:
-        logger.info(f"Refreshing {len(self.source.ref_docs)} documents in vectorstore")
-        for fpath in self.source.ref_docs:
-          logger.debug(f"Updating document: {fpath}")
-          loader = PyPDFLoader(str(fpath))
-          document = loader.load()
-          # get ids of the documents from the same source
-          src_doc_ids = self.chroma_db.get(where={'source': str(fpath)})['ids']
-          if src_doc_ids:  # if documents exist, delete them
-              self.chroma_db.delete(src_doc_ids)
-          # add the new document
-          self.chroma_db.add_documents([document])
\ No newline at end of file
+      # NOTE: langchain's Chroma doesn't have a way to add precomputed embeddings
+      self.chroma_db._collection.upsert(
+        ids=pages.new_ids,
+        embeddings=embeddings,
+        documents=[chunk.text for chunk in new_chunks],
+        metadatas=[{'source': str(fpath), 'page': chunk.page, 'chunk': chunk.chunk} for chunk in new_chunks],
+      )
+
+    stat = Path(fpath).stat()
+    self.manifest.set(SourceDocEntry(
+      source=str(fpath),
+      content_hash=file_content_hash(fpath),
+      size=stat.st_size,
+      mtime_ns=stat.st_mtime_ns,
+      page_count=pages.page_count,
+      embedding_model=embedding_model,
+      page_hashes=pages.page_hashes,
+      page_ids=pages.page_ids,
+    ))
+
+    stats = EmbeddingStats(pages=num_new_pages, chunks=len(new_chunks), seconds=time.perf_counter() - start_time)
+    logger.debug(f"Embedded {fpath} at {stats.pages_per_sec:.2f} pages/sec")
+    return stats
@@ -2,6 +2,7 @@ from __future__ import annotations
 import json
 import re
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Tuple, Dict, Any, Optional
 from pydantic import Extra, root_validator, Field
 from loguru import logger
@@ -17,8 +18,17 @@ from langchain.prompts.chat import ChatPromptTemplate
 
 from meche_copilot.schemas import AgentConfig
 from meche_copilot.chains.helpers.specs_retriever import SpecsRetriever
-from meche_copilot.utils.chunk_dataframe import chunk_dataframe, combine_dataframe_chunks
-from meche_copilot.utils.envars import OPENAI_API_KEY
+from meche_copilot.chains.helpers.pack_docs_for_prompt import pack_docs_for_prompt
+from meche_copilot.chains.helpers.retrieval_cache import RetrievalCache, get_retrieval_cache, retrieval_cache_key
+from meche_copilot.utils.chunk_dataframe import chunk_dataframe
+from meche_copilot.utils.envars import OPENAI_API_KEY, DATA_CACHE
+
+class SpecReaderOutputError(ValueError):
+    """The spec reader's response to some prompt chunks wasn't valid json. result has the merged results of the chunks that were (None if there weren't any)"""
+
+    def __init__(self, message: str, result: Optional[pd.DataFrame] = None):
+        super().__init__(message)
+        self.result = result
 
 class LookupSpecsChain(Chain):
     """Lookup spec in design and submittal docs and compare against spec info from template"""
@@ -26,6 +36,8 @@ class LookupSpecsChain(Chain):
     doc_retriever: AgentConfig
     spec_reader: AgentConfig
     output_key: str = "result" #: :meta private:
+    # relavent docs by source fingerprint (defaults to the retrieval cache in DATA_CACHE, shared by every chain and persisted across runs)
+    retrieval_cache: Optional[RetrievalCache] = None
 
     chat: Optional[ChatOpenAI]
 
@@ -73,17 +85,23 @@ class LookupSpecsChain(Chain):
 
         logger.debug(f"input keys: {inputs.keys()}")
         
-        retriever = SpecsRetriever(doc_retriever=self.doc_retriever, source=inputs.get('source'))
-        relavent_docs = retriever.get_relevant_documents(
-            query="", # TODO - this is annoying
-            refresh_source_docs=inputs.get("refresh_source_docs", False)
-        )
+        source, spec_defs = inputs.get('source'), inputs.get('spec_defs', {})
+        refresh_source_docs = inputs.get("refresh_source_docs", False)
+        cache_key = retrieval_cache_key(source, query="", spec_defs=spec_defs)
+        retrieval_cache = self.retrieval_cache or get_retrieval_cache(DATA_CACHE / 'retrieval_cache')
+        relavent_docs = None if refresh_source_docs else retrieval_cache.get(cache_key)
+        if relavent_docs is None:
+            retriever = SpecsRetriever(doc_retriever=self.doc_retriever, source=source, spec_defs=spec_defs)
+            relavent_docs = retriever.get_relevant_documents(
+                query="", # TODO - this is annoying
+                refresh_source_docs=refresh_source_docs
+            )
+            if len(relavent_docs) > 0:
+                retrieval_cache.set(cache_key, relavent_docs)
         if len(relavent_docs) <= 0:
             raise ValueError("Doc retreiver couldn't find any relavent docs. Exiting chain.")
         else:
-            relavent_ref_docs_as_dicts = [doc.dict() for doc in relavent_docs]
-            relavent_ref_docs_as_string = json.dumps(relavent_ref_docs_as_dicts)  # Convert to JSON string
-            inputs['relavent_docs'] = relavent_ref_docs_as_string
+            inputs['relavent_docs'] = pack_docs_for_prompt(relavent_docs, tables=self.doc_retriever.pack_tables)
             logger.info(f"Doc retreiver found {len(relavent_docs)} relavent docs.")
 
 
@@ -97,36 +115,57 @@ class LookupSpecsChain(Chain):
             inputs=inputs
         )
 
-        res_chunks = []
         logger.debug(f"Chunked prompt into {len(chat_prompt_chunks)} chunks to fit tokens limits")
-        for i in range(len(chat_prompt_chunks)):
-            try:
-                messages = chat_prompt_chunks[i]
-                logger.debug(f"Sending prompt: {messages}")
-                res = self.chat(
-                    messages=messages, 
-                    callbacks=run_manager.get_child() if run_manager else None
-                )
-                if run_manager:
-                    run_manager.on_text("TODO - Log something about this run")
-
-                logger.debug(f"res={res.content}")
-                # TODO - use pydantic or .construct to check json format? or maybe just check shapes?
-                json_res = self._extract_and_validate_json(res.content)
-                res_chunks.append(json_res)
-            except Exception as e:
-                logger.error(f"Error in chat: {e}")
-                raise e
-
-        final_res = None
-        try:
-            logger.info(f"Recombining results...")
-            final_res = combine_dataframe_chunks(dfs=res_chunks)
-        except Exception as e:
-            logger.error(f"Couldn't combine df chunks")
-
+        max_concurrency = self.spec_reader.max_concurrency
+        final_res: Optional[pd.DataFrame] = None
+        chunk_columns: Dict[int, List[str]] = {}
+        failed_chunks: List[int] = []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(chat_prompt_chunks)))) as executor:
+            futures = {
+                executor.submit(self._run_chat_prompt_chunk, messages, run_manager): i
+                for i, messages in enumerate(chat_prompt_chunks)
+            }
+            # merge each chunk into the result as soon as it returns
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    chunk_df = pd.DataFrame(future.result())
+                except SpecReaderOutputError as e:
+                    # keep merging the other chunks, the chain still fails below so these cells aren't silently left empty
+                    logger.error(f"Couldn't parse the response to chunk {i}: {e}")
+                    failed_chunks.append(i)
+                    continue
+                except Exception as e:
+                    logger.error(f"Error in chat: {e}")
+                    raise e
+                logger.debug(f"Merging chunk {i} with shape {chunk_df.shape}")
+                chunk_columns[i] = list(chunk_df.columns)
+                final_res = chunk_df if final_res is None else pd.concat([final_res, chunk_df.drop(columns=final_res.columns, errors='ignore')], axis=1)
+
+        if final_res is not None:
+            # put columns back in chunk order (chunks complete in any order)
+            final_res = final_res[list(dict.fromkeys(col for i in sorted(chunk_columns) for col in chunk_columns[i]))]
+
+        if failed_chunks:
+            raise SpecReaderOutputError(f"Couldn't parse the spec reader's response to {len(failed_chunks)}/{len(chat_prompt_chunks)} prompt chunks", result=final_res)
         return {self.output_key: final_res}
     
+    def _run_chat_prompt_chunk(self, messages: List[BaseMessage], run_manager: Optional[CallbackManagerForChainRun] = None) -> Dict[str, Any]:
+        logger.debug(f"Sending prompt: {messages}")
+        res = self.chat(
+            messages=messages, 
+            callbacks=run_manager.get_child() if run_manager else None
+        )
+        if run_manager:
+            run_manager.on_text("TODO - Log something about this run")
+
+        logger.debug(f"res={res.content}")
+        # TODO - use pydantic or .construct to check json format? or maybe just check shapes?
+        json_object = self._extract_and_validate_json(res.content)
+        if json_object is None:
+            raise SpecReaderOutputError(f"Spec reader response isn't valid json: {res.content[:200]}")
+        return json_object
+
     async def _acall(
         self,
         inputs: Dict[str, Any],
@@ -191,7 +230,8 @@ class LookupSpecsChain(Chain):
         return chat_prompt_chunks
 
     # TODO - shouldn't this be done with an output parser?
-    def _extract_and_validate_json(self, input_string):
+    def _extract_and_validate_json(self, input_string) -> Optional[Dict[str, Any]]:
+        """The outermost json object in input_string, or None if there isn't a valid one"""
         # Use a regular expression to find the outermost bracketed JSON object inside the string
         match = re.search(r'{.*}', input_string)
         if match:
@@ -203,6 +243,7 @@ class LookupSpecsChain(Chain):
                 return json_object
             except json.JSONDecodeError:
                 logger.error("Invalid JSON")
+                return None
         else:
             logger.error("No JSON found in the input string")
-            return {}
\ No newline at end of file
+            return None
\ No newline at end of file
@@ -3,7 +3,6 @@ A chain that reads engineering design documents and extracts data from them by r
 """
 from __future__ import annotations
 import os
-import fitz
 import json
 import pandas as pd
 from pathlib import Path
@@ -23,8 +22,10 @@ from langchain.callbacks.manager import (
 
 from meche_copilot.schemas import Source, ScopedEquipment, EngineeringDesignSchedule
 from meche_copilot.chains.helpers.mechanical_schedule_table_to_df import mechanical_schedule_table_to_df
+from meche_copilot.chains.helpers.map_specs_to_schedule import set_design_data_from_schedules
 from meche_copilot.utils.converters import pydantic_from_jsonl, pydantic_to_jsonl, title_to_filename
 from meche_copilot.pdf_helpers.get_pages_from_text import get_pages_from_text
+from meche_copilot.pdf_helpers.iter_page_text_blocks import iter_page_text_blocks
 from meche_copilot.utils.envars import OPENAI_API_KEY, DATA_CACHE
 
 # TODO - everywhere a llm/prompt is used, it should include a way to chunk the data in case it is too long for the model
@@ -99,19 +100,11 @@ class ReadDesignChain(Chain):
             self.design_data_cache.mkdir(parents=True, exist_ok=True)
             design_df = None
 
-        design_schedules = None
-        logger.info(f"Looking up cached design schedules...")
-        try:
-            if self.design_schedules_fpath.exists():
-                logger.debug(f"Using cached design schedules.")
-                design_schedules = pydantic_from_jsonl(self.design_schedules_fpath, EngineeringDesignSchedule)
-            else:
-                logger.debug(f"Cached design data not found. Creating new: {self.design_schedules_fpath}")
-                design_schedules = self.read_design_schedules(scoped_eq=scoped_eq, show_your_work=show_your_work)
-                logger.debug(f"Writing design data to {self.design_schedules_fpath}")
-                pydantic_to_jsonl(design_schedules, self.design_schedules_fpath)
-        except Exception as e:
-            logger.exception(f"Couldn't read design schedules")
+        design_schedules = self.get_design_schedules(scoped_eq=scoped_eq, show_your_work=show_your_work)
+
+        # schedule rows become the design data of the scoped equipment instances (specs mapped to a schedule column don't need the llm)
+        for eq in scoped_eq:
+            set_design_data_from_schedules(eq, design_schedules or [])
 
         design_drawings = None
         logger.info(f"Looking up cached design drawings...")
@@ -143,6 +136,23 @@ class ReadDesignChain(Chain):
     def _chain_type(self) -> str:
         return "ReadDesignChain"
     
+    def get_design_schedules(self, scoped_eq: List[ScopedEquipment], show_your_work: bool = False) -> Optional[List[EngineeringDesignSchedule]]:
+        """The cached design schedules, or read them from the design documents (and cache them) if there aren't any yet. Returns None if they couldn't be read"""
+        design_schedules = None
+        logger.info(f"Looking up cached design schedules...")
+        try:
+            if self.design_schedules_fpath.exists():
+                logger.debug(f"Using cached design schedules.")
+                design_schedules = pydantic_from_jsonl(self.design_schedules_fpath, EngineeringDesignSchedule)
+            else:
+                logger.debug(f"Cached design data not found. Creating new: {self.design_schedules_fpath}")
+                design_schedules = self.read_design_schedules(scoped_eq=scoped_eq, show_your_work=show_your_work)
+                logger.debug(f"Writing design data to {self.design_schedules_fpath}")
+                pydantic_to_jsonl(design_schedules, self.design_schedules_fpath)
+        except Exception as e:
+            logger.exception(f"Couldn't read design schedules")
+        return design_schedules
+
     def read_design_schedules(self, scoped_eq: List[ScopedEquipment], **kwargs):
         """Reads the design schedules from the design documents and extracts the data from them and writes to design_schedules.parquet"""
 
@@ -304,32 +314,19 @@ class ReadDesignChain(Chain):
         design_fpaths_completed = set()
         for eq in scoped_eq:
             for fpath in eq.design_source.ref_docs:
-                cache_fpath = self.design_data_cache / f"{fpath.stem}_text_blocks"
-                cache_fpath.mkdir(parents=True, exist_ok=True)
                 if fpath in design_fpaths_completed:
                     continue
                 else:
                     logger.debug(f"Processing design reference doc: {fpath}")
-                    with fitz.open(str(fpath)) as doc:
-                        for p in doc:
-                            page_fpath = cache_fpath / f"{p.number}.jsonl"
-                            if page_fpath.exists():
-                                page_text_blocks = [json.loads(line)["text_block"] for line in page_fpath.open()]
-                            else:
-                                blocks = p.get_text_blocks()
-                                page_text_blocks = []
-                                with page_fpath.open('w') as f:
-                                    for b in blocks:
-                                        page_text_blocks.append(b[4])
-                                        f.write(json.dumps({"text_block": str(b[4])}) + '\n')
-
-                            for text in page_text_blocks:
-                                if "SCHEDULE" in text and len(text.split(' ')) < 10:
-                                    design_schedules.append(EngineeringDesignSchedule(
-                                        title=text.replace('\n', ' '),
-                                        page_number=int(p.number),
-                                        fpath=str(fpath),
-                                    ))
+                    cache_fpath = self.design_data_cache / f"{fpath.stem}_text_blocks"
+                    for page_number, page_text_blocks in iter_page_text_blocks(pdf_fpath=fpath, cache_fpath=cache_fpath):
+                        for text in page_text_blocks:
+                            if "SCHEDULE" in text and len(text.split(' ')) < 10:
+                                design_schedules.append(EngineeringDesignSchedule(
+                                    title=text.replace('\n', ' '),
+                                    page_number=int(page_number),
+                                    fpath=str(fpath),
+                                ))
                     design_fpaths_completed.add(fpath)
         return design_schedules
     
@@ -384,6 +381,7 @@ class ReadDesignChain(Chain):
         return scoped_design_schedules
 
     def _extract_schedule_metadata(self, scoped_design_schedules: List[EngineeringDesignSchedule], **kwargs) -> List[EngineeringDesignSchedule]:
+        """Sets remarks and empty row_data (one key per row label) on each schedule. NOTE: updates the given schedules in place and returns them"""
 
         if len(scoped_design_schedules) == 0:
             raise Exception("No equipment schedule titles found. Can't extract schedule metadata.")
@@ -422,17 +420,15 @@ class ReadDesignChain(Chain):
             row_data = {}
             for row_label in parsed_output.row_labels:
                 row_data[row_label] = []
-            scoped_design_schedules_with_metadata.append(EngineeringDesignSchedule(
-                equipment_name=eds.equipment_name,
-                title=eds.title,
-                page_number=eds.page_number,
-                fpath=eds.fpath,
-                remarks=parsed_output.remarks,
-                row_data=row_data,
-            ))
+
+            # update in place (assignment doesn't revalidate the model)
+            eds.remarks = parsed_output.remarks
+            eds.row_data = row_data
+            scoped_design_schedules_with_metadata.append(eds)
         return scoped_design_schedules_with_metadata
     
     def _extract_schedule_rows(self, scoped_design_schedules: List[EngineeringDesignSchedule], **kwargs) -> List[EngineeringDesignSchedule]:
+        """Fills in row_data of each schedule. NOTE: updates the given schedules in place and returns them"""
         if len(scoped_design_schedules) == 0:
             raise Exception("No equipment schedule metadata found. Can't extract row data without metadata.")
         
@@ -484,18 +480,14 @@ class ReadDesignChain(Chain):
                 logger.exception(f"LLM error")
                 parsed_output = None
 
-            scoped_design_schedules_with_row_data.append(EngineeringDesignSchedule(
-                equipment_name=eds.equipment_name,
-                title=eds.title,
-                page_number=eds.page_number,
-                fpath=eds.fpath,
-                remarks=eds.remarks,
-                row_data=parsed_output.row_data if parsed_output else eds.row_data,
-            ))
+            if parsed_output:
+                eds.row_data = parsed_output.row_data
+            scoped_design_schedules_with_row_data.append(eds)
 
         return scoped_design_schedules_with_row_data
     
     def _extract_schedule_column_labels(self, scoped_design_schedules: List[EngineeringDesignSchedule], **kwargs) -> List[EngineeringDesignSchedule]:
+        """Sets column_labels on each schedule. NOTE: updates the given schedules in place and returns them"""
         if len(scoped_design_schedules) == 0:
             raise Exception("No equipment schedule metadata found. Can't extract column labels data without metadata.")
         
@@ -535,15 +527,8 @@ class ReadDesignChain(Chain):
                 logger.exception(f"LLM error")
                 parsed_output = ScheduleColumnLabels(column_labels=[])
 
-            scoped_design_schedules_with_column_labels.append(EngineeringDesignSchedule(
-                equipment_name=eds.equipment_name,
-                title=eds.title,
-                page_number=eds.page_number,
-                fpath=eds.fpath,
-                remarks=eds.remarks,
-                row_data=eds.row_data,
-                column_labels=parsed_output.column_labels,
-            ))
+            eds.column_labels = parsed_output.column_labels
+            scoped_design_schedules_with_column_labels.append(eds)
 
         return scoped_design_schedules_with_column_labels
 
@@ -558,12 +543,17 @@ class ReadDesignChain(Chain):
         if eds.fpath is None or eds.page_number is None or eds.title is None:
             raise Exception(f"This schedule metadata doesn't have a required attributes: (fpath, page_number): {eds}")
 
+        # llm row values (if we got them) give camelot an expected shape to search settings against
+        has_row_values = all(len(row_values) > 0 for row_values in eds.row_data.values())
+
         logger.debug(f"Getting mechanical schedule table data for: {eds.title} (p.{eds.page_number})")
         df = mechanical_schedule_table_to_df(
             pdf_fpath=eds.fpath, 
             title=eds.title, 
             last_row=list(eds.row_data.keys())[-1],
             page_number=eds.page_number,
+            expected_row_data=eds.row_data if has_row_values else None,
+            adaptive=True,
             show_your_work=show_your_work
         )
 
@@ -581,7 +571,11 @@ class ReadDesignChain(Chain):
         return df
 
     def _combine_schedule_results(self, scoped_design_schedules: List[EngineeringDesignSchedule], **kwargs) -> List[EngineeringDesignSchedule]:
-        """Tries to make best decision possible about how to combine llm and algo results given data obtained in prev steps"""
+        """
+        Tries to make best decision possible about how to combine llm and algo results given data obtained in prev steps
+
+        For now only records the llm vs camelot comparison (cached as <title>_results.csv) and keeps each schedule's llm row_data and column_labels, which set_design_data_from_schedules reads the design data from. NOTE: returns the given schedules (unchanged)
+        """
 
         # NOTE: so far empirical testing shows that if LLM and camelot disagree about column headers and row data that LLM is better at getting row data and camelot is better at getting column headers
 
@@ -603,11 +597,9 @@ class ReadDesignChain(Chain):
 
                 # get llm rows and cols, if available
                 if eds.row_data is not None:
-                    keys_list = list(eds.row_data.keys())
-                    res_df.loc["num_rows", "llm"] = len(keys_list)
-                    if len(keys_list) > 0:
-                        res_df.loc["num_cols", "llm"] = len(eds.row_data[keys_list[0]])
-                    res_df.loc["row_labels", "llm"] = str(keys_list)
+                    res_df.loc["num_rows", "llm"] = eds.table.shape[0]
+                    res_df.loc["num_cols", "llm"] = eds.table.shape[1]
+                    res_df.loc["row_labels", "llm"] = str(eds.table.index.tolist())
                 if eds.headers is not None:
                     res_df.loc["col_labels", "llm"] = str(eds.headers)
                 
@@ -626,20 +618,7 @@ class ReadDesignChain(Chain):
                 logger.debug(f"Writing to cache: {res_fpath}")
                 res_df.to_csv(res_fpath)
 
-            # use res_df to decide which data to use
-            row_data = None
-            column_labels = None
-
-            # TODO - decide which data to use
-
-            final_design_schedules.append(EngineeringDesignSchedule(
-                equipment_name=eds.equipment_name,
-                title=eds.title,
-                page_number=eds.page_number,
-                fpath=eds.fpath,
-                remarks=eds.remarks,
-                row_data=row_data,
-                column_labels=column_labels,
-            ))
+            # TODO - use res_df to decide which data to use (eg. camelot's column labels when its table lines up with the llm's rows), until then the llm row data and column labels are kept as is
+            final_design_schedules.append(eds)
 
         return final_design_schedules
\ No newline at end of file
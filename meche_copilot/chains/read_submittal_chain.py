@@ -1,10 +1,8 @@
 from __future__ import annotations
 import os
-import fitz
-import json
 import pandas as pd
 from pathlib import Path
-from typing import List, Tuple, Dict, Any, Optional, Union
+from typing import Iterator, List, Tuple, Dict, Any, Optional, Union
 from pydantic import Extra, root_validator, Field, BaseModel, validator
 from loguru import logger
 
@@ -19,6 +17,8 @@ from langchain.callbacks.manager import (
 )
 
 from meche_copilot.schemas import ScopedEquipment, SubmittalData, EngineeringDesignSchedule
+from meche_copilot.chains.helpers.design_uid_matcher import DesignUidMatcher
+from meche_copilot.pdf_helpers.iter_page_text_blocks import iter_page_text_blocks
 from meche_copilot.utils.converters import pydantic_from_jsonl, pydantic_to_jsonl, title_to_filename
 from meche_copilot.utils.envars import OPENAI_API_KEY, DATA_CACHE
 
@@ -86,7 +86,7 @@ class ReadSubmittalChain(Chain):
         try: 
             if self.submittal_datas_fpath.exists():
                 logger.debug(f"Using cached submittal data")
-                submittal_datas = pydantic_from_jsonl(self.submittal_datas_fpath, SubmittalData)
+                submittal_datas = pydantic_from_jsonl(self.submittal_datas_fpath, SubmittalData, trusted=True)
             else:
                 logger.debug(f"Cached submittal data not found. Creating new: {self.submittal_datas_fpath}")
                 submittal_datas = self.read_submittal_data(scoped_eq=scoped_eq, **kwargs)
@@ -111,52 +111,43 @@ class ReadSubmittalChain(Chain):
     def _chain_type(self) -> str:
         return "ReadSubmittalChain"
     
-    def read_submittal_data(self, scoped_eq: List[ScopedEquipment], **kwargs):
+    def read_submittal_data(self, scoped_eq: List[ScopedEquipment], **kwargs) -> List[SubmittalData]:
         """Get submittal data by EDS mark"""
+        return list(self.iter_submittal_data(scoped_eq=scoped_eq, **kwargs))
 
-        show_your_work: bool = kwargs.get('show_your_work', False)
+    def iter_submittal_data(self, scoped_eq: List[ScopedEquipment], **kwargs) -> Iterator[SubmittalData]:
+        """
+        Stream submittal data hits for every design uid across all equipment
 
-        submittal_data: List[SubmittalData] = []
-        submittal_fpaths_completed = set()
-        for eq in scoped_eq:
+        Each submittal reference doc is read once (one page at a time) and every page is matched against all the design uids that could be in that doc in a single pass
+        """
 
-            # get the submittal reference docs for each piece of equipment
+        # design uid -> equipment names to look for in each submittal reference doc
+        eq_names_by_uid_by_fpath: Dict[Path, Dict[str, List[str]]] = {}
+        for eq in scoped_eq:
             for fpath in eq.submittal_source.ref_docs:
-                cache_fpath = self.submittal_data_cache / f"{fpath.stem}_text_blocks"
-                cache_fpath.mkdir(parents=True, exist_ok=True)
-                if fpath in submittal_fpaths_completed:
-                    continue
-                else:
-                    logger.debug(f"Processing submittal reference doc: {fpath}")
-                    with fitz.open(str(fpath)) as doc:
-                        for p in doc: # load or process each page
-                            page_fpath = cache_fpath / f"{p.number}.jsonl"
-                            if page_fpath.exists():
-                                page_text_blocks = [json.loads(line)["text_block"] for line in page_fpath.open()]
-                            else:
-                                blocks = p.get_text_blocks()
-                                page_text_blocks = []
-                                with page_fpath.open('w') as f:
-                                    for b in blocks:
-                                        page_text_blocks.append(b[4])
-                                        f.write(json.dumps({"text_block": str(b[4])}) + '\n')
-
-
-                            # given page_text_blocks for a eq ref doc
-                            for eq_instance in eq.instances:
-                                if eq_instance.design_uid is not None:
-                                    for text_block in page_text_blocks:
-                                        if eq_instance.design_uid in text_block: # if design uid is mentioned anywhere on the page
-                                            logger.debug(f"Found submittal data for {eq.name} instance {eq_instance.design_uid} on page {p.number}: {text_block}")
-                                            data = {}
-                                            data[str(p.number)] = page_text_blocks
-                                            submittal_data.append(SubmittalData(
-                                                equipment_name=eq.name,
-                                                equipment_uid=eq_instance.design_uid,
-                                                page_number=str(p.number),
-                                                fpath=str(fpath),
-                                                data=data
-                                            ))
-                                            break # break out of text block loop
-                    submittal_fpaths_completed.add(fpath)
-        return submittal_data
\ No newline at end of file
+                eq_names_by_uid = eq_names_by_uid_by_fpath.setdefault(fpath, {})
+                for eq_instance in eq.instances:
+                    if eq_instance.design_uid is not None:
+                        eq_names_by_uid.setdefault(eq_instance.design_uid, []).append(eq.name)
+
+        for fpath, eq_names_by_uid in eq_names_by_uid_by_fpath.items():
+            if len(eq_names_by_uid) == 0:
+                logger.debug(f"No design uids to look for in submittal reference doc: {fpath}")
+                continue
+
+            logger.debug(f"Processing submittal reference doc: {fpath}")
+            matcher = DesignUidMatcher(eq_names_by_uid.keys())
+            cache_fpath = self.submittal_data_cache / f"{fpath.stem}_text_blocks"
+            for page_number, page_text_blocks in iter_page_text_blocks(pdf_fpath=fpath, cache_fpath=cache_fpath):
+                # if design uid is mentioned anywhere on the page
+                for uid, text_block in matcher.find_in_blocks(page_text_blocks).items():
+                    for eq_name in eq_names_by_uid[uid]:
+                        logger.debug(f"Found submittal data for {eq_name} instance {uid} on page {page_number}: {text_block}")
+                        yield SubmittalData(
+                            equipment_name=eq_name,
+                            equipment_uid=uid,
+                            page_number=str(page_number),
+                            fpath=str(fpath),
+                            data={str(page_number): page_text_blocks}
+                        )
@@ -0,0 +1,136 @@
+import os
+import time
+import hashlib
+import argparse
+import multiprocessing
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+from rich.console import Console
+from rich.table import Table
+from loguru import logger
+from dotenv import load_dotenv, find_dotenv
+
+# NOTE: nothing that imports meche_copilot.utils.envars can be imported here since envars reads DATA_CACHE once at import and each project gets its own
+from meche_copilot.utils.config import load_config
+from meche_copilot.utils.converters import title_to_filename
+from meche_copilot.utils.rate_limiter import RateLimiter, RateLimitCallbackHandler
+
+load_dotenv(find_dotenv())
+
+# set in each pool worker by _init_worker
+_rate_limiter: Optional[RateLimiter] = None
+
+def project_cache_namespace(config_fpath: Path, data_cache: str) -> str:
+    """A project's own DATA_CACHE (relative to PROJECT_ROOT like DATA_CACHE) named after its working folder (see working_cache_namespace)"""
+    return working_cache_namespace(Path(load_config(config_fpath).working_fpath), data_cache)
+
+def working_cache_namespace(working_fpath: Path, data_cache: str) -> str:
+    """
+    The cache namespace of a project working folder under data_cache
+
+    Named after the folder plus a short hash of its resolved path so projects whose folders share a name (eg. two clients' demo-01) still get separate caches
+    """
+    path_hash = hashlib.sha1(str(Path(working_fpath).resolve()).encode()).hexdigest()[:8]
+    return str(Path(data_cache) / 'projects' / f"{title_to_filename(Path(working_fpath).name.replace('-', ' '))}_{path_hash}")
+
+def _init_worker(rate_limiter: RateLimiter):
+    global _rate_limiter
+    _rate_limiter = rate_limiter
+
+def fillout_project(config_fpath: str, data_cache: str, max_workers: Optional[int] = None, fresh: bool = False) -> Dict[str, Any]:
+    """
+    Fill out one project's worksheet in this (fresh) process with its cache namespaced under data_cache
+
+    Returns a summary of the run rather than raising so one bad project doesn't stop the batch
+    """
+    start = time.monotonic()
+    summary = {"config": config_fpath, "cells": 0, "failed_cells": 0, "status": "done", "error": None}
+    try:
+        namespace = project_cache_namespace(Path(config_fpath), data_cache)
+        os.environ["DATA_CACHE"] = namespace
+        os.environ["CHROMA_DB_DIR"] = str(Path(namespace) / '.chroma_db')
+        logger.info(f"Filling out {config_fpath} (cache: {namespace})")
+
+        from meche_copilot.schemas import Session
+        sess = Session.from_config(config=load_config(config_fpath))
+        if (sess.config.working_fpath / 'worksheet.xlsx').exists():
+            sess.update_from_worksheet()
+        else:
+            sess.to_equipment_worksheet()
+
+        journal = sess.checkpoint_journal()
+        if fresh:
+            journal.clear()
+        callbacks = [RateLimitCallbackHandler(_rate_limiter)] if _rate_limiter is not None else None
+        for cells_done, cells_failed, message in sess.get_results(max_workers=max_workers, journal=journal, callbacks=callbacks):
+            logger.info(f"{sess.name}: {message}")
+            summary.update(cells=cells_done, failed_cells=cells_failed)
+        sess.to_equipment_worksheet()
+        if summary["failed_cells"]:
+            summary["status"] = "incomplete"
+    except Exception as e:
+        logger.exception(f"Error filling out {config_fpath}")
+        summary.update(status="failed", error=str(e))
+    summary["elapsed"] = time.monotonic() - start
+    return summary
+
+def run_batch(config_fpaths: List[str], processes: Optional[int] = None, max_calls_per_minute: int = 60, max_workers: Optional[int] = None, fresh: bool = False):
+    """
+    Fill out many projects concurrently, one process per project (maxtasksperchild=1 so every project starts with a clean import of its own cache paths)
+
+    All processes share one llm rate limiter (max_calls_per_minute across the whole batch). Yields each project's summary as it finishes
+    """
+    data_cache = os.environ["DATA_CACHE"]
+    processes = processes or min(len(config_fpaths), os.cpu_count() or 1)
+    # spawn (not fork) so workers don't inherit modules imported with another project's cache paths
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Manager() as manager:
+        rate_limiter = RateLimiter(max_calls=max_calls_per_minute, period=60.0, manager=manager)
+        with ctx.Pool(processes=processes, initializer=_init_worker, initargs=(rate_limiter,), maxtasksperchild=1) as pool:
+            jobs = [(str(config_fpath), data_cache, max_workers, fresh) for config_fpath in config_fpaths]
+            for summary in pool.imap_unordered(_fillout_project_star, jobs, chunksize=1):
+                yield summary
+
+def _fillout_project_star(args) -> Dict[str, Any]:
+    return fillout_project(*args)
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill out the worksheets of many projects in parallel")
+    parser.add_argument('configs',
+                        nargs='+',
+                        metavar='session_config',
+                        type=str,
+                        help='session config yaml file(s), one per project (eg. ./data/demo-01/session-config.yaml)')
+    parser.add_argument('--processes',
+                        type=int,
+                        default=None,
+                        help='number of projects to run at once (default: number of configs, up to the number of cpus)')
+    parser.add_argument('--max-calls-per-minute',
+                        type=int,
+                        default=60,
+                        help='llm calls per minute shared by every project in the batch')
+    parser.add_argument('--max-workers',
+                        type=int,
+                        default=None,
+                        help='work units run at once within each project (default: spec-reader max-workers in the session config)')
+    parser.add_argument('--fresh',
+                        action='store_true',
+                        help='ignore cells checkpointed by previous runs')
+    args = parser.parse_args()
+
+    console = Console()
+    summaries = []
+    for summary in run_batch(list(dict.fromkeys(args.configs)), processes=args.processes, max_calls_per_minute=args.max_calls_per_minute, max_workers=args.max_workers, fresh=args.fresh):
+        console.print(f"{summary['config']}: {summary['status']} ({summary['cells']} cells, {summary['failed_cells']} failed, {summary['elapsed']:.0f}s)")
+        summaries.append(summary)
+
+    table = Table(title="Batch results")
+    for col in ("config", "status", "cells", "failed cells", "elapsed", "error"):
+        table.add_column(col)
+    for summary in summaries:
+        table.add_row(summary['config'], summary['status'], str(summary['cells']), str(summary['failed_cells']), f"{summary['elapsed']:.0f}s", summary['error'] or "")
+    console.print(table)
+    exit(0 if all(summary['status'] == 'done' for summary in summaries) else 1)
+
+if __name__ == "__main__":
+    main()
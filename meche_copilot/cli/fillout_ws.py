@@ -1,6 +1,7 @@
 import os
+import time
 import argparse
-from typing import Optional, List
+from typing import List
 from pathlib import Path
 from rich.console import Console
 from rich.theme import Theme
@@ -13,16 +14,11 @@ from meche_copilot.utils.config import load_config, find_config
 load_dotenv(find_dotenv())
 
 class FilloutWorkskeetCli:
-    def __init__(self, config=None, selected_equipments: List[str] = None, selected_equipment_instances: List[str] = None):
+    def __init__(self, config=None, selected_equipments: List[str] = None, selected_equipment_instances: List[str] = None, fresh: bool = False):
         logger.info(f'Initializing...')
 
-        if selected_equipments is not None:
-            logger.warning("Fillout sleect equipment types isn't implemented")
-            raise NotImplementedError
-        
-        if selected_equipment_instances is not None:
-            logger.warning("Fillout sleect equipment instances isn't implemented")
-            raise NotImplementedError
+        self.selected_equipments = selected_equipments
+        self.selected_equipment_instances = selected_equipment_instances
 
         self.root_volume = Path(os.getenv('ROOT_VOLUME'))
         
@@ -32,8 +28,9 @@ class FilloutWorkskeetCli:
         self.cli_config = self.cli_config.fillout_ws
         
         # get session configs
-        self.sess_config = load_config(find_config('config.yaml'))
+        self.sess_config = load_config(find_config('session-config.yaml'))
         self.session = None
+        self.fresh = fresh
 
     def run(self):
         self.console.print(self.cli_config.intro_prompt, style="intro")
@@ -44,14 +41,34 @@ class FilloutWorkskeetCli:
             self.sess.update_from_worksheet()
             logger.info(f'Done updating esd from worksheet')
 
-            # TODO - if design data and submittal data isn't in cache, run read design and read submittal chains
+            # TODO - if submittal data isn't in cache, run read submittal chain (design data is read from the design schedules in get_results)
 
             self.console.print(f'Filling out worksheet...go get a 🍜...', style='info')
+            # resume from the checkpoint journal of a previous run unless asked to start fresh
+            journal = self.sess.checkpoint_journal()
+            if self.fresh:
+                journal.clear()
+            elif len(journal) > 0:
+                self.console.print(f'Resuming from {len(journal)} checkpointed cells (use --fresh to start over)', style='info')
+
+            work_units = self.sess.plan_work_units(
+                selected_equipments=self.selected_equipments,
+                selected_equipment_instances=self.selected_equipment_instances,
+            )
             with Progress() as progress:
-                task = progress.add_task("[cyan]Processing...", total=100)
+                task = progress.add_task("[cyan]Processing...", total=sum(unit.num_cells for _, unit in work_units))
                 # Run get_results and update the progress bar
-                for progress_update, message in self.sess.get_results():
-                    progress.update(task, advance=progress_update, description=message)
+                last_save = time.monotonic()
+                cells_failed = 0
+                for cells_done, cells_failed, message in self.sess.get_results(work_units=work_units, journal=journal):
+                    progress.update(task, completed=cells_done + cells_failed, description=message)
+                    # save as we go (only the changed cells are written)
+                    if time.monotonic() - last_save > self.cli_config.get('save_every', 60):
+                        self.sess.to_equipment_worksheet()
+                        last_save = time.monotonic()
+            self.sess.to_equipment_worksheet()
+            if cells_failed:
+                self.console.print(f'{cells_failed} cells failed (see the logs), rerun to retry them', style='error')
             self.console.print(f'Done filling out worksheet', style='input')
 
         except Exception as e:
@@ -81,13 +98,17 @@ def main():
                         type=str,
                         help='the equipment instance name(s) to fill out (eg. "pump-1")')
 
+    parser.add_argument('--fresh',
+                        action='store_true',
+                        help='ignore cells checkpointed by a previous run and fill out the whole worksheet again')
+
     args = parser.parse_args()
 
     # Convert the list of arguments to a set to ensure uniqueness
     selected_equipments = list(set(args.equipment_type)) if args.equipment_type else None
     selected_equipment_instances = list(set(args.equipment_instance)) if args.equipment_instance else None
 
-    cli = FilloutWorkskeetCli(selected_equipments=selected_equipments, selected_equipment_instances=selected_equipment_instances)
+    cli = FilloutWorkskeetCli(selected_equipments=selected_equipments, selected_equipment_instances=selected_equipment_instances, fresh=args.fresh)
     cli.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+from typing import Dict, List, Optional
+from loguru import logger
+from langchain.callbacks.manager import Callbacks
+
+from meche_copilot.schemas import AgentConfig, ScopedEquipment, Source, WorkUnit
+from meche_copilot.chains.lookup_specs_chain import LookupSpecsChain, SpecReaderOutputError
+from meche_copilot.chains.analyze_specs_chain import AnalyzeSpecsChain, SpecificationResults
+from meche_copilot.chains.helpers.map_specs_to_schedule import get_eq_spec_header_map
+from meche_copilot.chains.helpers.retrieval_cache import RetrievalCache, retrieval_cache_key
+from meche_copilot.utils.checkpoint_journal import CheckpointJournal, cell_fingerprint
+from meche_copilot.utils.plan_work_units import apply_work_unit_results, work_unit_to_df
+from meche_copilot.utils.envars import DATA_CACHE
+
+def get_work_unit_results(eq: ScopedEquipment, unit: WorkUnit, doc_retriever: AgentConfig, spec_reader: AgentConfig, rtol: float = 0.02, journal: Optional[CheckpointJournal] = None, callbacks: Callbacks = None, retrieval_cache: Optional[RetrievalCache] = None) -> int:
+    """
+    Fill in a work unit's cells of eq
+
+    Looks up the design (resA) and submittal (resB) values with the lookup chain, compares them numerically and sends whatever is left to the analyze chain for a final result. Design values of specs mapped to a column of the instances' design data (schedule rows) are read from it instead of looked up
+
+    If a checkpoint journal is given, lookups whose cells are all in the journal (with matching source and spec def fingerprints) are restored from it instead of re-run, and completed cells are recorded as they finish
+
+    callbacks (eg. a RateLimitCallbackHandler) are passed to every llm call of both chains and retrieved docs are memoized in retrieval_cache (the lookup chain's default if not given)
+
+    Returns the number of resA/resB cells that were filled in
+    """
+    # NOTE: new chains per unit since the chains keep per-call state (eg. LookupSpecsChain.chat) and units run concurrently
+    lookup_chain = LookupSpecsChain(doc_retriever=doc_retriever, spec_reader=spec_reader, retrieval_cache=retrieval_cache)
+    spec_defs = {name: eq.spec_defs[name] for name in unit.spec_names}
+    unit_instances = [eq_inst for eq_inst in eq.instances if eq_inst.name in unit.instance_names]
+
+    # design values of specs mapped to a design schedule column are read straight from the instance's schedule row (submittal data is unstructured so it is always looked up)
+    design_map = get_eq_spec_header_map(eq, data_attr='design_data', cache_fpath=DATA_CACHE / 'spec_header_maps.json')
+    design_values = {
+        (eq_inst.name, name): eq_inst.design_data[design_map[name]]
+        for eq_inst in unit_instances if eq_inst.design_data
+        for name in spec_defs if name in design_map and eq_inst.design_data.get(design_map[name]) is not None
+    }
+
+    results = eq.results
+    for (inst_name, name), value in design_values.items():
+        results.set_result(inst_name, name, "resA", value=value)
+
+    filled = len(design_values)
+    for res, source in (("resA", eq.design_source), ("resB", eq.submittal_source)):
+        res_unit = unit
+        if res == "resA" and design_values:
+            # only specs missing from some instance's schedule row need the lookup chain
+            res_unit = unit.copy(update={"spec_names": [name for name in unit.spec_names if any((inst_name, name) not in design_values for inst_name in unit.instance_names)]})
+        if res_unit.spec_names:
+            res_spec_defs = {name: spec_defs[name] for name in res_unit.spec_names}
+            filled += lookup_work_unit_results(lookup_chain, eq, res_unit, res, source, res_spec_defs, skip_cells=design_values if res == "resA" else None, journal=journal, callbacks=callbacks)
+    logger.debug(f"Filled {filled}/{2 * unit.num_cells} {eq.name} cells for {', '.join(unit.instance_names)}")
+
+    # only specs found in both sources can be analyzed (and only if their values changed since they were checkpointed)
+    inst_spec_results: Dict[str, List[SpecificationResults]] = {}
+    final_fingerprints: Dict[tuple, str] = {}
+    for eq_inst in unit_instances:
+        spec_results = []
+        for name in spec_defs:
+            design_value, submittal_value = results.get(eq_inst.name, name, "resA.value"), results.get(eq_inst.name, name, "resB.value")
+            if design_value is None or submittal_value is None:
+                continue
+            if journal is not None:
+                fingerprint = cell_fingerprint(design_value, submittal_value, spec_defs[name])
+                entry = journal.get(eq.name, eq_inst.name, name, "final_result", fingerprint)
+                if entry is not None:
+                    results.set(eq_inst.name, name, "final_result", entry.get('value'))
+                    continue
+                final_fingerprints[(eq_inst.name, name)] = fingerprint
+            spec_results.append(SpecificationResults(
+                eq_uid=eq_inst.design_uid or eq_inst.name,
+                spec_name=name,
+                design_result=design_value,
+                submittal_result=submittal_value,
+            ))
+        inst_spec_results[eq_inst.name] = spec_results
+
+    eq_inst_results = [(eq_inst, inst_spec_results[eq_inst.name]) for eq_inst in unit_instances if inst_spec_results.get(eq_inst.name)]
+    if not eq_inst_results:
+        return filled
+
+    analyze_chain = AnalyzeSpecsChain(callbacks=callbacks)
+    for eq_inst, spec_analysis in analyze_chain.analyze_spec_results(eq, eq_inst_results, rtol=rtol):
+        if journal is not None:
+            analyzed = {analysis.spec_name for analysis in spec_analysis if analysis.final_result is not None}
+            journal.record(
+                dict(equipment=eq.name, instance=eq_inst.name, spec=name, source="final_result", fingerprint=final_fingerprints[(eq_inst.name, name)], value=results.get(eq_inst.name, name, "final_result"))
+                for name in spec_defs if name in analyzed
+            )
+    return filled
+
+def lookup_work_unit_results(lookup_chain: LookupSpecsChain, eq: ScopedEquipment, unit: WorkUnit, res: str, source: Source, spec_defs: Dict[str, str], skip_cells: Optional[Dict[tuple, str]] = None, journal: Optional[CheckpointJournal] = None, callbacks: Callbacks = None) -> int:
+    """
+    Fill in a work unit's res (resA or resB) cells of eq from source with the lookup chain (or the checkpoint journal if every cell is in it)
+
+    Lookup results for skip_cells ((instance name, spec name) already filled in some other way) are dropped. Returns the number of cells that were filled in
+
+    If the spec reader's response to some prompt chunks couldn't be parsed, the cells of the other chunks are still filled in (and checkpointed) before the SpecReaderOutputError is re-raised, so the unit is reported as failed and its missing cells are looked up again next run
+    """
+    fingerprints = {}
+    if journal is not None:
+        source_key = retrieval_cache_key(source)
+        fingerprints = {name: cell_fingerprint(source_key, name, spec_def) for name, spec_def in spec_defs.items()}
+        if restore_work_unit_results(journal, eq, unit, res, fingerprints):
+            logger.debug(f"Restored {eq.name} {res} for {', '.join(unit.instance_names)} from checkpoint journal")
+            return 0
+
+    output_error = None
+    try:
+        out = lookup_chain({"source": source, "spec_defs": spec_defs, "spec_res_df": work_unit_to_df(eq, unit)}, callbacks=callbacks)
+        results_df = out[lookup_chain.output_key]
+    except SpecReaderOutputError as e:
+        results_df, output_error = e.result, e
+    if results_df is not None and skip_cells:
+        results_df = results_df.copy()
+        for inst_name, name in skip_cells:
+            if inst_name in results_df.index and name in results_df.columns:
+                results_df.loc[inst_name, name] = None
+    filled = apply_work_unit_results(eq, unit, results_df, res=res)
+    if journal is not None:
+        journal.record(
+            dict(equipment=eq.name, instance=inst_name, spec=name, source=res, fingerprint=fingerprints[name], **eq.results.get_result(inst_name, name, res))
+            for inst_name in unit.instance_names
+            for name in spec_defs if (inst_name, name) in eq.results
+        )
+    if output_error is not None:
+        raise output_error
+    return filled
+
+def restore_work_unit_results(journal: CheckpointJournal, eq: ScopedEquipment, unit: WorkUnit, res: str, fingerprints: Dict[str, str]) -> bool:
+    """Put a work unit's res (resA or resB) results back into eq from the journal if every cell is checkpointed with a matching fingerprint (returns False and changes nothing otherwise)"""
+    cells = [(inst_name, name) for inst_name in unit.instance_names for name in fingerprints if (inst_name, name) in eq.results]
+    entries = {}
+    for inst_name, name in cells:
+        entry = journal.get(eq.name, inst_name, name, res, fingerprints[name])
+        if entry is None:
+            return False
+        entries[(inst_name, name)] = entry
+
+    for (inst_name, name), entry in entries.items():
+        eq.results.set_result(inst_name, name, res, **{field: entry.get(field) for field in eq.results.RES_FIELDS})
+    return True
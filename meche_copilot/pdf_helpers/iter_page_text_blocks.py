@@ -0,0 +1,27 @@
+import json
+import fitz
+from pathlib import Path
+from typing import Iterator, List, Tuple
+from loguru import logger
+
+def iter_page_text_blocks(pdf_fpath: Path, cache_fpath: Path) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Yield (page number, text blocks) for each page of the pdf one page at a time
+
+    Text blocks are read from the per page jsonl files in cache_fpath if they exist, otherwise they are extracted and written there
+    """
+
+    cache_fpath.mkdir(parents=True, exist_ok=True)
+    logger.debug(f"Reading text blocks from {pdf_fpath} (cache: {cache_fpath})")
+    with fitz.open(str(pdf_fpath)) as doc:
+        for p in doc:
+            page_fpath = cache_fpath / f"{p.number}.jsonl"
+            if page_fpath.exists():
+                with page_fpath.open() as f:
+                    page_text_blocks = [json.loads(line)["text_block"] for line in f]
+            else:
+                page_text_blocks = [str(b[4]) for b in p.get_text_blocks()]
+                with page_fpath.open('w') as f:
+                    for text_block in page_text_blocks:
+                        f.write(json.dumps({"text_block": text_block}) + '\n')
+            yield p.number, page_text_blocks
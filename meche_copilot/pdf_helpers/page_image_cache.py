@@ -0,0 +1,100 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import fitz
+from loguru import logger
+
+PageImageKey = Tuple[str, int, str, int, Optional[Tuple[float, float, float, float]]]
+
+class PageImageCache:
+  """
+  LRU cache of rasterized pdf pages (png bytes) keyed by (document hash, page, page contents hash, dpi, clip)
+
+  The page contents hash is part of the key so pages that have been marked up in memory (eg. outlined rects for debug plots) aren't served stale images
+  """
+
+  def __init__(self, max_items: int = 32, max_bytes: int = 512 * 1024 * 1024):
+    self.max_items = max_items
+    self.max_bytes = max_bytes
+    self.hits = 0
+    self.misses = 0
+    self._images: "OrderedDict[PageImageKey, bytes]" = OrderedDict()
+    self._num_bytes = 0
+    self._doc_hashes: Dict[Tuple[str, int, int], str] = {}
+    self._lock = threading.Lock()
+
+  def document_hash(self, doc: fitz.Document) -> str:
+    """Hash of the document file contents (memoized by path, size and mtime)"""
+    fpath = Path(doc.name) if doc.name else None
+    if fpath is None or not fpath.exists():
+      # in memory document, fall back to the document's identity
+      return f"mem-{id(doc)}"
+    stat = fpath.stat()
+    stat_key = (str(fpath), stat.st_size, stat.st_mtime_ns)
+    if stat_key not in self._doc_hashes:
+      sha = hashlib.sha1()
+      with fpath.open('rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+          sha.update(block)
+      self._doc_hashes[stat_key] = sha.hexdigest()
+    return self._doc_hashes[stat_key]
+
+  def key(self, page: fitz.Page, dpi: int, clip: Optional[fitz.Rect] = None) -> PageImageKey:
+    contents_hash = hashlib.sha1(page.read_contents()).hexdigest()
+    clip_key = tuple(round(c, 2) for c in clip) if clip is not None else None
+    return (self.document_hash(page.parent), page.number, contents_hash, int(dpi), clip_key)
+
+  def get_png(self, page: fitz.Page, dpi: int = 72, clip: Optional[fitz.Rect] = None) -> bytes:
+    """Get the png bytes of page rendered at dpi (rasterizes the page only if it isn't already cached)"""
+    key = self.key(page, dpi=dpi, clip=clip)
+    with self._lock:
+      if key in self._images:
+        self.hits += 1
+        self._images.move_to_end(key)
+        return self._images[key]
+      self.misses += 1
+
+    logger.debug(f"Rasterizing page {page.number} at {dpi} dpi (clip={clip})")
+    pix = page.get_pixmap(dpi=int(dpi), clip=clip)
+    png = pix.tobytes("png")
+
+    with self._lock:
+      self._images[key] = png
+      self._num_bytes += len(png)
+      self._evict()
+    return png
+
+  def clear(self) -> None:
+    with self._lock:
+      self._images.clear()
+      self._num_bytes = 0
+
+  def _evict(self) -> None:
+    while self._images and (len(self._images) > self.max_items or self._num_bytes > self.max_bytes):
+      _, png = self._images.popitem(last=False)
+      self._num_bytes -= len(png)
+
+# shared by the pdf plotter, camelot and debug plots so each page is rasterized at most once per resolution
+page_image_cache = PageImageCache()
+
+class CachedPageImageBackend:
+  """
+  Camelot image conversion backend that serves page images from the page image cache instead of rendering with ghostscript
+
+  Camelot splits the page into a temp single page pdf (rotated/cropped the way its table coordinates expect) and asks the backend to convert it, so that pdf is what gets rendered and cached (keyed by its contents, so repeat reads of a page still hit the cache)
+  """
+
+  def __init__(self, resolution: int = 300, cache: PageImageCache = page_image_cache):
+    self.resolution = resolution
+    self.cache = cache
+
+  def convert(self, pdf_path: str, png_path: str, resolution: Optional[int] = None) -> None:
+    # NOTE: not all camelot versions pass the resolution through to the backend
+    dpi = resolution or self.resolution
+    with fitz.open(str(pdf_path)) as doc:
+      png = self.cache.get_png(doc[0], dpi=dpi)
+    with open(png_path, 'wb') as f:
+      f.write(png)
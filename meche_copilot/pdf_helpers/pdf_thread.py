@@ -0,0 +1,20 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+# NOTE: PyMuPDF isn't thread safe so pdf work from concurrent callers (eg. work units running on a thread pool, async retrievals) runs one call at a time on this one thread
+PDF_THREAD_NAME = "meche-copilot-pdf"
+pdf_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=PDF_THREAD_NAME)
+
+def on_pdf_thread() -> bool:
+    return threading.current_thread().name.startswith(PDF_THREAD_NAME)
+
+def run_on_pdf_thread(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run func on the pdf thread and wait for its result
+
+    Runs func directly if called from the pdf thread (eg. a pdf helper called by another one) since waiting on it there would deadlock
+    """
+    if on_pdf_thread():
+        return func(*args, **kwargs)
+    return pdf_executor.submit(func, *args, **kwargs).result()
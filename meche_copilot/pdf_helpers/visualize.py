@@ -4,6 +4,8 @@ import matplotlib.pyplot as plt
 from pydantic import BaseModel
 from PIL import Image
 
+from meche_copilot.pdf_helpers.page_image_cache import page_image_cache
+
 
 red = (1, 0, 0)
 blue = (0, 0, 1)
@@ -13,22 +15,20 @@ green = (0, 1, 0)
 class PdfPlotter(BaseModel):
   """Show a PDF page as img using matplotlib."""
 
+  @classmethod
+  def image(cls, page: fitz.Page, clip=None, scale_factor=1.0) -> Image.Image:
+    # pdf user space is 72 dpi so scale_factor maps directly to a render resolution
+    img_data = page_image_cache.get_png(page, dpi=round(72 * scale_factor), clip=clip)
+    return Image.open(io.BytesIO(img_data))
+
   @classmethod
   def save(cls, fpath: str, page: fitz.Page, clip=None, scale_factor=1.0):
-    mat = fitz.Matrix(scale_factor, scale_factor)
-    page.get_pixmap(clip=clip, matrix=mat)
-    pix = page.get_pixmap()
-    img_data = pix.tobytes()
-    img = Image.open(io.BytesIO(img_data))
+    img = cls.image(page, clip=clip, scale_factor=scale_factor)
     img.save(fpath)
 
   @classmethod
   def show(cls, page: fitz.Page, clip=None, scale_factor=1.0):
-    mat = fitz.Matrix(scale_factor, scale_factor)
-    page.get_pixmap(clip=clip, matrix=mat)
-    pix = page.get_pixmap()
-    img_data = pix.tobytes()
-    img = Image.open(io.BytesIO(img_data))
+    img = cls.image(page, clip=clip, scale_factor=scale_factor)
     plt.imshow(img)
     plt.axis('off') # To turn off axes
     plt.show()
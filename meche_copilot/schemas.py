@@ -3,7 +3,6 @@ This module contains the schemas (used to validate the data) for the data object
 """
 
 import io
-import time
 import ast
 import tempfile
 from langchain import PromptTemplate
@@ -19,12 +18,14 @@ from loguru import logger
 from pathlib import Path
 from datetime import datetime
 from os.path import basename
-from typing import ClassVar, List, Optional, Dict, Union, Any
-from pydantic import BaseModel, root_validator, validator, Field, Extra
+from typing import Callable, ClassVar, List, Optional, Dict, Tuple, Union, Any
+from pydantic import BaseModel, root_validator, validator, Field, Extra, PrivateAttr
 from openpyxl import Workbook, load_workbook, worksheet
-from openpyxl.utils import get_column_letter
 
 from meche_copilot.utils.config import load_config
+from meche_copilot.utils.checkpoint_journal import CheckpointJournal
+from meche_copilot.utils.excel_writer import patch_xlsx, write_xlsx_streaming
+from meche_copilot.utils.read_template_spec_defs import read_template_spec_defs
 from meche_copilot.utils.envars import PROJECT_ROOT
 
 class EquipmentSpecificationAnalysis(BaseModel):
@@ -59,9 +60,52 @@ class EngineeringDesignSchedule(BaseModel):
     headers: Optional[List[str]] = Field(description="schedule table column headers")
     row_data: Optional[Dict[str, List]] = Field(description="schedule table row data")
 
+    _table: Optional[pd.DataFrame] = PrivateAttr(default=None)
+    _table_source: Optional[tuple] = PrivateAttr(default=None)
+
     class Config:
         extra = Extra.allow
 
+    def __setattr__(self, name, value):
+        """Assigning fields in place skips revalidation, but the columnar table has to be rebuilt if its source data changes"""
+        super().__setattr__(name, value)
+        if name in ("row_data", "headers", "column_labels"):
+            self._table = None
+
+    def _table_source_key(self) -> tuple:
+        """What the table is built from (the row_data dict, its row lists and the column labels by identity and row lengths) so replacing or resizing a row also invalidates it"""
+        row_data = self.row_data or {}
+        return (id(row_data), id(self.headers), id(getattr(self, 'column_labels', None)), tuple((label, id(values), len(values)) for label, values in row_data.items()))
+
+    @property
+    def table(self) -> pd.DataFrame:
+        """
+        Schedule row data as an arrow backed dataframe (index is the row labels, columns are the column labels or headers if they line up with the rows, without the row label column)
+
+        Built once from row_data and reused until row_data, headers or column_labels are assigned or a row is replaced, so slicing by row label or column header doesn't re-copy the schedule for every lookup. NOTE: edit a row by replacing its list (eg. row_data[label] = values), values changed inside a row's list aren't picked up
+        """
+        key = self._table_source_key()
+        if self._table is None or self._table_source[0] != key:
+            row_data = self.row_data or {}
+            table = pd.DataFrame.from_dict(row_data, orient="index") if row_data else pd.DataFrame()
+            labels = getattr(self, 'column_labels', None) or self.headers or []
+            if len(labels) == table.shape[1] + 1: # column labels include the row label (tag) column
+                labels = labels[1:]
+            if len(labels) == table.shape[1]:
+                table.columns = labels
+            self._table = table.astype("string[pyarrow]")
+            # keep the source objects alive so their ids in the key can't be reused by new rows
+            self._table_source = (key, row_data, self.headers, getattr(self, 'column_labels', None), list(row_data.values()))
+        return self._table
+
+    def row(self, row_label: str) -> pd.Series:
+        """Get the schedule values for a row label (eg. P-1)"""
+        return self.table.loc[row_label]
+
+    def column(self, header: Union[str, int]) -> pd.Series:
+        """Get the schedule values under a column header for every row label"""
+        return self.table[header]
+
 class ScopeColumns(Enum):
     """
     The Scope document for a project that the user uploads (path specified in the session-config.yaml) is a spreadsheet with these required columns
@@ -81,6 +125,22 @@ class AgentConfig(BaseModel):
     message_prompt_template: HumanMessagePromptTemplate
     model_name: Optional[str]
 
+    # doc retriever source doc embedding (see chains.helpers.embed_source_docs)
+    embedding_backend: str = "openai"
+    embedding_model: Optional[str] = None
+    chunk_max_chars: int = 2000
+    embedding_batch_size: int = 64
+    embedding_workers: int = 4
+
+    # convert tables (eg. schedules) on retrieved pages to markdown when packing them for the spec reader (see chains.helpers.pack_docs_for_prompt)
+    pack_tables: bool = False
+
+    # spec reader prompt chunks sent to the llm at once by LookupSpecsChain
+    max_concurrency: int = 4
+
+    # work units filled out at once by Session.get_results
+    max_workers: int = 2
+
     # TODO - validate that the correct {{}} input keys for each prompt are present in the tempates provided in the config
 
     class Config:
@@ -176,7 +236,8 @@ class ScopedEquipmentInstance(BaseModel):
     The ScopedEquipmentInstance object contains the data relavent to a single instance of a piece of equipment (pump 1, pump 2, etc.)
     """
     name: str
-    instances: List[SpecInstance]
+    # NOTE: spec results given here (eg. parsed input) are moved into the equipment's results store (see ScopedEquipment.results) so this is empty on an equipment's instances
+    instances: List[SpecInstance] = []
     design_uid: Optional[str]
     design_data: Optional[Dict[str, str]]
     submittal_data: Optional[Dict[str, str]]
@@ -195,10 +256,15 @@ class ScopedEquipment(BaseModel):
     submittal_source: Source
     spec_defs: Dict[str, str] = {}
     instances: List[ScopedEquipmentInstance] = []
+    _results: Any = PrivateAttr(default=None)
 
     # DEF_COL = "Definition"
     DEF_COL: ClassVar[str] = "Definition"
 
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.results # take the instances' spec results into the store now
+
     class IOFormats(Enum):
         csv_str = "csv_str"
         df = "df"
@@ -228,6 +294,24 @@ class ScopedEquipment(BaseModel):
                 raise ValueError(f"spec_defs value for key '{key}' must have a length less than {MAX_SPEC_DEF_LEN}. Got length of {len(val)} from: '{val}'")
         return value
 
+    @property
+    def results(self):
+        """
+        The equipment's spec results of record, an array backed SpecResultsStore with one row per instance x spec
+
+        Spec results given on the instances are moved into it the first time it's used (their spec lists are emptied). Use instance_views for pydantic views of the results
+        """
+        if self._results is None:
+            from meche_copilot.utils.spec_results_store import SpecResultsStore
+            self._results = SpecResultsStore.from_equipment(self)
+            for eq_inst in self.instances:
+                eq_inst.instances = []
+        return self._results
+
+    def instance_views(self) -> List[ScopedEquipmentInstance]:
+        """Pydantic views of the instances with their spec results filled in from the results store (changes to them aren't stored)"""
+        return [eq_inst.copy(update={"instances": self.results.instance(eq_inst.name).instances}) for eq_inst in self.instances]
+
     def spec_defs_to(self, output_format: IOFormats = IOFormats.csv_str) -> Union[pd.DataFrame, str]:
         """Convert spec_defs dict to specified output format"""
 
@@ -268,8 +352,8 @@ class ScopedEquipment(BaseModel):
         for eq_inst in self.instances:
             row_labels.append(eq_inst.name)
             new_row = {}
-            for spec_inst in eq_inst.instances:
-                new_row[spec_inst.name] = "None"
+            for spec_name in self.results.spec_names:
+                new_row[spec_name] = "None"
             data_rows.append(new_row)
         df = pd.DataFrame(data_rows, index=row_labels)
 
@@ -281,6 +365,10 @@ class ScopedEquipment(BaseModel):
         else:
             raise ValueError(f"This output format hasn't been implemented: {output_format}")
     
+    def spec_results_to_df(self) -> pd.DataFrame:
+        """Spec results of every instance as one row per (instance, spec) built column by column from the results store"""
+        return self.results.to_df()
+
     @classmethod
     def instances_from(cls, input: str, input_format: IOFormats = IOFormats.csv_str) -> List[ScopedEquipmentInstance]:
 
@@ -314,6 +402,21 @@ class ScopedEquipment(BaseModel):
             ))
         return eq_instances
 
+class WorkUnit(BaseModel):
+    """
+    A batch of an equipment's table (some instances by some specs) small enough to send to the lookup/analyze chains in one go
+
+    Large equipment tables are split into work units by utils.plan_work_units and the results are put back together by instance and spec name
+    """
+    equipment_name: str
+    instance_names: List[str]
+    spec_names: List[str]
+    est_tokens: int = Field(0, description="estimated prompt tokens for the unit's spec defs and cells")
+
+    @property
+    def num_cells(self) -> int:
+        return len(self.instance_names) * len(self.spec_names)
+
 class Session(BaseModel):
     """
     The Session object contains all the information needed to run the session/analysis
@@ -324,6 +427,9 @@ class Session(BaseModel):
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
     equipments: List[ScopedEquipment] = []
+    # what the worksheet on disk holds (equipment name -> (results store, sheet info)) and its mtime so saves can patch just the changed cells
+    _worksheet_snapshot: Dict[str, Any] = PrivateAttr(default_factory=dict)
+    _worksheet_mtime: Optional[int] = PrivateAttr(default=None)
     class Config:
         datetime_format = "%Y-%m-%d_%H.%M.%S"
 
@@ -344,18 +450,6 @@ class Session(BaseModel):
         values["updated_at"] = datetime.now().strftime(datetime_format)
         return value
 
-    @validator('equipments', pre=True, each_item=True)
-    def validate_equipments(cls, v):
-        """Number of equipment instances * number of specs shouldn't exceed MAX"""
-
-        MAX_TABLE_SIZE = 100 # rows by columns (specs by instances)
-
-        # TODO - this validation is a temp solution. I have no idea what this limit should be set to in terms of token processing....should prob just implement batching to deal with token limitations in the long term. Doing this for now.
-
-        if len(v.spec_defs.keys()) * len(v.instances) > MAX_TABLE_SIZE:
-            raise ValueError(f'The number of equipment instances * number of specs should not exceed {MAX_TABLE_SIZE}')
-        return v
-
     @property
     def name(self) -> Optional[str]:
         if self.config.working_fpath:
@@ -370,41 +464,24 @@ class Session(BaseModel):
         sess.load_equipments_from_scope()
         return sess
 
-    def to_equipment_worksheet(self):
+    def to_equipment_worksheet(self, patch: bool = True):
+        """
+        Write the session's equipments to the worksheet (three sheets per equipment: sources, spec defs and spec results)
+
+        If patch and the worksheet on disk is the one this session last read or wrote, only the result cells that changed since then are updated (see patch_equipment_worksheet), otherwise the whole worksheet is rewritten
+        """
+        output_fpath = self.config.working_fpath / "worksheet.xlsx"
+        stores = {eq.name: eq.results for eq in self.equipments}
+        if patch and self.patch_equipment_worksheet(output_fpath, stores):
+            return output_fpath
+
         logger.info(f'Writing equipment worksheet...')
         sheets_and_dfs = []
 
         for eq in self.equipments: # three sheets per equipment
 
             # equipment specs results worksheet
-            spec_results_data = {
-                "instance": [],
-                "spec": [],
-                "resA.value": [],
-                "resA.page": [],
-                "resA.validation": [],
-                "resA.annotation": [],
-                "resB.value": [],
-                "resB.page": [],
-                "resB.validation": [],
-                "resB.annotation": [],
-                "final_result": [],
-            }
-            for inst in eq.instances:
-                # pd.json_normalize(inst["spec_results"]).T
-                for spec in inst.instances:
-                    spec_results_data["instance"].append(inst.name)
-                    spec_results_data["spec"].append(spec.name)
-                    spec_results_data["resA.value"].append(spec.resA.value)
-                    spec_results_data["resA.page"].append(spec.resA.page)
-                    spec_results_data["resA.validation"].append(spec.resA.validation)
-                    spec_results_data["resA.annotation"].append(spec.resA.annotation)
-                    spec_results_data["resB.value"].append(spec.resB.value)
-                    spec_results_data["resB.page"].append(spec.resB.page)
-                    spec_results_data["resB.validation"].append(spec.resB.validation)
-                    spec_results_data["resB.annotation"].append(spec.resB.annotation)
-                    spec_results_data["final_result"].append(spec.final_result)
-            spec_results_df = pd.DataFrame(spec_results_data)
+            spec_results_df = stores[eq.name].to_df()
 
             # equipment-spec-defs worksheet
             spec_defs_df = pd.DataFrame.from_dict(eq.spec_defs, orient="index", columns=["description"])
@@ -419,27 +496,65 @@ class Session(BaseModel):
             sheets_and_dfs.append((f"{eq.name}-specs-defs", spec_defs_df))
             sheets_and_dfs.append((f"{eq.name}-specs-results", spec_results_df))
                 
-        output_fpath = self.config.working_fpath / "worksheet.xlsx"
-        with pd.ExcelWriter(output_fpath) as writer:
-            for sheet_name, df in sheets_and_dfs:
-                index = False if sheet_name.endswith('results') else True
-                df.to_excel(writer, sheet_name=sheet_name, index=index)
+        write_xlsx_streaming(
+            sheets=((sheet_name, df, not sheet_name.endswith('results')) for sheet_name, df in sheets_and_dfs),
+            fpath=output_fpath
+        )
+        self._set_worksheet_snapshot(output_fpath, stores)
         logger.info(f'Wrote worksheet to {output_fpath}')
         return output_fpath
 
+    def patch_equipment_worksheet(self, fpath: Path, stores: Dict[str, Any]) -> bool:
+        """
+        Update only the spec result cells that changed since the worksheet was last read or written by this session
+
+        Returns False (and writes nothing) if the worksheet can't be patched, ie. it doesn't exist, was changed by something else, or its equipments, instances, specs, spec defs or sources changed
+        """
+        if not fpath.exists() or fpath.stat().st_mtime_ns != self._worksheet_mtime:
+            return False
+        if set(stores) != set(self._worksheet_snapshot):
+            return False
+
+        updates: Dict[str, Dict] = {}
+        for eq in self.equipments:
+            prev_store, prev_info = self._worksheet_snapshot[eq.name]
+            if prev_info != self._worksheet_sheet_info(eq):
+                return False
+            dirty = stores[eq.name].dirty_cells(prev_store)
+            if dirty is None:
+                return False
+            # results sheet is a header row then one row per (instance, spec) with instance and spec in the first two columns
+            cells = {
+                (int(row) + 2, stores[eq.name].FIELDS.index(field) + 3): stores[eq.name].columns[field][row]
+                for field, rows in dirty.items() for row in rows
+            }
+            if cells:
+                updates[f"{eq.name}-specs-results"] = cells
+
+        if updates:
+            num_cells = patch_xlsx(fpath, updates)
+            logger.info(f'Patched {num_cells} changed cells in {len(updates)} sheets of {fpath}')
+        else:
+            logger.info(f'No changed results to write to {fpath}')
+        self._set_worksheet_snapshot(fpath, stores)
+        return True
+
+    @staticmethod
+    def _worksheet_sheet_info(eq: ScopedEquipment) -> tuple:
+        """What the sources and spec defs sheets of an equipment are written from"""
+        return (dict(eq.spec_defs), eq.design_source.dict(exclude_unset=True), eq.submittal_source.dict(exclude_unset=True))
+
+    def _set_worksheet_snapshot(self, fpath: Path, stores: Dict[str, Any]) -> None:
+        self._worksheet_snapshot = {eq.name: (stores[eq.name].copy(), self._worksheet_sheet_info(eq)) for eq in self.equipments}
+        self._worksheet_mtime = fpath.stat().st_mtime_ns
+
     def to_equipment_masterlist(self):
         logger.info(f'Writing equipment masterlist...')
         dfs = []
         for scoped_eq in self.equipments:
             sheet_name = scoped_eq.name
-            instances = []
-            for inst in scoped_eq.instances: 
-                instance = {}
-                for spec in inst.spec_results: # get spec.name and final result
-                    print(f"{spec.name}: {spec.final_result}")
-                    instance[spec.name] = spec.final_result
-                instances.append(instance)
-            scoped_eq_df = pd.DataFrame(instances)
+            # one row of final results per instance
+            scoped_eq_df = scoped_eq.results.table("final_result").reset_index(drop=True)
             dfs.append((sheet_name, scoped_eq_df))
 
         output_fpath = self.config.working_fpath / "masterlist.xlsx"
@@ -450,47 +565,46 @@ class Session(BaseModel):
 
     def load_equipments_from_scope(self):
         logger.info(f'Getting scoped equipments...')
-        scope_wb = load_workbook(str(PROJECT_ROOT / self.config.scope_fpath))
+        scope_wb = load_workbook(str(PROJECT_ROOT / self.config.scope_fpath), read_only=True)
         scope_ws = scope_wb.active
         scoped_equipment: ScopedEquipment = []
         scope_columns = list(ScopeColumns.__members__.keys())
+        header = next(scope_ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
         for i, col_name in enumerate(scope_columns):
-            if col_name != scope_ws[f"{get_column_letter(i+1)}1"].value:
+            if i >= len(header) or col_name != header[i]:
                 raise ValueError(f'The columns in the scope file do not match the fields in the ScopeColumns Enum')
 
         # each row in scope corresponds to a scoped equipment
         for row in scope_ws.iter_rows(min_row=2, values_only=True):
+            row = tuple(row) + (None,) * (len(scope_columns) - len(row)) # read-only rows can be short if trailing cells are empty
             name = Path(row[ScopeColumns.specifications_template_fpath.value]).stem.replace('-', ' ').replace('template', '').strip()
             template_fpath = self.config.templates_fpath / row[ScopeColumns.specifications_template_fpath.value]
 
-            spec_defs = {}
-            temp_wb = load_workbook(str(PROJECT_ROOT / template_fpath))
-            temp_ws = temp_wb.active
-            for col in temp_ws.iter_cols():
-                spec_defs[col[0].value] = col[1].value or ""
-            temp_wb.close()
+            spec_defs = read_template_spec_defs(PROJECT_ROOT / template_fpath)
             
-            instances: List[ScopedEquipmentInstance] = []
-            for i in range(1, row[ScopeColumns.num_instances.value]+1):
-                instance_name = f"{name}-{i}"
-                spec_results: List[SpecInstance] = []
-                for spec_name in spec_defs.keys():
-                    spec_results.append(SpecInstance(name=spec_name, resA=SpecResult(), resB=SpecResult(), final_result=None))
-                instances.append(ScopedEquipmentInstance(name=instance_name, instances=spec_results))
+            # NOTE: the (empty) spec results are only in the equipment's results store so skip validation (construct) when building the instances
+            instances: List[ScopedEquipmentInstance] = [
+                ScopedEquipmentInstance.construct(
+                    name=f"{name}-{i}",
+                    instances=[],
+                    design_uid=None,
+                    design_data=None,
+                    submittal_data=None,
+                )
+                for i in range(1, row[ScopeColumns.num_instances.value]+1)
+            ]
 
             design_obj = Source(
                 name=self.config.design.name,
                 description=self.config.design.description,
                 ref_docs=[ self.config.working_fpath / path.strip() for path in row[ScopeColumns.design_fpaths.value].split(',') ],
-                notes=row[ScopeColumns.design_notes.value] or "",
-                result=spec_results
+                notes=row[ScopeColumns.design_notes.value] or ""
             )
             submittal_obj = Source(
                 name=self.config.submittal.name,
                 description=self.config.submittal.description,
                 ref_docs=[ self.config.working_fpath / path.strip() for path in row[ScopeColumns.submittal_fpaths.value].split(',') ],
-                notes=row[ScopeColumns.submittal_notes.value] or "",
-                result=spec_results
+                notes=row[ScopeColumns.submittal_notes.value] or ""
             )
             # instances = {'instances': instances} # wrap equipment instances in a dict to match the pydantic model
             scoped_equipment.append(ScopedEquipment(
@@ -506,83 +620,113 @@ class Session(BaseModel):
     def update_from_worksheet(self):
         logger.info(f'Updating session from worksheet...')
         worksheet_fpath = self.config.working_fpath / 'worksheet.xlsx'
+        # NOTE: read every sheet in one pass (each read_excel call re-parses the whole workbook)
+        sheets = pd.read_excel(worksheet_fpath, sheet_name=None, dtype=object)
         new_equipments: List[ScopedEquipment] = []
         for eq in self.equipments:
-            sources_df = pd.read_excel(worksheet_fpath, sheet_name=f'{eq.name}-sources', index_col=0)
-            design = sources_df['design'].dropna().to_dict()
-            submittal = sources_df['submittal'].dropna().to_dict()
-
-            design_obj = Source(**design)
-            submittal_obj = Source(**submittal)
-
-            df_spec_defs = pd.read_excel(worksheet_fpath, sheet_name=f'{eq.name}-specs-defs', index_col=0)
-            spec_defs = df_spec_defs.to_dict()['description']
-
-            df_spec_results = pd.read_excel(worksheet_fpath, sheet_name=f'{eq.name}-specs-results')
-            instances: ScopedEquipmentInstance = []
-            inst_name = None
-            for i, row in df_spec_results.iterrows():
-                if row['instance'] != inst_name:
-                    # append previous instance
-                    if inst_name is not None:
-                        instances.append(ScopedEquipmentInstance(**eq_instance))
-
-                    # create new instance
-                    inst_name = row['instance']
-                    eq_instance = {}
-                    eq_instance['name'] = inst_name
-                    eq_instance['spec_results'] = []
-                spec_res = {}
-                spec_res['name'] = row['spec']
-                spec_res['resA'] = {}
-                spec_res['resA']['value'] = row['resA.value']
-                spec_res['resA']['page'] = row['resA.page']
-                spec_res['resA']['validation'] = row['resA.validation']
-                spec_res['resA']['annotation'] = row['resA.annotation']
-                spec_res['resB'] = {}
-                spec_res['resB']['value'] = row['resB.value']
-                spec_res['resB']['page'] = row['resB.page']
-                spec_res['resB']['validation'] = row['resB.validation']
-                spec_res['resB']['annotation'] = row['resB.annotation']
-                spec_res['final_result'] = row['final_result']
-                eq_instance['spec_results'].append(spec_res)
+            sources_df = sheets[f'{eq.name}-sources'].set_index(sheets[f'{eq.name}-sources'].columns[0])
+            design_obj = Source(**sources_df['design_source'].dropna().to_dict())
+            submittal_obj = Source(**sources_df['submittal_source'].dropna().to_dict())
+
+            df_spec_defs = sheets[f'{eq.name}-specs-defs'].set_index(sheets[f'{eq.name}-specs-defs'].columns[0])
+            spec_defs = df_spec_defs['description'].fillna("").to_dict()
+
+            df_spec_results = sheets[f'{eq.name}-specs-results']
+            df_spec_results = df_spec_results.astype(object).where(pd.notna(df_spec_results), None)
+            prev_instances = {eq_inst.name: eq_inst for eq_inst in eq.instances}
+            instances: List[ScopedEquipmentInstance] = []
+            for inst_name in df_spec_results['instance'].unique():
+                # the worksheet doesn't hold the instances' design and submittal data so they're kept from the current instances
+                prev_inst = prev_instances.get(inst_name)
+                instances.append(ScopedEquipmentInstance(
+                    name=inst_name,
+                    design_uid=prev_inst.design_uid if prev_inst else None,
+                    design_data=prev_inst.design_data if prev_inst else None,
+                    submittal_data=prev_inst.submittal_data if prev_inst else None,
+                ))
 
             scoped_eq = ScopedEquipment(
-                name="pump",
+                name=eq.name,
                 design_source=design_obj,
                 submittal_source=submittal_obj,
                 spec_defs=spec_defs,
                 instances=instances,
             )
+            # results go straight into the equipment's results store (no spec result models)
+            scoped_eq.results.update_from_df(df_spec_results)
             
             new_equipments.append(scoped_eq)
         self.equipments = new_equipments
+
+        # the worksheet can be patched from here on if its results sheets are laid out the way they're written
+        stores = {eq.name: eq.results for eq in self.equipments}
+        if all(
+            sheets[f'{name}-specs-results'][['instance', 'spec']].values.tolist() == store.to_df()[['instance', 'spec']].values.tolist()
+            for name, store in stores.items()
+        ):
+            self._set_worksheet_snapshot(worksheet_fpath, stores)
         
-    def get_results(self):
-        """Get results for each piece of equipment in the esd object"""
-        
-        specs_done = 0
+    def plan_work_units(self, max_cells: int = 100, max_tokens: int = 4000, selected_equipments: Optional[List[str]] = None, selected_equipment_instances: Optional[List[str]] = None, count_tokens: Optional[Callable[[str], int]] = None) -> List[Tuple[ScopedEquipment, WorkUnit]]:
+        """
+        Split the equipments' results tables into work units (see utils.plan_work_units)
+
+        Only equipments named in selected_equipments and instances named in selected_equipment_instances are planned (None means all of them). Tokens are counted with count_tokens if given
+        """
+        from meche_copilot.utils.plan_work_units import plan_work_units
+        token_kwargs = {} if count_tokens is None else {"count_tokens": count_tokens}
+        unknown = set(selected_equipments or []) - {eq.name for eq in self.equipments}
+        unknown |= set(selected_equipment_instances or []) - {inst.name for eq in self.equipments for inst in eq.instances}
+        if unknown:
+            raise ValueError(f"Unknown equipment(s) or instance(s): {', '.join(sorted(unknown))}")
+
+        work_units: List[Tuple[ScopedEquipment, WorkUnit]] = []
         for eq in self.equipments:
-            total_instances = len(eq.instances)
-            total_specs = len(eq.spec_defs.keys())
-            total_work = total_specs * total_instances
-            try:
-                # Calculate the time to sleep between each progress update
-                sleep_time = 3.0 / total_work
-
-                # TODO - run analyze specs chain for each instance
-                # res = analyze_specs_chain.run({'equipments': [eq]}})
-                # yield specs_done, f"Progress: {specs_done}/{total_work} specs done for {eq.name}"
-
-                # Simulate the long-running function by sleeping and yielding progress updates
-                for i in range(total_work):
-                    # TODO - run analyze specs chain for each instance???
-                    time.sleep(sleep_time)
-                    specs_done += 1
-                    yield specs_done, f"Progress: {specs_done}/{total_work} specs done for {eq.name}"
-                
-            except Exception as e:
-                logger.exception(f"\nError getting results for {eq.name}\nMoving on...")
-
-            specs_done += total_specs*total_instances
-            yield specs_done, f"\nDone filling out worksheet for {eq.name}\n"
\ No newline at end of file
+            if selected_equipments is not None and eq.name not in selected_equipments:
+                continue
+            instance_names = [inst.name for inst in eq.instances if selected_equipment_instances is None or inst.name in selected_equipment_instances]
+            work_units.extend((eq, unit) for unit in plan_work_units(eq, max_cells=max_cells, max_tokens=max_tokens, instance_names=instance_names, **token_kwargs))
+        return work_units
+
+    def read_design_data(self) -> int:
+        """
+        Fill in the design uid and design data (schedule rows) of the equipments' instances from the design schedules (see map_specs_to_schedule.set_design_data_from_schedules)
+
+        The schedules are read by the ReadDesignChain the first time and cached after that. Returns the number of instances filled in (the others have their design values looked up by the llm)
+        """
+        from meche_copilot.chains.read_design_chain import ReadDesignChain
+        from meche_copilot.chains.helpers.map_specs_to_schedule import set_design_data_from_schedules
+        design_schedules = ReadDesignChain().get_design_schedules(scoped_eq=self.equipments)
+        return sum(set_design_data_from_schedules(eq, design_schedules or []) for eq in self.equipments)
+
+    def checkpoint_journal(self) -> CheckpointJournal:
+        """The project's checkpoint journal of completed result cells (kept next to the worksheet)"""
+        return CheckpointJournal(self.config.working_fpath / "checkpoint-journal.jsonl")
+
+    def retrieval_cache(self):
+        """The project's RetrievalCache of relavent docs by source fingerprint (created on first use and kept next to the worksheet)"""
+        from meche_copilot.chains.helpers.retrieval_cache import get_retrieval_cache
+        return get_retrieval_cache(self.config.working_fpath / "retrieval-cache")
+
+    def get_results(self, work_units: Optional[List[Tuple[ScopedEquipment, WorkUnit]]] = None, max_workers: Optional[int] = None, journal: Optional[CheckpointJournal] = None, callbacks: Optional[List[Any]] = None):
+        """
+        Get results for each piece of equipment in the session
+
+        Reads the instances' design data from the design schedules (see read_design_data) and then runs the lookup and analyze chains for each work unit (self.plan_work_units() if work_units isn't given) on max_workers threads (spec_reader max-workers in the session config, default 2) and yields (cells done, cells failed, progress message) as each unit completes
+
+        If a checkpoint journal is given, cells completed by a previous (interrupted) run are restored from it rather than looked up again. callbacks are langchain callback handlers for every llm call (eg. a shared rate limiter)
+        """
+        from meche_copilot.get_work_unit_results import get_work_unit_results
+        from meche_copilot.utils.run_work_units import run_work_units
+
+        work_units = work_units if work_units is not None else self.plan_work_units()
+        self.read_design_data()
+        max_workers = max_workers or self.config.spec_reader.max_workers
+        retrieval_cache = self.retrieval_cache()
+        logger.info(f"Getting results for {len(work_units)} work units ({sum(unit.num_cells for _, unit in work_units)} cells) with {max_workers} workers")
+
+        def run_unit(eq: ScopedEquipment, unit: WorkUnit) -> int:
+            return get_work_unit_results(eq, unit, doc_retriever=self.config.doc_retriever, spec_reader=self.config.spec_reader, journal=journal, callbacks=callbacks, retrieval_cache=retrieval_cache)
+
+        for cells_done, cells_failed, message in run_work_units(work_units, run_unit, max_workers=max_workers):
+            self.updated_at = datetime.now().strftime(self.get_datetime_format())
+            yield cells_done, cells_failed, message
@@ -0,0 +1,83 @@
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+from loguru import logger
+
+# (equipment, instance, spec, source)
+CellKey = Tuple[str, str, str, str]
+
+def cell_fingerprint(*parts: str) -> str:
+    """Fingerprint of whatever a cell's result depends on (eg. the source's retrieval key and the spec def) so changed cells are redone"""
+    return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+
+class CheckpointJournal:
+    """
+    Append-only jsonl journal of completed result cells keyed by (equipment, instance, spec, source) so an interrupted fill-out can be resumed
+
+    Each line is one cell with the fingerprint it was computed from and its result. Later lines win, a cell only counts as done if its fingerprint still matches, and cells that failed or came back without a value are never written so a rerun redoes them
+    """
+
+    def __init__(self, fpath: Path):
+        self.fpath = Path(fpath)
+        self._entries: Dict[CellKey, dict] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self) -> None:
+        if not self.fpath.exists():
+            return
+        with open(self.fpath, 'r') as f:
+            for line_num, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line is cut short if the run died mid write
+                    logger.warning(f"Skipping unreadable line {line_num} of checkpoint journal {self.fpath}")
+                    continue
+                if entry.get('value') is not None:
+                    self._entries[self.key(**entry)] = entry
+        logger.info(f"Loaded {len(self._entries)} checkpointed cells from {self.fpath}")
+
+    @staticmethod
+    def key(equipment: str, instance: str, spec: str, source: str, **kwargs) -> CellKey:
+        return (equipment, instance, spec, source)
+
+    def get(self, equipment: str, instance: str, spec: str, source: str, fingerprint: Optional[str] = None) -> Optional[dict]:
+        """The journal entry for a cell (None if it isn't done or was done with a different fingerprint)"""
+        with self._lock:
+            entry = self._entries.get((equipment, instance, spec, source))
+        if entry is None or (fingerprint is not None and entry.get('fingerprint') != fingerprint):
+            return None
+        return entry
+
+    def is_done(self, equipment: str, instance: str, spec: str, source: str, fingerprint: Optional[str] = None) -> bool:
+        return self.get(equipment, instance, spec, source, fingerprint) is not None
+
+    def record(self, entries: Iterable[dict]) -> None:
+        """Append completed cells (dicts with equipment, instance, spec, source, fingerprint and the result fields) and flush them to disk (cells without a value are skipped)"""
+        entries = [entry for entry in entries if entry.get('value') is not None]
+        if not entries:
+            return
+        with self._lock:
+            self.fpath.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.fpath, 'a') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, default=str) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            for entry in entries:
+                self._entries[self.key(**entry)] = entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self.fpath.exists():
+                self.fpath.unlink()
@@ -1,16 +1,62 @@
-from typing import List, Type
+from typing import Iterable, Iterator, List, Type
 from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
 from pathlib import Path
+import os
+import json
 import re
+import tempfile
 
-def pydantic_to_jsonl(items: List[BaseModel], fpath: Path) -> None:
-    with fpath.open("w") as f:
-        for item in items:
-            f.write(item.json() + "\n")
+try:
+    import orjson
+except ImportError: # fall back to the (slower) std lib json
+    orjson = None
 
-def pydantic_from_jsonl(fpath: Path, pydantic_class: Type[BaseModel]) -> List[BaseModel]:
-    with fpath.open("r") as f:
-        return [pydantic_class.parse_raw(line) for line in f]
+def _dumps(item: BaseModel) -> bytes:
+    # orjson serializes eg. datetimes itself (never calling default) so models with their own json_encoders go through item.json()
+    if orjson is not None and not item.__config__.json_encoders:
+        return orjson.dumps(item.dict(), default=pydantic_encoder)
+    return item.json().encode()
+
+def _loads(line: bytes):
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+def pydantic_to_jsonl(items: Iterable[BaseModel], fpath: Path) -> None:
+    """Write pydantic items to a jsonl file (one item per line) in a single bulk write"""
+    lines = [_dumps(item) for item in items]
+    with fpath.open("wb") as f:
+        f.write(b"\n".join(lines) + b"\n" if lines else b"")
+
+def write_json_atomic(data, fpath: Path, **dump_kwargs) -> None:
+    """json.dump data to a temp file next to fpath then move it into place so readers never see a partly written file"""
+    fpath = Path(fpath)
+    fpath.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_fpath = tempfile.mkstemp(dir=fpath.parent, prefix=f".{fpath.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, **dump_kwargs)
+        os.replace(tmp_fpath, fpath)
+    except BaseException:
+        Path(tmp_fpath).unlink(missing_ok=True)
+        raise
+
+def iter_pydantic_from_jsonl(fpath: Path, pydantic_class: Type[BaseModel], trusted: bool = False) -> Iterator[BaseModel]:
+    """
+    Stream pydantic items from a jsonl file one line at a time
+
+    If trusted (ie. a cache we wrote ourselves) items are built with construct() which skips validation, so nested models and coerced types (eg. Path) are left as the raw json values
+    """
+    with fpath.open("rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = _loads(line)
+            yield pydantic_class.construct(**data) if trusted else pydantic_class.parse_obj(data)
+
+def pydantic_from_jsonl(fpath: Path, pydantic_class: Type[BaseModel], trusted: bool = False) -> List[BaseModel]:
+    return list(iter_pydantic_from_jsonl(fpath, pydantic_class, trusted=trusted))
 
 def title_to_filename(title):
     # Convert to lowercase and replace spaces with underscores
@@ -12,4 +12,7 @@ if not PROJECT_ROOT.exists():
 
 DATA_CACHE = os.environ["DATA_CACHE"]
 DATA_CACHE = PROJECT_ROOT / DATA_CACHE
-DATA_CACHE.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+DATA_CACHE.mkdir(parents=True, exist_ok=True)
+
+# chroma vector db for embedded source docs (relative to PROJECT_ROOT, set per project to keep projects' collections apart)
+CHROMA_DB_DIR = PROJECT_ROOT / os.environ.get("CHROMA_DB_DIR", "data/.chroma_db")
@@ -0,0 +1,156 @@
+import io
+import os
+import re
+import datetime
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from openpyxl import Workbook
+from openpyxl.utils.cell import column_index_from_string, coordinate_from_string, get_column_letter
+from openpyxl.utils.datetime import to_excel
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_XML_NS = "http://www.w3.org/XML/1998/namespace"
+# first element start tag of an xml part (skips the <?xml ...?> declaration and comments)
+_ROOT_TAG = re.compile(rb"<[A-Za-z][^>]*>")
+_XMLNS_DECL = re.compile(rb'xmlns(?::[\w.-]+)?="[^"]*"')
+_XMLNS = re.compile(rb"xmlns(?::[\w.-]+)?(?==)")
+
+def cell_value(val):
+    """Convert a value to something openpyxl can write (numpy scalars to python, NaN to None and anything else like lists or paths to str, same as pandas)"""
+    if val is None or (pd.api.types.is_scalar(val) and pd.isna(val)):
+        return None
+    if isinstance(val, np.generic):
+        return val.item()
+    if isinstance(val, (str, bool, int, float, datetime.date, datetime.datetime, datetime.timedelta)):
+        return val
+    return str(val)
+
+def df_to_rows(df: pd.DataFrame, index: bool = True) -> Iterator[List]:
+    """Yield the header then each row of df as lists of plain python values (NaN as None) like df.to_excel lays them out"""
+    yield ([df.index.name] if index else []) + [str(col) for col in df.columns]
+    for row in df.itertuples(index=index, name=None):
+        yield [cell_value(val) for val in row]
+
+def write_xlsx_streaming(sheets: Iterable[Tuple[str, pd.DataFrame, bool]], fpath: Path) -> Path:
+    """
+    Write (sheet name, df, index) sheets to an xlsx file with an openpyxl write-only workbook
+
+    Rows are streamed to disk as they are appended so memory stays bounded for large worksheets (NOTE: no cell styling, same as df.to_excel without a styler)
+    """
+    wb = Workbook(write_only=True)
+    for sheet_name, df, index in sheets:
+        ws = wb.create_sheet(title=sheet_name)
+        for row in df_to_rows(df, index=index):
+            ws.append(row)
+    wb.save(str(fpath))
+    return fpath
+
+def patch_xlsx(fpath: Path, updates: Dict[str, Dict[Tuple[int, int], Any]]) -> int:
+    """
+    Update only the given cells of an existing xlsx file (updates maps sheet name to {(row, column): value} with 1-based rows and columns)
+
+    Only the updated sheets' xml parts are rewritten (strings are written inline so the shared strings table isn't touched), every other part of the zip is copied as is and the file is replaced atomically so an interrupted save doesn't leave a broken worksheet. Returns the number of cells written
+    """
+    fpath = Path(fpath)
+    tmp_fpath = fpath.with_name(f".{fpath.name}.tmp")
+    num_cells = 0
+    try:
+        with zipfile.ZipFile(fpath) as zin:
+            sheet_parts = _sheet_parts(zin)
+            missing = set(updates) - set(sheet_parts)
+            if missing:
+                raise KeyError(f"Worksheet(s) {', '.join(sorted(missing))} not in {fpath}")
+            patched = {}
+            for sheet_name, cells in updates.items():
+                patched[sheet_parts[sheet_name]] = _patch_sheet_xml(zin.read(sheet_parts[sheet_name]), cells)
+                num_cells += len(cells)
+            with zipfile.ZipFile(tmp_fpath, "w") as zout:
+                for info in zin.infolist():
+                    zout.writestr(info, patched[info.filename] if info.filename in patched else zin.read(info))
+    except BaseException:
+        tmp_fpath.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_fpath, fpath)
+    return num_cells
+
+def _sheet_parts(zin: zipfile.ZipFile) -> Dict[str, str]:
+    """Map each sheet name of an xlsx zip to its worksheet part (eg. xl/worksheets/sheet1.xml)"""
+    rels = ET.fromstring(zin.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{{{_PKG_REL_NS}}}Relationship")}
+    workbook = ET.fromstring(zin.read("xl/workbook.xml"))
+    parts = {}
+    for sheet in workbook.iter(f"{{{_MAIN_NS}}}sheet"):
+        target = targets[sheet.get(f"{{{_REL_NS}}}id")]
+        # targets are relative to xl/ unless absolute within the package
+        parts[sheet.get("name")] = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+    return parts
+
+def _patch_sheet_xml(xml: bytes, cells: Dict[Tuple[int, int], Any]) -> bytes:
+    """Set the given cells of a worksheet part's sheetData, adding rows and cells in order where they don't exist yet"""
+    for _, (prefix, uri) in ET.iterparse(io.BytesIO(xml), events=("start-ns",)):
+        ET.register_namespace(prefix, uri)
+    root = ET.fromstring(xml)
+    sheet_data = root.find(f"{{{_MAIN_NS}}}sheetData")
+    rows = {int(row.get("r")): row for row in sheet_data.findall(f"{{{_MAIN_NS}}}row")}
+    max_col = 1
+    for (row_idx, col_idx), val in sorted(cells.items()):
+        row = rows.get(row_idx)
+        if row is None:
+            row = rows[row_idx] = ET.Element(f"{{{_MAIN_NS}}}row", r=str(row_idx))
+            sheet_data.insert(sum(1 for r in rows if r < row_idx), row)
+        ref = f"{get_column_letter(col_idx)}{row_idx}"
+        cell = next((c for c in row.findall(f"{{{_MAIN_NS}}}c") if c.get("r") == ref), None)
+        if cell is None:
+            cell = ET.Element(f"{{{_MAIN_NS}}}c", r=ref)
+            # cells come first in a row (before any extLst) ordered by column
+            before = [i for i, c in enumerate(row) if c.tag == f"{{{_MAIN_NS}}}c" and _column(c) < col_idx]
+            row.insert(before[-1] + 1 if before else 0, cell)
+            # spans is only an optional hint of the row's columns
+            row.attrib.pop("spans", None)
+        _set_cell(cell, cell_value(val))
+        max_col = max(max_col, col_idx)
+
+    dimension = root.find(f"{{{_MAIN_NS}}}dimension")
+    if dimension is not None:
+        max_col = max([max_col] + [_column(c) for row in rows.values() for c in row.findall(f"{{{_MAIN_NS}}}c")])
+        dimension.set("ref", f"A1:{get_column_letter(max_col)}{max(rows)}")
+
+    patched = ET.tostring(root, encoding="UTF-8", xml_declaration=True)
+    # ElementTree only declares the namespaces that are used so keep the original root tag (eg. for prefixes only named in mc:Ignorable) plus anything it had to declare there
+    orig_tag, new_tag = _ROOT_TAG.search(xml), _ROOT_TAG.search(patched)
+    declared = set(_XMLNS.findall(orig_tag.group()))
+    extra = b"".join(b" " + decl for decl in _XMLNS_DECL.findall(new_tag.group()) if _XMLNS.search(decl).group() not in declared)
+    root_tag = orig_tag.group()[:-1] + extra + b">"
+    return patched[:new_tag.start()] + root_tag + patched[new_tag.end():]
+
+def _column(cell: ET.Element) -> int:
+    return column_index_from_string(coordinate_from_string(cell.get("r"))[0])
+
+def _set_cell(cell: ET.Element, val: Any) -> None:
+    """Replace a cell's value (keeping its style), as an inline string, bool or number"""
+    for child in list(cell):
+        cell.remove(child)
+    cell.attrib.pop("t", None)
+    if val is None:
+        return
+    if isinstance(val, str):
+        cell.set("t", "inlineStr")
+        text = ET.SubElement(ET.SubElement(cell, f"{{{_MAIN_NS}}}is"), f"{{{_MAIN_NS}}}t")
+        text.text = val
+        if val != val.strip():
+            text.set(f"{{{_XML_NS}}}space", "preserve")
+        return
+    if isinstance(val, bool):
+        cell.set("t", "b")
+        val = int(val)
+    elif isinstance(val, (datetime.date, datetime.datetime, datetime.timedelta)):
+        # NOTE: written as an excel serial number without a date format
+        val = to_excel(val)
+    ET.SubElement(cell, f"{{{_MAIN_NS}}}v").text = repr(val) if isinstance(val, float) else str(val)
@@ -0,0 +1,99 @@
+import pandas as pd
+from typing import Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+from meche_copilot.schemas import ScopedEquipment, WorkUnit
+from meche_copilot.utils.num_tokens_from_string import num_tokens_from_string
+
+# rough tokens for a cell in the results json (eg. "pump-12": "1750 RPM,3")
+TOKENS_PER_CELL = 12
+
+def plan_work_units(
+    eq: ScopedEquipment,
+    max_cells: int = 100,
+    max_tokens: int = 4000,
+    instance_names: Optional[List[str]] = None,
+    count_tokens: Callable[[str], int] = num_tokens_from_string,
+) -> List[WorkUnit]:
+    """
+    Split an equipment's table (instances by specs) into work units with at most max_cells cells and about max_tokens prompt tokens each
+
+    Specs are grouped first (every unit repeats its spec defs in the prompt) then each spec group is split across instances
+    """
+    instance_names = instance_names if instance_names is not None else [inst.name for inst in eq.instances]
+    if not instance_names or not eq.spec_defs:
+        return []
+
+    spec_tokens = {name: count_tokens(f"{name}: {definition}") for name, definition in eq.spec_defs.items()}
+
+    # group specs so that the defs plus one row of cells fits (and a row doesn't exceed max_cells)
+    spec_groups: List[List[str]] = []
+    group, group_tokens = [], 0
+    for name, tokens in spec_tokens.items():
+        row_tokens = tokens + TOKENS_PER_CELL
+        if group and (group_tokens + row_tokens > max_tokens or len(group) >= max_cells):
+            spec_groups.append(group)
+            group, group_tokens = [], 0
+        group.append(name)
+        group_tokens += row_tokens
+    spec_groups.append(group)
+
+    work_units: List[WorkUnit] = []
+    for specs in spec_groups:
+        defs_tokens = sum(spec_tokens[name] for name in specs)
+        cells_per_instance = len(specs) * TOKENS_PER_CELL
+        instances_per_unit = max(1, min(
+            max_cells // len(specs),
+            (max_tokens - defs_tokens) // cells_per_instance,
+        ))
+        for start in range(0, len(instance_names), instances_per_unit):
+            insts = instance_names[start:start + instances_per_unit]
+            work_units.append(WorkUnit(
+                equipment_name=eq.name,
+                instance_names=insts,
+                spec_names=specs,
+                est_tokens=defs_tokens + len(insts) * cells_per_instance,
+            ))
+
+    logger.debug(f"Planned {len(work_units)} work units for {eq.name} ({len(instance_names)} instances x {len(eq.spec_defs)} specs)")
+    return work_units
+
+def work_unit_to_df(eq: ScopedEquipment, unit: WorkUnit) -> pd.DataFrame:
+    """The spec results table for a work unit (a definition row then an empty row per instance) as the lookup chain expects it"""
+    spec_defs_df = pd.DataFrame.from_dict({name: eq.spec_defs[name] for name in unit.spec_names}, orient='index', columns=[ScopedEquipment.DEF_COL])
+    instances_df = pd.DataFrame("None", index=unit.instance_names, columns=unit.spec_names)
+    return pd.concat([spec_defs_df.T, instances_df])
+
+def split_value_page(cell) -> Tuple[Optional[str], Optional[str]]:
+    """Split a "value,page" result cell (the page is only split off if it is a number or None so values like "1,750 RPM" stay whole)"""
+    text = str(cell).strip()
+    parts = text.rsplit(',', 1)
+    if len(parts) == 2 and (parts[1].strip().isdigit() or parts[1].strip() == 'None'):
+        text, page = parts[0].strip(), parts[1].strip()
+    else:
+        page = None
+    value = None if text in ('None', '') else text
+    return value, None if page == 'None' else page
+
+def apply_work_unit_results(eq: ScopedEquipment, unit: WorkUnit, results_df: pd.DataFrame, res: str = "resA") -> int:
+    """
+    Put a work unit's results (rows are instance names, columns are spec names, values are "value,page") back into eq's results store
+
+    Returns the number of cells that were filled in
+    """
+    if results_df is None:
+        return 0
+    filled = 0
+    for inst_name in unit.instance_names:
+        if inst_name not in results_df.index:
+            continue
+        row: Dict = results_df.loc[inst_name].to_dict()
+        for spec_name in unit.spec_names:
+            if row.get(spec_name) is None or (inst_name, spec_name) not in eq.results:
+                continue
+            value, page = split_value_page(row[spec_name])
+            if value is None:
+                continue
+            eq.results.set_result(inst_name, spec_name, res, value=value, page=page)
+            filled += 1
+    return filled
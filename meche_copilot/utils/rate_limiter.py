@@ -0,0 +1,41 @@
+import time
+import threading
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+from langchain.callbacks.base import BaseCallbackHandler
+from loguru import logger
+
+class RateLimiter:
+    """
+    Spaces out calls so at most max_calls start per period seconds across everything sharing the limiter
+
+    Pass a multiprocessing Manager to share it between processes (the next free slot and its lock live in the manager so the limiter can be sent to pool workers), otherwise it is shared between threads
+    """
+
+    def __init__(self, max_calls: int, period: float = 60.0, manager: Optional[Any] = None):
+        if max_calls <= 0:
+            raise ValueError(f"max_calls must be positive, got {max_calls}")
+        self.interval = period / max_calls
+        self._lock = manager.Lock() if manager is not None else threading.Lock()
+        self._next_slot = manager.Value('d', 0.0) if manager is not None else SimpleNamespace(value=0.0)
+
+    def acquire(self) -> float:
+        """Wait for the next free slot and return how long that took (seconds)"""
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot.value)
+            self._next_slot.value = slot + self.interval
+        wait = slot - now
+        if wait > 0:
+            logger.debug(f"Rate limited, waiting {wait:.2f}s")
+            time.sleep(wait)
+        return wait
+
+class RateLimitCallbackHandler(BaseCallbackHandler):
+    """Langchain callback handler that waits on a RateLimiter before every llm call (chat model calls fall back to on_llm_start too)"""
+
+    def __init__(self, rate_limiter: RateLimiter):
+        self.rate_limiter = rate_limiter
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any) -> None:
+        self.rate_limiter.acquire()
@@ -0,0 +1,38 @@
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+from openpyxl import load_workbook
+from loguru import logger
+
+# (template path, mtime) -> spec defs
+_template_spec_defs: Dict[Tuple[str, int], Dict[str, str]] = {}
+_lock = threading.Lock()
+
+def read_template_spec_defs(template_fpath: Path) -> Dict[str, str]:
+    """
+    Read the spec defs from a specifications template (first row is the spec names, second row is the definitions)
+
+    Templates are opened read-only and cached by path and mtime, so scope rows that share a template only read it once (and edits to the template are picked up)
+    """
+    template_fpath = Path(template_fpath)
+    key = (str(template_fpath.resolve()), template_fpath.stat().st_mtime_ns)
+    with _lock:
+        if key in _template_spec_defs:
+            return dict(_template_spec_defs[key])
+
+    logger.debug(f"Reading spec defs from template: {template_fpath}")
+    wb = load_workbook(str(template_fpath), read_only=True, data_only=True)
+    try:
+        rows = list(wb.active.iter_rows(min_row=1, max_row=2, values_only=True))
+    finally:
+        wb.close()
+    names = rows[0] if rows else ()
+    defs = rows[1] if len(rows) > 1 else ()
+    spec_defs = {
+        name: (defs[i] if i < len(defs) else None) or ""
+        for i, name in enumerate(names) if name is not None
+    }
+
+    with _lock:
+        _template_spec_defs[key] = spec_defs
+    return dict(spec_defs)
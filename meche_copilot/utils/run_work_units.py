@@ -0,0 +1,51 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Iterator, List, Tuple
+from loguru import logger
+
+from meche_copilot.schemas import ScopedEquipment, WorkUnit
+
+def format_progress(done: int, total: int, elapsed: float, failed: int = 0) -> str:
+    """Progress message with throughput and ETA (eg. "120/480 cells, 2.0 cells/s, ETA 3m00s"), failed cells count towards throughput but not done"""
+    processed = done + failed
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    if processed >= total:
+        eta = "done"
+    elif rate > 0:
+        minutes, seconds = divmod(int(round((total - processed) / rate)), 60)
+        eta = f"ETA {minutes}m{seconds:02d}s"
+    else:
+        eta = "ETA --"
+    msg = f"{done}/{total} cells, {rate:.1f} cells/s, {eta}"
+    if failed:
+        msg += f", {failed} cells failed"
+    return msg
+
+def run_work_units(
+    work_units: List[Tuple[ScopedEquipment, WorkUnit]],
+    run_unit: Callable[[ScopedEquipment, WorkUnit], Any],
+    max_workers: int = 4,
+) -> Iterator[Tuple[int, int, str]]:
+    """
+    Run run_unit(eq, unit) for every work unit on a thread pool of max_workers and yield (cells done, cells failed, progress message) as each unit completes
+
+    Failed units are logged and their cells counted as failed (not done), so cells done + cells failed adds up to the total once every unit has run
+    """
+    total = sum(unit.num_cells for _, unit in work_units)
+    done, failed = 0, 0
+    start = time.monotonic()
+    if not work_units:
+        yield done, failed, format_progress(done, total, 0.0)
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(work_units)))) as executor:
+        futures = {executor.submit(run_unit, eq, unit): unit for eq, unit in work_units}
+        for future in as_completed(futures):
+            unit = futures[future]
+            try:
+                future.result()
+                done += unit.num_cells
+            except Exception:
+                failed += unit.num_cells
+                logger.exception(f"Error getting results for {unit.equipment_name} ({', '.join(unit.instance_names)})\nMoving on...")
+            yield done, failed, f"{unit.equipment_name}: {format_progress(done, total, time.monotonic() - start, failed)}"
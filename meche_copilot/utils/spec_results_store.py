@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from meche_copilot.schemas import ScopedEquipment, ScopedEquipmentInstance, SpecInstance, SpecResult
+
+RES_FIELDS = tuple(SpecResult.__fields__)
+FIELDS = tuple(f"{res}.{field}" for res in ("resA", "resB") for field in RES_FIELDS) + ("final_result",)
+
+class SpecResultsStore:
+    """
+    Array backed spec results for one equipment (struct of arrays with one row per instance x spec)
+
+    Each field (resA.value, resA.page, ..., final_result) is a numpy object array so results frames are built column by column and the cells that changed since a snapshot (eg. the last worksheet write) are found with array compares
+
+    This is the equipment's results of record (see ScopedEquipment.results). Pydantic SpecInstance/ScopedEquipmentInstance views are only built when asked for (eg. for the api) and changes to them aren't stored
+    """
+    RES_FIELDS = RES_FIELDS
+    FIELDS = FIELDS
+
+    __slots__ = ("instance_names", "spec_names", "columns", "_instance_idx", "_spec_idx")
+
+    def __init__(self, instance_names: Iterable[str], spec_names: Iterable[str]):
+        self.instance_names: List[str] = list(instance_names)
+        self.spec_names: List[str] = list(spec_names)
+        self._instance_idx = {name: i for i, name in enumerate(self.instance_names)}
+        self._spec_idx = {name: j for j, name in enumerate(self.spec_names)}
+        self.columns: Dict[str, np.ndarray] = {field: np.full(len(self), None, dtype=object) for field in self.FIELDS}
+
+    def __len__(self) -> int:
+        return len(self.instance_names) * len(self.spec_names)
+
+    def __contains__(self, cell: Tuple[str, str]) -> bool:
+        """Whether the store has a row for an (instance name, spec name) cell"""
+        instance_name, spec_name = cell
+        return instance_name in self._instance_idx and spec_name in self._spec_idx
+
+    def row(self, instance_name: str, spec_name: str) -> int:
+        return self._instance_idx[instance_name] * len(self.spec_names) + self._spec_idx[spec_name]
+
+    def get(self, instance_name: str, spec_name: str, field: str) -> Any:
+        return self.columns[field][self.row(instance_name, spec_name)]
+
+    def set(self, instance_name: str, spec_name: str, field: str, value: Any) -> None:
+        self.columns[field][self.row(instance_name, spec_name)] = value
+
+    def get_result(self, instance_name: str, spec_name: str, res: str) -> Dict[str, Any]:
+        """The resA or resB fields of a spec"""
+        i = self.row(instance_name, spec_name)
+        return {field: self.columns[f"{res}.{field}"][i] for field in self.RES_FIELDS}
+
+    def set_result(self, instance_name: str, spec_name: str, res: str, **fields: Any) -> None:
+        """Set resA or resB of a spec (fields that aren't given are cleared, like a new SpecResult)"""
+        i = self.row(instance_name, spec_name)
+        for field in self.RES_FIELDS:
+            self.columns[f"{res}.{field}"][i] = fields.get(field)
+
+    def copy(self) -> "SpecResultsStore":
+        """A snapshot of the results (eg. what was last written to the worksheet)"""
+        store = SpecResultsStore(self.instance_names, self.spec_names)
+        store.columns = {field: values.copy() for field, values in self.columns.items()}
+        return store
+
+    def spec_instance(self, instance_name: str, spec_name: str) -> SpecInstance:
+        """Pydantic view of a single spec result"""
+        i = self.row(instance_name, spec_name)
+        return SpecInstance.construct(
+            name=spec_name,
+            resA=SpecResult.construct(**{field: self.columns[f"resA.{field}"][i] for field in self.RES_FIELDS}),
+            resB=SpecResult.construct(**{field: self.columns[f"resB.{field}"][i] for field in self.RES_FIELDS}),
+            final_result=self.columns["final_result"][i],
+        )
+
+    def instance(self, instance_name: str) -> ScopedEquipmentInstance:
+        """Pydantic view of an equipment instance's spec results"""
+        return ScopedEquipmentInstance.construct(
+            name=instance_name,
+            instances=[self.spec_instance(instance_name, spec_name) for spec_name in self.spec_names],
+            design_uid=None,
+            design_data=None,
+            submittal_data=None,
+        )
+
+    @classmethod
+    def from_equipment(cls, eq: ScopedEquipment) -> "SpecResultsStore":
+        """A store for eq's instances and specs holding whatever spec result models its instances have"""
+        store = cls(instance_names=[inst.name for inst in eq.instances], spec_names=list(eq.spec_defs))
+        for inst in eq.instances:
+            for spec in inst.instances:
+                if spec.name not in store._spec_idx:
+                    continue
+                store.set_result(inst.name, spec.name, "resA", **spec.resA.dict())
+                store.set_result(inst.name, spec.name, "resB", **spec.resB.dict())
+                store.set(inst.name, spec.name, "final_result", spec.final_result)
+        return store
+
+    def update_from_df(self, df: pd.DataFrame) -> int:
+        """
+        Set the fields of the rows of a results frame laid out like to_df (eg. read back from the worksheet)
+
+        Rows for instances or specs the store doesn't have are skipped and values are stored as str like the SpecResult fields. Returns the number of rows set
+        """
+        instance_idx = df["instance"].map(self._instance_idx)
+        spec_idx = df["spec"].map(self._spec_idx)
+        known = (instance_idx.notna() & spec_idx.notna()).to_numpy()
+        rows = instance_idx[known].astype(int).to_numpy() * len(self.spec_names) + spec_idx[known].astype(int).to_numpy()
+        for field in self.FIELDS:
+            if field not in df.columns:
+                continue
+            values = df[field].to_numpy(dtype=object)[known]
+            self.columns[field][rows] = [value if value is None or isinstance(value, str) else str(value) for value in values]
+        return len(rows)
+
+    def dirty_cells(self, previous: "SpecResultsStore") -> Optional[Dict[str, np.ndarray]]:
+        """
+        Rows of each field that changed since previous (eg. the results last written to the worksheet)
+
+        Returns None if the tables don't line up (different instances or specs) so only a full rewrite will do
+        """
+        if previous.instance_names != self.instance_names or previous.spec_names != self.spec_names:
+            return None
+        dirty = {}
+        for field in self.FIELDS:
+            rows = np.flatnonzero(self.columns[field] != previous.columns[field])
+            if len(rows):
+                dirty[field] = rows
+        return dirty
+
+    def table(self, field: str) -> pd.DataFrame:
+        """One field as an instances by specs frame (eg. the final results)"""
+        values = self.columns[field].reshape(len(self.instance_names), len(self.spec_names))
+        return pd.DataFrame(values, index=self.instance_names, columns=self.spec_names)
+
+    def to_df(self) -> pd.DataFrame:
+        """One row per (instance, spec) with a column per field (the worksheet results layout)"""
+        data = {
+            "instance": np.repeat(np.array(self.instance_names, dtype=object), len(self.spec_names)),
+            "spec": np.tile(np.array(self.spec_names, dtype=object), len(self.instance_names)),
+        }
+        data.update(self.columns)
+        return pd.DataFrame(data, columns=list(data))
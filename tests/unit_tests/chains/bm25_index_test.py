@@ -0,0 +1,41 @@
+"""
+Test the bm25 index ranks pages that mention the query terms first and rank fusion combines rankings
+"""
+import math
+import pytest
+from meche_copilot.chains.helpers.bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+@pytest.fixture
+def pages():
+    return [
+        "GENERAL NOTES ALL WORK SHALL COMPLY WITH CODES",
+        "PUMP SCHEDULE P-1 FLOW 120 GPM HEAD 45 FT MOTOR 5 HP",
+        "FAN SCHEDULE EF-1 AIRFLOW 1500 CFM STATIC PRESSURE 0.5 IN",
+        "",
+    ]
+
+def test_tokenize():
+    assert tokenize("Sheet M-802, 0.5 in. 1/2 HP") == ["sheet", "m-802", "0.5", "in", "1/2", "hp"]
+
+def test_top_k(pages):
+    index = BM25Index(pages)
+    assert index.top_k("pump flow gpm", k=2) == [1]
+    assert index.top_k("airflow cfm static pressure", k=2) == [2]
+    assert index.top_k("nothing matches this", k=2) == []
+
+def test_scores_match_bm25(pages):
+    index = BM25Index(pages, k1=1.5, b=0.75)
+    # "pump" is only on page 1 (12 tokens, 7.5 per page on average)
+    idf = math.log(1 + (4 - 1 + 0.5) / (1 + 0.5))
+    expected = idf * 1 * 2.5 / (1 + 1.5 * (1 - 0.75 + 0.75 * 12 / 7.5))
+    assert index.scores("pump") == pytest.approx([0, expected, 0, 0])
+    assert index.postings["schedule"][0].tolist() == [1, 2]
+
+def test_empty_corpus():
+    index = BM25Index([])
+    assert len(index) == 0
+    assert index.top_k("pump") == []
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c"], ["b"]])
+    assert fused == ["b", "c", "a"]
@@ -0,0 +1,41 @@
+"""
+Test spec values with hvac units are parsed and compared within tolerance
+"""
+import pytest
+from meche_copilot.chains.helpers.compare_spec_values import compare_spec_values, parse_quantities
+
+def test_parse_quantities():
+    assert parse_quantities("1,750 rpm") == {"speed": 1750.0}
+    assert parse_quantities("460/3/60") == {"voltage": 460.0, "phase": 3.0, "frequency": 60.0}
+    assert parse_quantities("120 GPM @ 45 FT-HD") == {"water_flow": 120.0, "head": 45.0}
+    assert parse_quantities("5") == {"": 5.0}
+    assert parse_quantities("Bell & Gossett") == {}
+    assert parse_quantities(None) == {}
+
+def test_compare_spec_values():
+    design = ["1750 RPM", "5 HP", "460V/3PH/60HZ", "120 GPM", "1500 CFM", "120 MBH", "Bell & Gossett", "1750", "10 HP"]
+    submittal = ["1,750 rpm", "3.73 kW", "460/3/60", "100 GPM", "1500 cfm", "10 tons", "B&G", "1,750 rpm", "1500 CFM"]
+    results = compare_spec_values(design, submittal)
+    assert list(results) == [True, True, True, False, True, True, None, True, None]
+
+@pytest.mark.parametrize("text,expected", [
+    ("1/2 HP", {"power": 0.5}),
+    ("1-1/2 HP", {"power": 1.5}),
+    ("1 1/2 HP", {"power": 1.5}),
+    ("3/4", {"": 0.75}),
+])
+def test_parse_fractions(text, expected):
+    assert parse_quantities(text) == expected
+
+def test_compare_fractions():
+    assert list(compare_spec_values(["1/2 HP", "1-1/2 HP", "1 1/2 HP"], ["0.5 hp", "1.5 HP", "1-1/2 hp"])) == [True, True, True]
+
+def test_compare_with_leftover_text():
+    design = ["5 HP TEFC premium efficiency", "5 HP TEFC", "120 GPM @ 45 FT"]
+    submittal = ["5 HP ODP standard efficiency", "3.73 kW tefc", "120 gpm at 45 ft"]
+    # only the quantities are compared if the rest of the values say the same thing
+    assert list(compare_spec_values(design, submittal)) == [None, True, True]
+
+def test_compare_spec_values_lengths_must_match():
+    with pytest.raises(ValueError):
+        compare_spec_values(["1 HP"], [])
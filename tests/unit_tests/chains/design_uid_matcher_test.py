@@ -0,0 +1,30 @@
+"""
+Test the design uid matcher finds the same uids as a substring check for each uid
+"""
+import pytest
+from meche_copilot.chains.helpers.design_uid_matcher import DesignUidMatcher
+
+@pytest.fixture
+def uids():
+    return ["P-1", "P-1A", "P-2", "EF-12", "EF-1", "HRU-1"]
+
+def test_matches_substring_semantics(uids):
+    matcher = DesignUidMatcher(uids)
+    texts = [
+        "PUMP SCHEDULE P-1A, P-2 BASE MOUNTED",
+        "EF-12 ROOF EXHAUST FAN",
+        "HRU-1\nENERGY RECOVERY",
+        "NOTHING HERE",
+        "",
+    ]
+    for text in texts:
+        assert matcher.find(text) == {uid for uid in uids if uid in text}
+
+def test_find_in_blocks_returns_first_block(uids):
+    matcher = DesignUidMatcher(uids)
+    found = matcher.find_in_blocks(["TITLE", "P-2 PUMP", "P-2 MOTOR", "EF-1 FAN"])
+    assert found == {"P-2": "P-2 PUMP", "EF-1": "EF-1 FAN"}
+
+def test_no_uids():
+    matcher = DesignUidMatcher([None, ""])
+    assert matcher.find("P-1") == set()
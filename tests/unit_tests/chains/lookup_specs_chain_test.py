@@ -0,0 +1,12 @@
+"""
+Test spec reader responses that aren't valid json are reported rather than read as empty results
+"""
+from meche_copilot.chains.lookup_specs_chain import LookupSpecsChain
+from meche_copilot.schemas import AgentConfig
+
+def test_extract_and_validate_json():
+    agent = AgentConfig(system_prompt_template="system", message_prompt_template="message")
+    chain = LookupSpecsChain(doc_retriever=agent, spec_reader=agent)
+    assert chain._extract_and_validate_json('Here you go: {"Flow": {"pump-1": "120 GPM,3"}}') == {"Flow": {"pump-1": "120 GPM,3"}}
+    assert chain._extract_and_validate_json('{"Flow": {"pump-1": "120 GPM,3"}') is None
+    assert chain._extract_and_validate_json("I couldn't find these specs") is None
@@ -0,0 +1,74 @@
+"""
+Test spec defs are mapped to the right schedule headers and the mapping is cached
+"""
+import json
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from meche_copilot.chains.helpers.map_specs_to_schedule import detect_units, get_spec_header_map, map_specs_to_headers, set_design_data_from_schedules
+from meche_copilot.schemas import EngineeringDesignSchedule, ScopedEquipment, ScopedEquipmentInstance, SpecInstance, Source
+
+@pytest.fixture
+def spec_defs():
+    return {
+        "Flow": "Design flow rate in GPM",
+        "Head": "Total dynamic head in ft",
+        "Motor HP": "Motor horsepower",
+        "Manufacturer": "Pump manufacturer and model",
+    }
+
+@pytest.fixture
+def headers():
+    return ["TAG", "FLOW (GPM)", "HEAD (FT)", "MOTOR HP", "VOLTS/PH/HZ", "RPM"]
+
+def test_detect_units():
+    assert detect_units("FLOW (GPM)") == {"gpm"}
+    assert detect_units("VOLTS/PH/HZ") == {"v", "ph", "hz"}
+    assert detect_units("MANUFACTURER") == set()
+
+def test_map_specs_to_headers(spec_defs, headers):
+    mapping = map_specs_to_headers(spec_defs, headers)
+    assert mapping == {"Flow": "FLOW (GPM)", "Head": "HEAD (FT)", "Motor HP": "MOTOR HP"}
+
+def test_map_prefers_the_spec_word_over_a_shared_qualifier():
+    spec_defs = {"Motor RPM": "Motor speed", "Fan Model": "Fan model number"}
+    mapping = map_specs_to_headers(spec_defs, ["MOTOR", "RPM", "FAN", "MODEL"])
+    assert mapping == {"Motor RPM": "RPM", "Fan Model": "MODEL"}
+
+def test_map_fuzzy_when_no_shared_words():
+    assert map_specs_to_headers({"Airflow": "Supply airflow"}, ["TAG", "AIR FLOW"]) == {"Airflow": "AIR FLOW"}
+
+def test_get_spec_header_map_is_cached(spec_defs, headers, tmp_path):
+    cache_fpath = tmp_path / "spec_header_maps.json"
+    mapping = get_spec_header_map(spec_defs, headers, cache_fpath=cache_fpath)
+    assert cache_fpath.exists()
+    assert get_spec_header_map(spec_defs, headers, cache_fpath=cache_fpath) == mapping
+
+def test_get_spec_header_map_concurrent_writes(spec_defs, headers, tmp_path):
+    cache_fpath = tmp_path / "spec_header_maps.json"
+    header_sets = [headers + [f"EXTRA {i}"] for i in range(20)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda hdrs: get_spec_header_map(spec_defs, hdrs, cache_fpath=cache_fpath), header_sets))
+    # every thread's map is kept
+    assert len(json.loads(cache_fpath.read_text())) == 20
+    assert [fpath.name for fpath in tmp_path.iterdir()] == ["spec_header_maps.json"]
+
+def test_set_design_data_from_schedules(spec_defs):
+    src = Source(name="design", description="design docs", ref_docs=["design.pdf"], notes="notes")
+    eq = ScopedEquipment(name="pump", design_source=src, submittal_source=src, spec_defs=spec_defs, instances=[
+        ScopedEquipmentInstance(name="pump-1", instances=[SpecInstance(name="Flow")], design_uid="P-2"),
+        ScopedEquipmentInstance(name="pump-2", instances=[SpecInstance(name="Flow")]),
+        ScopedEquipmentInstance(name="p-3", instances=[SpecInstance(name="Flow")]),
+    ])
+    schedule = EngineeringDesignSchedule(
+        equipment_name="pump", title="PUMP SCHEDULE", fpath="design.pdf", page_number=3,
+        row_data={"P-1": ["100", "40"], "P-2": ["120", "45"], "P-3": ["130", "50"]},
+        column_labels=["TAG", "FLOW (GPM)", "HEAD (FT)"],
+    )
+    assert set_design_data_from_schedules(eq, [schedule]) == 2
+    assert eq.instances[0].design_data == {"FLOW (GPM)": "120", "HEAD (FT)": "45"}
+    # no design uid or row with its tag so it's left to the llm (rows aren't handed out by position)
+    assert eq.instances[1].design_uid is None
+    assert eq.instances[1].design_data is None
+    # matched on its normalized tag, which gives it the row's design uid
+    assert eq.instances[2].design_uid == "P-3"
+    assert eq.instances[2].design_data == {"FLOW (GPM)": "130", "HEAD (FT)": "50"}
@@ -0,0 +1,28 @@
+"""
+Test packed docs are smaller than json dumped docs and keep the page text
+"""
+import pytest
+from langchain.schema import Document
+from meche_copilot.chains.helpers.pack_docs_for_prompt import collapse_whitespace, pack_docs_for_prompt, table_to_markdown, tokens_per_page
+
+@pytest.fixture
+def docs():
+    return [
+        Document(page_content='PUMP SCHEDULE\n\n\n  P-1    120 GPM   "BASE MOUNTED"  \n', metadata={"source": "/data/design.pdf", "page": 3}),
+        Document(page_content="EF-1\t1500 CFM\n\n", metadata={"source": "/data/design.pdf", "page": 4}),
+        Document(page_content="duplicate", metadata={"source": "/data/design.pdf", "page": 3}),
+    ]
+
+def test_collapse_whitespace():
+    assert collapse_whitespace("  A   B\t\tC \n\n\n D  ") == "A B C\nD"
+
+def test_pack_docs_for_prompt(docs):
+    packed = pack_docs_for_prompt(docs)
+    assert packed == '## design.pdf p.3\nPUMP SCHEDULE\nP-1 120 GPM "BASE MOUNTED"\n\n## design.pdf p.4\nEF-1 1500 CFM'
+
+def test_table_to_markdown():
+    assert table_to_markdown([["TAG", "FLOW"], ["P-1", "120\nGPM"], [None, None]]) == "| TAG | FLOW |\n|---|---|\n| P-1 | 120 GPM |"
+
+def test_tokens_per_page(docs):
+    res = tokens_per_page(docs, count_tokens=len)
+    assert res["packed"] < res["json"]
@@ -0,0 +1,43 @@
+"""
+Test the retrieval cache round trips docs through memory and disk and the key changes when a ref doc changes
+"""
+import os
+import pytest
+from langchain.schema import Document
+from meche_copilot.chains.helpers.retrieval_cache import RetrievalCache, get_retrieval_cache, retrieval_cache_key
+from meche_copilot.schemas import Source
+
+@pytest.fixture
+def source(tmp_path):
+    ref_doc = tmp_path / "design.pdf"
+    ref_doc.write_bytes(b"%PDF-1.4 fake")
+    return Source(name="design", description="design docs", ref_docs=[ref_doc], notes="pump schedule on M-802")
+
+def test_key_invalidated_when_ref_doc_changes(source):
+    key = retrieval_cache_key(source, spec_defs={"flow": "gpm"})
+    assert key == retrieval_cache_key(source, spec_defs={"flow": "gpm"})
+    assert key != retrieval_cache_key(source, spec_defs={"head": "ft"})
+
+    ref_doc = source.ref_docs[0]
+    ref_doc.write_bytes(b"%PDF-1.4 fake but changed")
+    os.utime(ref_doc, ns=(0, 0))
+    assert key != retrieval_cache_key(source, spec_defs={"flow": "gpm"})
+
+def test_memory_and_disk(tmp_path):
+    docs = [Document(page_content="PUMP SCHEDULE", metadata={"source": "design.pdf", "page": 3})]
+    cache = RetrievalCache(cache_dir=tmp_path / "retrieval_cache")
+    assert cache.get("abc") is None
+    cache.set("abc", docs)
+    assert cache.get("abc") == docs
+
+    # new cache (ie. a later run) reads from disk
+    assert RetrievalCache(cache_dir=tmp_path / "retrieval_cache").get("abc") == docs
+
+    cache.clear()
+    assert cache.get("abc") is None
+
+def test_get_retrieval_cache_is_shared_per_dir(tmp_path):
+    cache = get_retrieval_cache(tmp_path / "retrieval_cache")
+    assert get_retrieval_cache(tmp_path / "retrieval_cache") is cache
+    assert get_retrieval_cache(tmp_path / "other") is not cache
+    assert not (tmp_path / "retrieval_cache").exists() # nothing is written until something is cached
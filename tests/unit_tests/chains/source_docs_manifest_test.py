@@ -0,0 +1,30 @@
+"""
+Test retrievers share one source docs manifest per collection and that concurrent updates are all saved
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from meche_copilot.chains.helpers.source_docs_manifest import SourceDocEntry, SourceDocsManifest, get_source_docs_manifest
+
+def entry(source: str) -> SourceDocEntry:
+    return SourceDocEntry(source=source, content_hash="abc", size=1, mtime_ns=1, page_count=1, embedding_model="model")
+
+def test_shared_per_collection(tmp_path):
+    manifest = get_source_docs_manifest(tmp_path / "langchain_manifest.json")
+    assert get_source_docs_manifest(tmp_path / "." / "langchain_manifest.json") is manifest
+    assert get_source_docs_manifest(tmp_path / "langchain-local_manifest.json") is not manifest
+    assert manifest.source_lock("design.pdf") is manifest.source_lock("design.pdf")
+
+def test_concurrent_saves(tmp_path):
+    manifest = SourceDocsManifest(fpath=tmp_path / "langchain_manifest.json")
+
+    def ingest(i: int):
+        manifest.set(entry(f"doc-{i}.pdf"))
+        manifest.save()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(ingest, range(50)))
+
+    assert len(json.loads(manifest.fpath.read_text())) == 50
+    assert SourceDocsManifest.load(manifest.fpath).get("doc-7.pdf") == entry("doc-7.pdf")
+    # saves are written to a temp file then moved into place
+    assert [fpath.name for fpath in tmp_path.iterdir()] == ["langchain_manifest.json"]
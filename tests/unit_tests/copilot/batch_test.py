@@ -0,0 +1,20 @@
+"""
+Test each project in a batch gets its own cache namespace, even when project folders share a name
+"""
+from pathlib import Path
+from meche_copilot.cli.batch import working_cache_namespace
+
+def test_namespace_under_data_cache(tmp_path: Path):
+    namespace = Path(working_cache_namespace(tmp_path / "client-a" / "demo-01", "data/.cache"))
+    assert namespace.parent == Path("data/.cache/projects")
+    assert namespace.name.startswith("demo_01_")
+
+def test_same_folder_name_different_namespace(tmp_path: Path):
+    namespace_a = working_cache_namespace(tmp_path / "client-a" / "demo-01", "data/.cache")
+    namespace_b = working_cache_namespace(tmp_path / "client-b" / "demo-01", "data/.cache")
+    assert namespace_a != namespace_b
+
+def test_same_folder_same_namespace(tmp_path: Path, monkeypatch):
+    (tmp_path / "demo-01").mkdir()
+    monkeypatch.chdir(tmp_path)
+    assert working_cache_namespace(Path("demo-01"), "data/.cache") == working_cache_namespace(tmp_path / "demo-01", "data/.cache")
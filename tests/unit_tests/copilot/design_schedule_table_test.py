@@ -0,0 +1,46 @@
+"""
+Test a design schedule's columnar table slices by row label and column header without copying and is rebuilt when its row data or labels change
+"""
+import pytest
+from meche_copilot.schemas import EngineeringDesignSchedule
+
+@pytest.fixture
+def schedule():
+    return EngineeringDesignSchedule(
+        equipment_name="pump", title="PUMP SCHEDULE", fpath="design.pdf", page_number=3,
+        row_data={"P-1": ["100", "40"], "P-2": ["120", None]},
+        column_labels=["TAG", "FLOW (GPM)", "HEAD (FT)"],
+    )
+
+def buffer_address(values) -> int:
+    # the arrow (chunked) array behind a string[pyarrow] column
+    return values.array.__arrow_array__().chunks[0].buffers()[1].address
+
+def test_slices(schedule):
+    assert schedule.table.index.tolist() == ["P-1", "P-2"]
+    assert schedule.table.columns.tolist() == ["FLOW (GPM)", "HEAD (FT)"]
+    assert schedule.row("P-1").tolist() == ["100", "40"]
+    assert schedule.column("FLOW (GPM)").tolist() == ["100", "120"]
+    # column slices share the table's arrow buffers
+    assert buffer_address(schedule.column("FLOW (GPM)")) == buffer_address(schedule.table["FLOW (GPM)"])
+
+def test_table_is_cached(schedule):
+    assert schedule.table is schedule.table
+
+def test_rebuilt_when_row_data_changes(schedule):
+    table = schedule.table
+    schedule.row_data["P-2"] = ["130", "50"]
+    assert schedule.table is not table
+    assert schedule.row("P-2").tolist() == ["130", "50"]
+
+    schedule.row_data = {"P-3": ["90", "30"]}
+    assert schedule.table.index.tolist() == ["P-3"]
+
+def test_rebuilt_when_labels_change(schedule):
+    schedule.table
+    schedule.column_labels = ["FLOW", "HEAD"]
+    assert schedule.table.columns.tolist() == ["FLOW", "HEAD"]
+
+def test_table_not_serialized(schedule):
+    schedule.table
+    assert set(schedule.dict()) == {"equipment_name", "title", "fpath", "page_number", "remarks", "headers", "row_data", "column_labels"}
@@ -0,0 +1,65 @@
+"""
+Test design values of specs mapped to a design schedule column are read from the schedule row rather than looked up and that unparseable spec reader responses fail the unit without losing the other cells
+"""
+import pandas as pd
+import pytest
+from meche_copilot.schemas import AgentConfig, ScopedEquipment, ScopedEquipmentInstance, SpecInstance, Source, WorkUnit
+from meche_copilot.chains.helpers.retrieval_cache import retrieval_cache_key
+from meche_copilot.chains.lookup_specs_chain import SpecReaderOutputError
+from meche_copilot.get_work_unit_results import get_work_unit_results, lookup_work_unit_results
+from meche_copilot.utils.checkpoint_journal import CheckpointJournal, cell_fingerprint
+
+def test_design_values_read_from_schedule(tmp_path):
+    ref_doc = tmp_path / "docs.pdf"
+    ref_doc.write_bytes(b"%PDF-1.4 fake")
+    src = Source(name="docs", description="design and submittal docs", ref_docs=[ref_doc], notes="notes")
+    spec_defs = {"Flow": "Flow in GPM", "Head": "Head in ft"}
+    eq = ScopedEquipment(name="pump", design_source=src, submittal_source=src, spec_defs=spec_defs, instances=[
+        ScopedEquipmentInstance(name="pump-1", instances=[SpecInstance(name="Flow"), SpecInstance(name="Head")], design_uid="P-1", design_data={"TAG": "P-1", "FLOW (GPM)": "120 GPM", "HEAD (FT)": "45 FT"}),
+        ScopedEquipmentInstance(name="pump-2", instances=[SpecInstance(name="Flow"), SpecInstance(name="Head")]),
+    ])
+    unit = WorkUnit(equipment_name="pump", instance_names=["pump-1"], spec_names=["Flow", "Head"])
+
+    # submittal values were looked up by an earlier run
+    journal = CheckpointJournal(tmp_path / "checkpoint-journal.jsonl")
+    journal.record(
+        dict(equipment="pump", instance="pump-1", spec=name, source="resB", fingerprint=cell_fingerprint(retrieval_cache_key(src), name, spec_def), value=value)
+        for (name, spec_def), value in zip(spec_defs.items(), ["120 GPM", "50 FT"])
+    )
+
+    # NOTE: nothing is left for the llm (so this would fail if either chain called it)
+    agent = AgentConfig(system_prompt_template="system", message_prompt_template="message")
+    filled = get_work_unit_results(eq, unit, doc_retriever=agent, spec_reader=agent, journal=journal)
+
+    flow, head = eq.instance_views()[0].instances
+    assert filled == 2
+    assert (flow.resA.value, head.resA.value) == ("120 GPM", "45 FT")
+    assert (flow.final_result, head.final_result) == ("120 GPM", "45 FT")
+
+class PartlyParsedLookupChain:
+    """Stands in for a LookupSpecsChain whose spec reader response to the Head chunk wasn't json"""
+    output_key = "result"
+
+    def __call__(self, inputs, callbacks=None):
+        raise SpecReaderOutputError("Couldn't parse 1/2 prompt chunks", result=pd.DataFrame({"Flow": ["120 GPM,3"]}, index=["pump-1"]))
+
+def test_unparsed_chunk_fails_unit(tmp_path):
+    ref_doc = tmp_path / "docs.pdf"
+    ref_doc.write_bytes(b"%PDF-1.4 fake")
+    src = Source(name="docs", description="submittal docs", ref_docs=[ref_doc], notes="notes")
+    spec_defs = {"Flow": "Flow in GPM", "Head": "Head in ft"}
+    eq = ScopedEquipment(name="pump", design_source=src, submittal_source=src, spec_defs=spec_defs, instances=[
+        ScopedEquipmentInstance(name="pump-1", instances=[SpecInstance(name="Flow"), SpecInstance(name="Head")]),
+        ScopedEquipmentInstance(name="pump-2", instances=[SpecInstance(name="Flow"), SpecInstance(name="Head")]),
+    ])
+    unit = WorkUnit(equipment_name="pump", instance_names=["pump-1"], spec_names=["Flow", "Head"])
+    journal = CheckpointJournal(tmp_path / "checkpoint-journal.jsonl")
+
+    with pytest.raises(SpecReaderOutputError):
+        lookup_work_unit_results(PartlyParsedLookupChain(), eq, unit, "resB", src, spec_defs, journal=journal)
+
+    flow, head = eq.instance_views()[0].instances
+    assert (flow.resB.value, flow.resB.page) == ("120 GPM", "3")
+    assert head.resB.value is None
+    # only the parsed cell is checkpointed so the rest is looked up again next run
+    assert len(journal) == 1
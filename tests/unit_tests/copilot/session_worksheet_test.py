@@ -0,0 +1,19 @@
+"""
+Test the session keeps what the worksheet doesn't hold (eg. design data read from the schedules) when it's updated from the worksheet
+"""
+from types import SimpleNamespace
+from meche_copilot.schemas import ScopedEquipment, ScopedEquipmentInstance, Session, SpecInstance, Source
+
+def test_update_from_worksheet_keeps_design_data(tmp_path):
+    src = Source(name="design", description="design docs", ref_docs=["design.pdf"], notes="notes")
+    pump = ScopedEquipment(name="pump", design_source=src, submittal_source=src, spec_defs={"flow": "Flow in gpm", "head": "Head in ft"}, instances=[
+        ScopedEquipmentInstance(name="pump-1", instances=[SpecInstance(name="flow"), SpecInstance(name="head")], design_uid="P-1", design_data={"FLOW (GPM)": "100"}),
+        ScopedEquipmentInstance(name="pump-2", instances=[SpecInstance(name="flow"), SpecInstance(name="head")]),
+    ])
+    sess = Session.construct(config=SimpleNamespace(working_fpath=tmp_path), equipments=[pump])
+    sess.to_equipment_worksheet()
+
+    sess.update_from_worksheet()
+    pump_1, pump_2 = sess.equipments[0].instances
+    assert (pump_1.design_uid, pump_1.design_data) == ("P-1", {"FLOW (GPM)": "100"})
+    assert (pump_2.design_uid, pump_2.design_data) == (None, None)
@@ -0,0 +1,24 @@
+"""
+Test the camelot backend renders the single page pdf camelot passes it (not the original page) and repeat conversions hit the cache
+"""
+import fitz
+from meche_copilot.pdf_helpers.page_image_cache import PageImageCache, CachedPageImageBackend
+
+def test_backend_renders_given_pdf(tmp_path):
+    # camelot's temp page is rotated relative to the original (landscape) page
+    pdf_fpath = tmp_path / "page-1.pdf"
+    doc = fitz.open()
+    page = doc.new_page(width=200, height=100)
+    page.insert_text((20, 50), "PUMP SCHEDULE")
+    page.set_rotation(90)
+    doc.save(str(pdf_fpath))
+    doc.close()
+
+    cache = PageImageCache()
+    backend = CachedPageImageBackend(resolution=72, cache=cache)
+    backend.convert(str(pdf_fpath), str(tmp_path / "page-1.png"))
+    backend.convert(str(pdf_fpath), str(tmp_path / "page-1-again.png"))
+
+    pix = fitz.Pixmap(str(tmp_path / "page-1.png"))
+    assert (pix.width, pix.height) == (100, 200)
+    assert (cache.hits, cache.misses) == (1, 1)
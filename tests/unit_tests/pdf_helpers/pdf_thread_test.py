@@ -0,0 +1,16 @@
+"""
+Test pdf work from concurrent callers all runs on the one pdf thread
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from meche_copilot.pdf_helpers.pdf_thread import PDF_THREAD_NAME, run_on_pdf_thread
+
+def test_runs_on_pdf_thread():
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        thread_names = set(pool.map(lambda _: run_on_pdf_thread(lambda: threading.current_thread().name), range(20)))
+    assert len(thread_names) == 1
+    assert thread_names.pop().startswith(PDF_THREAD_NAME)
+
+def test_nested_calls_run_inline():
+    # a pdf helper calling another one from the pdf thread would deadlock if it waited on the pdf thread
+    assert run_on_pdf_thread(run_on_pdf_thread, lambda x: x + 1, 1) == 2
@@ -0,0 +1,35 @@
+"""
+Test the checkpoint journal survives a restart (including a cut short last line) and only counts cells with a value and matching fingerprints as done
+"""
+from meche_copilot.utils.checkpoint_journal import CheckpointJournal, cell_fingerprint
+
+def test_resume(tmp_path):
+    fpath = tmp_path / "checkpoint-journal.jsonl"
+    fingerprint = cell_fingerprint("design-key", "flow", "Flow in gpm")
+    journal = CheckpointJournal(fpath)
+    journal.record([
+        dict(equipment="pump", instance="pump-1", spec="flow", source="resA", fingerprint=fingerprint, value="120 GPM", page="3"),
+        dict(equipment="pump", instance="pump-2", spec="flow", source="resA", fingerprint=fingerprint, value=None, page=None),
+    ])
+    # the run died mid write
+    with open(fpath, "a") as f:
+        f.write('{"equipment": "pump", "instance": "pump-3"')
+
+    resumed = CheckpointJournal(fpath)
+    assert len(resumed) == 1
+    assert resumed.get("pump", "pump-1", "flow", "resA", fingerprint)["value"] == "120 GPM"
+    # not found last time so it's looked up again
+    assert not resumed.is_done("pump", "pump-2", "flow", "resA", fingerprint)
+    assert not resumed.is_done("pump", "pump-1", "flow", "resB", fingerprint)
+
+    # the spec def (or source) changed so the cell is redone
+    assert not resumed.is_done("pump", "pump-1", "flow", "resA", cell_fingerprint("design-key", "flow", "Flow in L/s"))
+
+def test_later_entries_win(tmp_path):
+    journal = CheckpointJournal(tmp_path / "checkpoint-journal.jsonl")
+    journal.record([dict(equipment="pump", instance="pump-1", spec="flow", source="resA", fingerprint="a", value="120 GPM")])
+    journal.record([dict(equipment="pump", instance="pump-1", spec="flow", source="resA", fingerprint="b", value="125 GPM")])
+    assert CheckpointJournal(journal.fpath).get("pump", "pump-1", "flow", "resA", "b")["value"] == "125 GPM"
+
+    journal.clear()
+    assert len(CheckpointJournal(journal.fpath)) == 0
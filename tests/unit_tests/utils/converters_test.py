@@ -0,0 +1,52 @@
+"""
+Test pydantic jsonl converters
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+
+from meche_copilot.utils.converters import pydantic_to_jsonl, pydantic_from_jsonl, iter_pydantic_from_jsonl
+
+class Item(BaseModel):
+    name: str
+    fpath: Path
+    rows: Optional[Dict[str, List[str]]]
+
+def test_jsonl_roundtrip(tmp_path: Path):
+    items = [Item(name=f"P-{i}", fpath=f"./data/p{i}.pdf", rows={"P-1": ["a", "b"]}) for i in range(3)]
+    fpath = tmp_path / "items.jsonl"
+    pydantic_to_jsonl(items, fpath)
+    assert pydantic_from_jsonl(fpath, Item) == items
+
+def test_jsonl_trusted_skips_validation(tmp_path: Path):
+    items = [Item(name="P-1", fpath="./data/p1.pdf", rows=None)]
+    fpath = tmp_path / "items.jsonl"
+    pydantic_to_jsonl(items, fpath)
+    loaded = pydantic_from_jsonl(fpath, Item, trusted=True)
+    assert loaded[0].name == "P-1"
+    assert loaded[0].fpath == "data/p1.pdf" # not coerced back to a Path
+
+def test_jsonl_iter_is_lazy(tmp_path: Path):
+    fpath = tmp_path / "items.jsonl"
+    pydantic_to_jsonl([Item(name=str(i), fpath="a.pdf", rows=None) for i in range(5)], fpath)
+    items = iter_pydantic_from_jsonl(fpath, Item)
+    assert next(items).name == "0"
+    assert len(list(items)) == 4
+
+def test_jsonl_empty(tmp_path: Path):
+    fpath = tmp_path / "items.jsonl"
+    pydantic_to_jsonl([], fpath)
+    assert pydantic_from_jsonl(fpath, Item) == []
+
+class Stamped(BaseModel):
+    name: str
+    created_at: datetime
+
+    class Config:
+        json_encoders = {datetime: lambda dt: dt.strftime("%Y-%m-%d")}
+
+def test_jsonl_uses_model_json_encoders(tmp_path: Path):
+    fpath = tmp_path / "items.jsonl"
+    pydantic_to_jsonl([Stamped(name="P-1", created_at=datetime(2023, 8, 1, 12, 30))], fpath)
+    assert fpath.read_text() == '{"name": "P-1", "created_at": "2023-08-01"}\n'
@@ -0,0 +1,67 @@
+"""
+Test the streaming xlsx writer reads back the same as df.to_excel and the patch writer only changes the given cells (and only rewrites their sheets' parts of the xlsx zip)
+"""
+import zipfile
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from meche_copilot.utils.excel_writer import patch_xlsx, write_xlsx_streaming
+
+def test_matches_to_excel(tmp_path: Path):
+    results_df = pd.DataFrame({
+        "instance": ["pump-1", "pump-1", "pump-2"],
+        "spec": ["flow", "head", "flow"],
+        "resA.value": ["120 GPM", None, np.nan],
+        "resA.page": [3, None, 4],
+        "ref_docs": [[Path("a.pdf")], [], Path("b.pdf")],
+    })
+    defs_df = pd.DataFrame.from_dict({"flow": "Flow in gpm", "head": "Head in ft"}, orient="index", columns=["description"])
+
+    fpath = tmp_path / "worksheet.xlsx"
+    write_xlsx_streaming([("pump-specs-defs", defs_df, True), ("pump-specs-results", results_df, False)], fpath)
+
+    expected_fpath = tmp_path / "expected.xlsx"
+    with pd.ExcelWriter(expected_fpath) as writer:
+        defs_df.to_excel(writer, sheet_name="pump-specs-defs", index=True)
+        results_df.to_excel(writer, sheet_name="pump-specs-results", index=False)
+
+    sheets = pd.read_excel(fpath, sheet_name=None)
+    expected_sheets = pd.read_excel(expected_fpath, sheet_name=None)
+    assert list(sheets) == list(expected_sheets)
+    for sheet_name in sheets:
+        pd.testing.assert_frame_equal(sheets[sheet_name], expected_sheets[sheet_name])
+
+def test_patch_only_changes_given_cells(tmp_path: Path):
+    defs_df = pd.DataFrame.from_dict({"flow": "Flow in gpm", "head": "Head in ft"}, orient="index", columns=["description"])
+    results_df = pd.DataFrame({"instance": ["pump-1", "pump-1"], "spec": ["flow", "head"], "resA.value": [None, "40 FT"]})
+    fpath = tmp_path / "worksheet.xlsx"
+    write_xlsx_streaming([("pump-specs-defs", defs_df, True), ("pump-specs-results", results_df, False)], fpath)
+
+    with zipfile.ZipFile(fpath) as zf:
+        before = {info.filename: zf.read(info) for info in zf.infolist()}
+
+    assert patch_xlsx(fpath, {"pump-specs-results": {(2, 3): "120 GPM"}}) == 1
+
+    with zipfile.ZipFile(fpath) as zf:
+        after = {info.filename: zf.read(info) for info in zf.infolist()}
+    assert list(after) == list(before)
+    assert [name for name in before if after[name] != before[name]] == ["xl/worksheets/sheet2.xml"]
+
+    sheets = pd.read_excel(fpath, sheet_name=None)
+    assert sheets["pump-specs-results"]["resA.value"].tolist() == ["120 GPM", "40 FT"]
+    pd.testing.assert_frame_equal(sheets["pump-specs-defs"].set_index("Unnamed: 0").rename_axis(None), defs_df)
+    assert not list(tmp_path.glob(".*.tmp"))
+
+def test_patch_adds_missing_cells(tmp_path: Path):
+    results_df = pd.DataFrame({"instance": ["pump-1"], "spec": ["flow"], "resA.value": ["120 GPM"]})
+    fpath = tmp_path / "worksheet.xlsx"
+    write_xlsx_streaming([("pump-specs-results", results_df, False)], fpath)
+
+    assert patch_xlsx(fpath, {"pump-specs-results": {(2, 3): None, (3, 2): "head", (3, 1): "pump-1", (2, 4): 3}}) == 4
+
+    df = pd.read_excel(fpath)
+    assert df.columns.tolist() == ["instance", "spec", "resA.value", "Unnamed: 3"]
+    assert df[["instance", "spec"]].values.tolist() == [["pump-1", "flow"], ["pump-1", "head"]]
+    assert df["resA.value"].isna().all()
+    assert df["Unnamed: 3"].tolist()[0] == 3
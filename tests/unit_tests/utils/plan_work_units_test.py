@@ -0,0 +1,59 @@
+"""
+Test large equipment tables are split into work units that cover every cell once and results are put back
+"""
+import pytest
+from meche_copilot.schemas import ScopedEquipment, ScopedEquipmentInstance, Session, SpecInstance, Source
+from meche_copilot.utils.plan_work_units import apply_work_unit_results, plan_work_units, split_value_page, work_unit_to_df
+
+@pytest.fixture
+def eq():
+    src = Source(name="design", description="design docs", ref_docs=["design.pdf"], notes="notes")
+    spec_defs = {f"spec-{j}": f"definition of spec {j}" for j in range(60)}
+    instances = [
+        ScopedEquipmentInstance(name=f"ahu-{i}", instances=[SpecInstance(name=name) for name in spec_defs])
+        for i in range(40)
+    ]
+    return ScopedEquipment(name="ahu", design_source=src, submittal_source=src, spec_defs=spec_defs, instances=instances)
+
+def count_tokens(text: str) -> int:
+    return len(text.split())
+
+def test_plan_covers_every_cell_once(eq):
+    units = plan_work_units(eq, max_cells=100, max_tokens=500, count_tokens=count_tokens)
+    cells = [(inst, spec) for unit in units for inst in unit.instance_names for spec in unit.spec_names]
+    assert len(cells) == len(set(cells)) == 40 * 60
+    assert all(unit.num_cells <= 100 for unit in units)
+    assert all(unit.est_tokens <= 500 for unit in units)
+
+def test_session_plan_only_selected(eq):
+    src = Source(name="design", description="design docs", ref_docs=["design.pdf"], notes="notes")
+    pump = ScopedEquipment(name="pump", design_source=src, submittal_source=src, spec_defs={"flow": "Flow in gpm", "head": "Head in ft"}, instances=[
+        ScopedEquipmentInstance(name=f"pump-{i}", instances=[SpecInstance(name="flow"), SpecInstance(name="head")]) for i in range(3)
+    ])
+    sess = Session.construct(equipments=[eq, pump])
+
+    units = sess.plan_work_units(selected_equipments=["pump"], count_tokens=count_tokens)
+    assert {unit.equipment_name for _, unit in units} == {"pump"}
+    assert sum(unit.num_cells for _, unit in units) == 3 * 2
+
+    units = sess.plan_work_units(selected_equipment_instances=["ahu-3", "pump-1"], count_tokens=count_tokens)
+    assert {inst for _, unit in units for inst in unit.instance_names} == {"ahu-3", "pump-1"}
+
+    with pytest.raises(ValueError):
+        sess.plan_work_units(selected_equipments=["chiller"])
+
+def test_apply_work_unit_results(eq):
+    unit = plan_work_units(eq, max_cells=100, count_tokens=count_tokens)[0]
+    df = work_unit_to_df(eq, unit)
+    assert list(df.index) == [ScopedEquipment.DEF_COL] + unit.instance_names
+    results = df.iloc[1:].copy()
+    results.iloc[0, 0] = "1,750 RPM,3"
+    results.iloc[0, 1] = "None,None"
+    assert apply_work_unit_results(eq, unit, results) == 1
+    result = eq.results.get_result("ahu-0", "spec-0", "resA")
+    assert (result["value"], result["page"]) == ("1,750 RPM", "3")
+
+def test_split_value_page():
+    assert split_value_page("5 HP,12") == ("5 HP", "12")
+    assert split_value_page("1,750 RPM") == ("1,750 RPM", None)
+    assert split_value_page("None") == (None, None)
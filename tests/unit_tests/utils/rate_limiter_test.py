@@ -0,0 +1,50 @@
+"""
+Test the rate limiter spaces out calls across threads and processes and the callback handler waits on it before llm calls
+"""
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from meche_copilot.utils.rate_limiter import RateLimiter, RateLimitCallbackHandler
+
+def call_times(rate_limiter: RateLimiter, num_calls: int):
+    times = []
+    for _ in range(num_calls):
+        rate_limiter.acquire()
+        times.append(time.time())
+    return times
+
+def test_acquire_waits_one_interval_per_call():
+    rate_limiter = RateLimiter(max_calls=10, period=1.0) # one call every 100ms
+    waits = [rate_limiter.acquire() for _ in range(4)]
+    assert waits[0] == 0
+    assert all(0.08 < wait <= 0.1 for wait in waits[1:])
+
+def test_no_wait_after_idle():
+    rate_limiter = RateLimiter(max_calls=20, period=1.0)
+    rate_limiter.acquire()
+    time.sleep(0.06)
+    assert rate_limiter.acquire() == 0
+
+def test_threads_share_limit():
+    rate_limiter = RateLimiter(max_calls=20, period=1.0) # one call every 50ms
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        times = sorted(t for ts in executor.map(lambda _: call_times(rate_limiter, 2), range(4)) for t in ts)
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert min(gaps) > 0.04
+
+def test_processes_share_limit():
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Manager() as manager:
+        rate_limiter = RateLimiter(max_calls=20, period=1.0, manager=manager)
+        with ctx.Pool(processes=2) as pool:
+            times = sorted(t for ts in pool.starmap(call_times, [(rate_limiter, 3), (rate_limiter, 3)]) for t in ts)
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert min(gaps) > 0.04
+
+def test_callback_handler_acquires():
+    rate_limiter = RateLimiter(max_calls=10, period=1.0)
+    handler = RateLimitCallbackHandler(rate_limiter)
+    start = time.time()
+    for _ in range(3):
+        handler.on_llm_start({}, ["prompt"])
+    assert time.time() - start > 0.18
@@ -0,0 +1,27 @@
+"""
+Test spec defs are read from a template and the cache picks up template edits
+"""
+import os
+from pathlib import Path
+from openpyxl import Workbook
+
+from meche_copilot.utils.read_template_spec_defs import read_template_spec_defs
+
+def write_template(fpath: Path, rows):
+    wb = Workbook()
+    for row in rows:
+        wb.active.append(row)
+    wb.save(str(fpath))
+
+def test_read_template_spec_defs(tmp_path: Path):
+    fpath = tmp_path / "pump-template.xlsx"
+    write_template(fpath, [["flow", "head", "motor"], ["Flow in gpm", None]])
+    assert read_template_spec_defs(fpath) == {"flow": "Flow in gpm", "head": "", "motor": ""}
+
+    # cached result is a copy
+    read_template_spec_defs(fpath)["flow"] = "changed"
+    assert read_template_spec_defs(fpath)["flow"] == "Flow in gpm"
+
+    write_template(fpath, [["flow"], ["Flow rate"]])
+    os.utime(fpath, ns=(0, 10**9))
+    assert read_template_spec_defs(fpath) == {"flow": "Flow rate"}
@@ -0,0 +1,48 @@
+"""
+Test work units run concurrently and progress counts done and failed cells separately
+"""
+import threading
+import time
+from meche_copilot.schemas import ScopedEquipment, ScopedEquipmentInstance, SpecInstance, Source, WorkUnit
+from meche_copilot.utils.run_work_units import format_progress, run_work_units
+
+def make_work_units(num_units: int):
+    src = Source(name="design", description="design docs", ref_docs=["design.pdf"], notes="notes")
+    eq = ScopedEquipment(name="pump", design_source=src, submittal_source=src, spec_defs={"flow": "Flow in gpm", "head": "Head in ft"},
+                         instances=[ScopedEquipmentInstance(name=f"pump-{i}", instances=[SpecInstance(name="flow"), SpecInstance(name="head")]) for i in range(num_units)])
+    return [(eq, WorkUnit(equipment_name="pump", instance_names=[f"pump-{i}"], spec_names=["flow", "head"])) for i in range(num_units)]
+
+def test_progress_counts_failed_cells_separately():
+    work_units = make_work_units(5)
+
+    def run_unit(eq, unit):
+        if unit.instance_names == ["pump-3"]:
+            raise RuntimeError("rate limited")
+
+    updates = list(run_work_units(work_units, run_unit, max_workers=2))
+    assert [done + failed for done, failed, _ in updates] == [2, 4, 6, 8, 10]
+    done, failed, message = updates[-1]
+    assert (done, failed) == (8, 2)
+    assert message.startswith("pump: 8/10 cells")
+    assert message.endswith("done, 2 cells failed")
+
+def test_runs_concurrently():
+    work_units = make_work_units(4)
+    running, max_running = [0], [0]
+    lock = threading.Lock()
+
+    def run_unit(eq, unit):
+        with lock:
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    list(run_work_units(work_units, run_unit, max_workers=2))
+    assert max_running[0] == 2
+
+def test_format_progress():
+    assert format_progress(30, 90, 15.0) == "30/90 cells, 2.0 cells/s, ETA 0m30s"
+    assert format_progress(0, 90, 0.0) == "0/90 cells, 0.0 cells/s, ETA --"
+    assert format_progress(80, 90, 45.0, failed=10) == "80/90 cells, 2.0 cells/s, done, 10 cells failed"
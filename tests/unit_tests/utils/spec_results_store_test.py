@@ -0,0 +1,96 @@
+"""
+Test the spec results store holds an equipment's results (with pydantic views on request) and finds the cells that changed
+"""
+import gc
+import tracemalloc
+import pytest
+from meche_copilot.schemas import ScopedEquipment, ScopedEquipmentInstance, SpecInstance, SpecResult, Source
+from meche_copilot.utils.spec_results_store import SpecResultsStore
+
+@pytest.fixture
+def eq():
+    src = Source(name="design", description="design docs", ref_docs=["design.pdf"], notes="notes")
+    spec_defs = {"flow": "Flow in gpm", "head": "Head in ft"}
+    instances = [
+        ScopedEquipmentInstance(name=f"pump-{i}", instances=[SpecInstance(name=name) for name in spec_defs])
+        for i in range(3)
+    ]
+    instances[1].instances[0].resA = SpecResult(value="120 GPM", page="3")
+    instances[2].instances[1].final_result = "45 FT"
+    return ScopedEquipment(name="pump", design_source=src, submittal_source=src, spec_defs=spec_defs, instances=instances)
+
+def test_equipment_results_of_record(eq):
+    store = eq.results
+    assert len(store) == 6
+    assert store.get("pump-1", "flow", "resA.value") == "120 GPM"
+    # the spec result models were moved into the store
+    assert all(inst.instances == [] for inst in eq.instances)
+
+    store.set_result("pump-0", "head", "resB", value="40 FT")
+    views = eq.instance_views()
+    assert views[0].instances[1].resB.value == "40 FT"
+    assert views[1].instances[0].resA == SpecResult(value="120 GPM", page="3")
+    assert views[2].instances[1].final_result == "45 FT"
+
+def test_update_from_df(eq):
+    df = eq.results.to_df()
+    df.loc[1, "resB.value"] = 40
+    store = SpecResultsStore(eq.results.instance_names, eq.results.spec_names)
+    assert store.update_from_df(df) == 6
+    assert {field: rows.tolist() for field, rows in store.dirty_cells(eq.results).items()} == {"resB.value": [1]}
+    # numbers read back from the worksheet are stored as str like the SpecResult fields
+    assert store.get("pump-0", "head", "resB.value") == "40"
+
+def test_to_df(eq):
+    df = eq.spec_results_to_df()
+    assert list(df.columns) == ["instance", "spec"] + list(SpecResultsStore.FIELDS)
+    assert df[["instance", "spec"]].values.tolist() == [[f"pump-{i}", name] for i in range(3) for name in ("flow", "head")]
+    assert df["resA.value"].tolist() == [None, None, "120 GPM", None, None, None]
+    assert eq.results.table("final_result").loc["pump-2", "head"] == "45 FT"
+
+def test_dirty_cells(eq):
+    written = eq.results.copy()
+    store = eq.results
+    assert store.dirty_cells(written) == {}
+
+    store.set_result("pump-2", "flow", "resB", value="118 GPM")
+    dirty = store.dirty_cells(written)
+    assert list(dirty) == ["resB.value"]
+    assert dirty["resB.value"].tolist() == [store.row("pump-2", "flow")]
+
+    assert store.dirty_cells(SpecResultsStore(["pump-0"], ["flow", "head"])) is None
+
+def peak_bytes(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del obj
+    return peak
+
+def test_store_footprint():
+    # the same populated 20 x 30 table as pydantic models and in the store (the value strings are shared so only the containers are measured)
+    instance_names = [f"eq-{i}" for i in range(20)]
+    spec_names = [f"spec-{j}" for j in range(30)]
+    values = {(inst_name, spec_name): (f"{inst_name} {spec_name} value", "3") for inst_name in instance_names for spec_name in spec_names}
+
+    def build_models():
+        return [
+            ScopedEquipmentInstance(name=inst_name, instances=[
+                SpecInstance(name=spec_name, resA=SpecResult(value=values[inst_name, spec_name][0], page=values[inst_name, spec_name][1]), resB=SpecResult(value=values[inst_name, spec_name][0], page=values[inst_name, spec_name][1]), final_result=values[inst_name, spec_name][0])
+                for spec_name in spec_names
+            ])
+            for inst_name in instance_names
+        ]
+
+    def build_store():
+        store = SpecResultsStore(instance_names, spec_names)
+        for (inst_name, spec_name), (value, page) in values.items():
+            store.set_result(inst_name, spec_name, "resA", value=value, page=page)
+            store.set_result(inst_name, spec_name, "resB", value=value, page=page)
+            store.set(inst_name, spec_name, "final_result", value)
+        return store
+
+    models, store = peak_bytes(build_models), peak_bytes(build_store)
+    assert store < models / 4